@@ -0,0 +1,260 @@
+# Modo ASGI opcional (na pasta src): uvicorn asgi:app --host 0.0.0.0 --port $PORT
+# As rotas presas à latência do RPC correm em async (AsyncWeb3 + driver assíncrono
+# da base de dados); as restantes são servidas pela mesma app Flask via WsgiToAsgi.
+import asyncio
+import logging
+import os
+import sys
+import time
+from urllib.parse import parse_qs
+
+from asgiref.sync import ThreadSensitiveContext
+from asgiref.wsgi import WsgiToAsgi
+from sqlalchemy import insert, select
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import create_async_engine
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.main import CORS_EXPOSE_HEADERS, app as flask_app
+from src.models.casinofound import User
+from src.models.chain import TokenBalance
+from src.routes.api import (
+    BALANCE_SOURCE, CFD_TOKEN_ADDRESS, POLYGON_RPC_URLS, balance_cache, new_user_values,
+    request_metrics, user_data_payload
+)
+from src.services.amounts import from_units, wei_to_units
+from src.services.async_rpc import AsyncBalanceReader
+from src.services.db_engine import engine_options, configure_engine, normalize_database_url
+from src.services.db_routing import STICKY_HEADER, wants_primary
+
+logger = logging.getLogger(__name__)
+
+ASYNC_DRIVERS = {"sqlite": "sqlite+aiosqlite", "postgresql": "postgresql+asyncpg"}
+# Pedidos Flask em simultâneo (cada um na sua thread) por processo
+ASGI_SYNC_CONCURRENCY = int(os.getenv("ASGI_SYNC_CONCURRENCY", "40"))
+# Ligações HTTP ao RPC em simultâneo por processo
+ASYNC_RPC_MAX_CONNECTIONS = int(os.getenv("ASYNC_RPC_MAX_CONNECTIONS", "1000"))
+
+
+def async_database_url(url):
+    """Mesmo URL com o driver assíncrono (aiosqlite ou asyncpg)"""
+    url = make_url(url)
+    driver = ASYNC_DRIVERS.get(url.get_backend_name(), url.drivername)
+    return url.set(drivername=driver).render_as_string(hide_password=False)
+
+
+class RequestTimings:
+    """Parcelas do pedido async para request_metrics (fora do Flask não há `g` nem eventos por pedido)"""
+
+    def __init__(self):
+        self.db = 0.0
+        self.queries = 0
+        self.rpc = 0.0
+        self.rpc_calls = 0
+        self.serialization = 0.0
+
+    async def query(self, awaitable):
+        """Esperar por uma instrução SQL contando o tempo (inclui a espera por ligação do pool)"""
+        started = time.perf_counter()
+        try:
+            return await awaitable
+        finally:
+            self.db += time.perf_counter() - started
+            self.queries += 1
+
+    async def rpc_call(self, awaitable):
+        started = time.perf_counter()
+        try:
+            return await awaitable
+        finally:
+            self.rpc += time.perf_counter() - started
+            self.rpc_calls += 1
+
+
+class AsyncApp:
+    """Aplicação ASGI: rotas async próprias e a app Flask para tudo o resto"""
+
+    def __init__(self, flask_app):
+        self.flask_app = flask_app
+        self.wsgi = WsgiToAsgi(flask_app)
+        self.routes = {("GET", "/api/user_data"): self.user_data}
+        self._engine = None
+        self._replica_engine = None
+        self._balance_reader = None
+        self._sync_slots = None
+
+    def _create_engine(self, database_url):
+        profile = self.flask_app.config["DB_ENGINE_PROFILE"]
+        url = async_database_url(database_url)
+        engine = create_async_engine(url, **engine_options(url, profile))
+        configure_engine(engine.sync_engine, profile)
+        return engine
+
+    @property
+    def engine(self):
+        if self._engine is None:
+            self._engine = self._create_engine(self.flask_app.config["SQLALCHEMY_DATABASE_URI"])
+        return self._engine
+
+    @property
+    def replica_engine(self):
+        """Réplica de leitura (DATABASE_REPLICA_URL), ou None como na RoutingSession"""
+        replica_url = self.flask_app.config.get("DATABASE_REPLICA_URL")
+        if self._replica_engine is None and replica_url:
+            self._replica_engine = self._create_engine(normalize_database_url(replica_url))
+        return self._replica_engine
+
+    def read_engine(self, primary):
+        return self.engine if primary or self.replica_engine is None else self.replica_engine
+
+    @property
+    def balance_reader(self):
+        if self._balance_reader is None:
+            self._balance_reader = AsyncBalanceReader(
+                POLYGON_RPC_URLS, CFD_TOKEN_ADDRESS, balance_cache,
+                timeout=float(os.getenv("RPC_TIMEOUT", "10")),
+                max_connections=ASYNC_RPC_MAX_CONNECTIONS
+            )
+        return self._balance_reader
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            return await self.lifespan(receive, send)
+
+        handler = self.routes.get((scope["method"], scope["path"])) if scope["type"] == "http" else None
+        if handler is not None:
+            return await handler(scope, receive, send)
+
+        # Cada pedido Flask na sua thread (sem o contexto, o asgiref usa uma só thread para todos)
+        if self._sync_slots is None:
+            self._sync_slots = asyncio.Semaphore(ASGI_SYNC_CONCURRENCY)
+        async with self._sync_slots:
+            async with ThreadSensitiveContext():
+                await self.wsgi(scope, receive, send)
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                for engine in (self._engine, self._replica_engine):
+                    if engine is not None:
+                        await engine.dispose()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    def encode_json(self, payload):
+        return (self.flask_app.json.dumps(payload, separators=(",", ":")) + "\n").encode()
+
+    def cors_headers(self, scope):
+        """Os cabeçalhos que o Flask-CORS põe nas respostas Flask (origins="*")
+
+        Com Origin no pedido é essa a origem devolvida (e Vary: Origin), sem
+        ela "*". Os preflight OPTIONS não têm rota própria e seguem para o Flask.
+        """
+        origin = dict(scope.get("headers") or []).get(b"origin")
+        headers = [
+            (b"access-control-allow-origin", origin or b"*"),
+            (b"access-control-expose-headers", ", ".join(CORS_EXPOSE_HEADERS).encode())
+        ]
+        if origin:
+            headers.append((b"vary", b"Origin"))
+        return headers
+
+    async def send_json(self, send, status, body, headers=()):
+        await send({
+            "type": "http.response.start",
+            "status": status,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                *headers
+            ]
+        })
+        await send({"type": "http.response.body", "body": body})
+
+    async def find_or_create_user(self, wallet_address, primary, timings):
+        statement = select(
+            User.cfd_balance, User.staked_tokens, User.earned_rewards, User.affiliate_earnings
+        ).where(User.wallet_address == wallet_address)
+        if not primary and self.replica_engine is not None:
+            async with self.replica_engine.connect() as conn:
+                user = (await timings.query(conn.execute(statement))).first()
+            if user is not None:
+                return user
+            # A réplica pode estar atrasada: confirmar no primário antes de criar
+
+        async with self.engine.connect() as conn:
+            user = (await timings.query(conn.execute(statement))).first()
+            if user is None:
+                try:
+                    await timings.query(conn.execute(insert(User).values(**new_user_values(wallet_address))))
+                    await conn.commit()
+                except IntegrityError:
+                    # Criado em paralelo por outro pedido
+                    await conn.rollback()
+                user = (await timings.query(conn.execute(statement))).first()
+            return user
+
+    async def get_cfd_balance_wei(self, wallet_address, primary, timings):
+        if BALANCE_SOURCE == "indexer":
+            async with self.read_engine(primary).connect() as conn:
+                balance = await timings.query(conn.scalar(
+                    select(TokenBalance.balance_wei).where(TokenBalance.wallet_address == wallet_address.lower())
+                ))
+            return int(balance) if balance is not None else 0
+        return await timings.rpc_call(self.balance_reader.get_balance(wallet_address))
+
+    async def user_data(self, scope, receive, send):
+        """Versão async de GET /api/user_data (mesma resposta da rota Flask)
+
+        Repete o que o pipeline Flask faz à volta da rota: entra em
+        request_metrics na mesma série (GET /api/user_data) e lê da réplica
+        como @read_only, salvo escrita recente da carteira ou STICKY_HEADER
+        válido. A rota Flask não tem ETag nem cache de resposta, e esta também
+        não. Diferenças que ficam: o tempo de base de dados é medido à volta de
+        cada instrução (e não pelos eventos do cursor) e não há amostragem por
+        cProfile.
+        """
+        started = time.perf_counter()
+        timings = RequestTimings()
+        status, payload = await self._user_data(scope, timings)
+
+        serialization_started = time.perf_counter()
+        body = self.encode_json(payload)
+        timings.serialization = time.perf_counter() - serialization_started
+        request_metrics.observe(
+            "GET", "/api/user_data", status, time.perf_counter() - started, timings.db,
+            timings.rpc, timings.serialization, timings.queries, timings.rpc_calls
+        )
+        await self.send_json(send, status, body, self.cors_headers(scope))
+
+    async def _user_data(self, scope, timings):
+        query = parse_qs(scope.get("query_string", b"").decode())
+        wallet_address = query.get("wallet_address", [None])[0]
+        if not wallet_address:
+            return 400, {'error': 'Endereço da carteira é obrigatório'}
+
+        headers = dict(scope.get("headers") or [])
+        primary_until = headers.get(STICKY_HEADER.lower().encode(), b"").decode("latin-1")
+        primary = wants_primary([wallet_address.lower()], primary_until)
+        try:
+            user = await self.find_or_create_user(wallet_address, primary, timings)
+
+            # Buscar saldo real (indexador ou contrato), se possível
+            cfd_balance = from_units(user.cfd_balance)
+            try:
+                cfd_balance = from_units(wei_to_units(await self.get_cfd_balance_wei(wallet_address, primary, timings)))
+            except Exception as e:
+                logger.warning(f"Erro ao buscar saldo real: {e}")
+
+            return 200, user_data_payload(cfd_balance, user.staked_tokens, user.earned_rewards, user.affiliate_earnings)
+        except Exception as e:
+            logger.error(f"Erro ao obter dados do usuário: {e}")
+            return 500, {'error': 'Erro interno do servidor'}
+
+
+app = AsyncApp(flask_app)
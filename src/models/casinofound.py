@@ -1,7 +1,34 @@
-from flask_sqlalchemy import SQLAlchemy
 from datetime import datetime
 
-db = SQLAlchemy()
+from src.models.db import db
+
+class User(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    wallet_address = db.Column(db.String(42), unique=True, nullable=False)
+    # Saldos em unidades inteiras de ponto fixo (ver src/services/amounts.py)
+    cfd_balance = db.Column(db.BigInteger, nullable=False, default=0)
+    staked_tokens = db.Column(db.BigInteger, nullable=False, default=0)
+    earned_rewards = db.Column(db.BigInteger, nullable=False, default=0)
+    affiliate_earnings = db.Column(db.BigInteger, nullable=False, default=0)
+    referral_code = db.Column(db.String(42), unique=True)
+    referred_by = db.Column(db.String(42), index=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # Marca de alteração para a sincronização incremental do leaderboard
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
+
+class Transaction(db.Model):
+    __table_args__ = (
+        db.Index('ix_transaction_wallet_created', 'wallet_address', 'created_at'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    wallet_address = db.Column(db.String(42), nullable=False)
+    transaction_type = db.Column(db.String(20), nullable=False)  # buy, stake, unstake, affiliate
+    amount = db.Column(db.BigInteger, nullable=False)  # unidades de ponto fixo
+    currency = db.Column(db.String(10), nullable=False)
+    tx_hash = db.Column(db.String(66))
+    status = db.Column(db.String(20), default='pending')  # pending, confirmed, failed
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
 class Newsletter(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -19,7 +46,17 @@ class Newsletter(db.Model):
             'referrer': self.referrer
         }
 
+# Listagem de subscritores ativos (ordenada por id)
+db.Index('ix_newsletter_active_id', Newsletter.id,
+         sqlite_where=Newsletter.is_active == True,
+         postgresql_where=Newsletter.is_active == True)
+
 class ReferralEarning(db.Model):
+    __table_args__ = (
+        db.Index('ix_referral_earning_referrer_id', 'referrer_wallet', 'id'),
+        db.Index('uq_referral_earning_transaction_hash', 'transaction_hash', unique=True),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     referrer_wallet = db.Column(db.String(42), nullable=False)
     referred_wallet = db.Column(db.String(42), nullable=False)
@@ -44,6 +81,12 @@ class ReferralEarning(db.Model):
         }
 
 class TokenPurchase(db.Model):
+    __table_args__ = (
+        db.Index('ix_token_purchase_wallet_address', 'wallet_address'),
+        db.Index('ix_token_purchase_phase_tokens', 'phase', 'tokens_received'),
+        db.Index('uq_token_purchase_transaction_hash', 'transaction_hash', unique=True),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     wallet_address = db.Column(db.String(42), nullable=False)
     amount_invested = db.Column(db.Float, nullable=False)
@@ -69,7 +112,30 @@ class TokenPurchase(db.Model):
             'created_at': self.created_at.isoformat()
         }
 
+class PurchaseStats(db.Model):
+    """Totais de compras mantidos incrementalmente (phase -1 = global)"""
+    GLOBAL_PHASE = -1  # fora das fases válidas, para não somar duas vezes na mesma linha
+
+    phase = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    total_purchases = db.Column(db.Integer, nullable=False, default=0)
+    total_invested = db.Column(db.Float, nullable=False, default=0.0)
+    total_tokens_sold = db.Column(db.Float, nullable=False, default=0.0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def to_dict(self):
+        return {
+            'phase': self.phase,
+            'total_purchases': self.total_purchases,
+            'total_invested': self.total_invested,
+            'total_tokens_sold': self.total_tokens_sold
+        }
+
 class StakingRecord(db.Model):
+    __table_args__ = (
+        db.Index('ix_staking_record_wallet_active', 'wallet_address', 'is_active'),
+        db.Index('uq_staking_record_transaction_hash', 'transaction_hash', unique=True),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     wallet_address = db.Column(db.String(42), nullable=False)
     amount_staked = db.Column(db.Float, nullable=False)
@@ -89,10 +155,30 @@ class StakingRecord(db.Model):
             'transaction_hash': self.transaction_hash
         }
 
+class StakingBalance(db.Model):
+    """Total em staking ativo por carteira, mantido a cada staking/unstake"""
+    wallet_address = db.Column(db.String(42), primary_key=True)
+    total_staked = db.Column(db.Float, nullable=False, default=0.0)
+    active_records = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def to_dict(self):
+        return {
+            'wallet_address': self.wallet_address,
+            'total_staked': self.total_staked,
+            'active_records': self.active_records
+        }
+
 class DividendPayment(db.Model):
+    __table_args__ = (
+        db.Index('ix_dividend_payment_wallet_address', 'wallet_address'),
+        db.Index('uq_dividend_payment_wallet_period', 'wallet_address', 'period_start', 'period_end', unique=True),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     wallet_address = db.Column(db.String(42), nullable=False)
     amount_matic = db.Column(db.Float, nullable=False)
+    amount_wei = db.Column(db.String(78), nullable=True)  # valor exato a transferir
     staked_tokens = db.Column(db.Float, nullable=False)
     payment_date = db.Column(db.DateTime, default=datetime.utcnow)
     period_start = db.Column(db.DateTime, nullable=False)
@@ -104,6 +190,7 @@ class DividendPayment(db.Model):
             'id': self.id,
             'wallet_address': self.wallet_address,
             'amount_matic': self.amount_matic,
+            'amount_wei': self.amount_wei,
             'staked_tokens': self.staked_tokens,
             'payment_date': self.payment_date.isoformat(),
             'period_start': self.period_start.isoformat(),
@@ -124,3 +211,9 @@ class SiteConfig(db.Model):
             'updated_at': self.updated_at.isoformat()
         }
 
+
+class DataVersion(db.Model):
+    """Contador monotónico por conjunto de dados, para invalidar caches entre workers"""
+    name = db.Column(db.String(100), primary_key=True)
+    version = db.Column(db.BigInteger, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
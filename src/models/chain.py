@@ -0,0 +1,65 @@
+from datetime import datetime
+
+from src.models.db import db
+
+class OutboxTransaction(db.Model):
+    __table_args__ = (
+        db.Index('ix_outbox_transaction_status_id', 'status', 'id'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    transaction_id = db.Column(db.Integer, db.ForeignKey('transaction.id'))
+    transaction = db.relationship('Transaction')
+    contract_name = db.Column(db.String(50), nullable=False)
+    function_name = db.Column(db.String(50), nullable=False)
+    args = db.Column(db.Text, nullable=False)  # argumentos da função em JSON
+    status = db.Column(db.String(20), default='queued')  # queued, signed, submitted, confirmed, failed
+    nonce = db.Column(db.Integer)
+    raw_tx = db.Column(db.Text)  # transação assinada (hex), gravada antes da difusão
+    tx_hash = db.Column(db.String(66))
+    block_number = db.Column(db.Integer)
+    attempts = db.Column(db.Integer, default=0)
+    error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def to_dict(self):
+        return {
+            'job_id': self.id,
+            'status': self.status,
+            'tx_hash': self.tx_hash,
+            'nonce': self.nonce,
+            'block_number': self.block_number,
+            'attempts': self.attempts,
+            'error': self.error,
+            'created_at': self.created_at.isoformat()
+        }
+
+class NonceState(db.Model):
+    address = db.Column(db.String(42), primary_key=True)
+    next_nonce = db.Column(db.Integer, nullable=False)
+
+class TokenBalance(db.Model):
+    wallet_address = db.Column(db.String(42), primary_key=True)
+    balance_wei = db.Column(db.String(78), nullable=False, default='0')  # inteiro em texto (excede 64 bits)
+    updated_block = db.Column(db.Integer, nullable=False, default=0)
+
+class TransferLog(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    block_number = db.Column(db.Integer, nullable=False, index=True)
+    block_hash = db.Column(db.String(66), nullable=False)
+    log_index = db.Column(db.Integer, nullable=False)
+    tx_hash = db.Column(db.String(66), nullable=False)
+    from_address = db.Column(db.String(42), nullable=False)
+    to_address = db.Column(db.String(42), nullable=False)
+    value_wei = db.Column(db.String(78), nullable=False)
+
+class IndexerCheckpoint(db.Model):
+    name = db.Column(db.String(50), primary_key=True)
+    block_number = db.Column(db.Integer, nullable=False)
+    block_hash = db.Column(db.String(66), nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class IndexedBlock(db.Model):
+    number = db.Column(db.Integer, primary_key=True)
+    block_hash = db.Column(db.String(66), nullable=False)
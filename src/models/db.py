@@ -0,0 +1,28 @@
+from flask import g, has_request_context
+from flask_sqlalchemy import SQLAlchemy
+from flask_sqlalchemy.session import Session
+
+# Bind da réplica de leitura (SQLALCHEMY_BINDS), opcional
+REPLICA_BIND = "replica"
+
+
+class RoutingSession(Session):
+    """Sessão que envia as leituras de rotas só de leitura para a réplica
+
+    Só há desvio quando o pedido marcou `g.db_read_replica` (ver
+    src/services/db_routing.py) e existe o bind da réplica; flush, INSERT,
+    UPDATE e DELETE vão sempre para o primário.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if (bind is None and not self._flushing
+                and has_request_context() and g.get("db_read_replica")
+                and not getattr(clause, "is_dml", False)):
+            engine = self._db.engines.get(REPLICA_BIND)
+            if engine is not None:
+                return engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+# Instância única partilhada por todos os modelos e blueprints
+db = SQLAlchemy(session_options={"class_": RoutingSession})
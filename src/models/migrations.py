@@ -0,0 +1,362 @@
+import logging
+from datetime import datetime
+
+import sqlalchemy as sa
+
+logger = logging.getLogger(__name__)
+
+# Tabela de controlo fora do metadata dos modelos
+_migrations_metadata = sa.MetaData()
+schema_migrations = sa.Table(
+    "schema_migrations",
+    _migrations_metadata,
+    sa.Column("version", sa.Integer, primary_key=True),
+    sa.Column("description", sa.String(200), nullable=False),
+    sa.Column("applied_at", sa.DateTime, nullable=False)
+)
+
+MIGRATIONS = []
+
+
+def migration(version, description):
+    """Registar uma migração; cada uma recebe (conn, metadata) e corre numa transação
+
+    `metadata` descreve os modelos atuais, não o esquema da versão anterior:
+    antes de usar uma tabela, coluna ou índice do modelo, confirmar que existe
+    na base de dados (_has_tables, _live_columns, _create_indexes).
+    """
+    def decorator(fn):
+        MIGRATIONS.append((version, description, fn))
+        MIGRATIONS.sort(key=lambda m: m[0])
+        return fn
+    return decorator
+
+
+def _create_tables(conn, metadata, table_names):
+    tables = [metadata.tables[name] for name in table_names if name in metadata.tables]
+    metadata.create_all(conn, tables=tables)
+
+
+def _has_tables(conn, *table_names):
+    """Tabelas presentes na base de dados (as da antiga main.py só chegam na migração 11)"""
+    existing = set(sa.inspect(conn).get_table_names())
+    return all(name in existing for name in table_names)
+
+
+def _live_columns(conn, table_name):
+    """Colunas que a tabela tem de facto na base de dados (o modelo pode já ter mais)"""
+    return {column["name"] for column in sa.inspect(conn).get_columns(table_name)}
+
+
+def _create_indexes(conn, metadata, table_names=None):
+    """Criar os índices do modelo que o esquema atual já suporta
+
+    Índices sobre tabelas ou colunas ainda inexistentes ficam para a migração
+    que as cria (ex.: ix_user_updated_at só na migração 10).
+    """
+    existing = set(sa.inspect(conn).get_table_names())
+    for table in metadata.sorted_tables:
+        if table.name not in existing or (table_names is not None and table.name not in table_names):
+            continue
+        columns = _live_columns(conn, table.name)
+        for index in table.indexes:
+            if all(column.name in columns for column in index.columns):
+                index.create(conn, checkfirst=True)
+
+
+def _move_template_users(conn, metadata):
+    """Passar a tabela 'user' do template (username/email) para 'users'
+
+    Na base de dados do template (src/database/app.db) 'user' guardava os
+    utilizadores de /users; no esquema unificado esse nome é o das carteiras.
+    As linhas são copiadas para 'users' (as que já lá estão, pelo username ou
+    email, não se repetem; ids ocupados recebem um novo) e 'user' é recriada
+    com o esquema das carteiras.
+    """
+    if not _has_tables(conn, "user") or "users" not in metadata.tables:
+        return
+    columns = _live_columns(conn, "user")
+    if "wallet_address" in columns or not {"username", "email"} <= columns:
+        return
+
+    old = sa.Table("user", sa.MetaData(), autoload_with=conn)
+    users = metadata.tables["users"]
+    users.create(conn, checkfirst=True)
+    existing = conn.execute(sa.select(users.c.id, users.c.username, users.c.email)).all()
+    taken_ids = {row.id for row in existing}
+    taken = {row.username for row in existing} | {row.email for row in existing}
+
+    rows = []
+    for row in conn.execute(sa.select(old.c.id, old.c.username, old.c.email).order_by(old.c.id)):
+        if row.username in taken or row.email in taken:
+            continue
+        values = {"username": row.username, "email": row.email}
+        if row.id not in taken_ids:
+            values["id"] = row.id
+        taken_ids.add(row.id)
+        taken.update((row.username, row.email))
+        rows.append(values)
+    # Com e sem id em listas separadas: um executemany usa as colunas da primeira linha
+    for batch in ([r for r in rows if "id" in r], [r for r in rows if "id" not in r]):
+        if batch:
+            conn.execute(users.insert(), batch)
+
+    old.drop(conn)
+    metadata.tables["user"].create(conn)
+    logger.info(f"{len(rows)} utilizadores do template copiados de 'user' para 'users'")
+
+
+@migration(1, "Esquema inicial")
+def initial_schema(conn, metadata):
+    _move_template_users(conn, metadata)
+    metadata.create_all(conn)
+
+
+@migration(2, "Índices de wallet_address/referrer e índices parciais de registos ativos")
+def lookup_indexes(conn, metadata):
+    # Em bases de dados existentes create_all não recria índices de tabelas já presentes
+    _create_indexes(conn, metadata)
+
+
+# Linha do total global em purchase_stats (era 0 até à migração 13)
+_PURCHASE_STATS_GLOBAL = -1
+
+
+def _backfill_purchase_stats(conn, metadata):
+    """Recalcular purchase_stats a partir de token_purchase (fase -1 = total global)"""
+    stats = metadata.tables["purchase_stats"]
+    purchases = metadata.tables["token_purchase"]
+    rows = conn.execute(sa.select(
+        purchases.c.phase,
+        sa.func.count(),
+        sa.func.coalesce(sa.func.sum(purchases.c.amount_invested), 0.0),
+        sa.func.coalesce(sa.func.sum(purchases.c.tokens_received), 0.0)
+    ).group_by(purchases.c.phase)).all()
+
+    now = datetime.utcnow()
+    overall = [0, 0.0, 0.0]
+    totals = {}
+    for phase, count, invested, tokens in rows:
+        totals[phase] = [count, invested, tokens]
+        overall = [overall[0] + count, overall[1] + invested, overall[2] + tokens]
+    totals[_PURCHASE_STATS_GLOBAL] = overall
+
+    conn.execute(stats.delete())
+    conn.execute(stats.insert(), [
+        {"phase": phase, "total_purchases": count, "total_invested": invested,
+         "total_tokens_sold": tokens, "updated_at": now}
+        for phase, (count, invested, tokens) in totals.items()
+    ])
+
+
+@migration(3, "Totais de compras pré-calculados (purchase_stats)")
+def purchase_stats(conn, metadata):
+    if "purchase_stats" not in metadata.tables or not _has_tables(conn, "token_purchase"):
+        return
+    metadata.tables["purchase_stats"].create(conn, checkfirst=True)
+    _backfill_purchase_stats(conn, metadata)
+
+
+@migration(4, "Outbox de transações administrativas e estado de nonces")
+def transaction_outbox(conn, metadata):
+    _create_tables(conn, metadata, ["outbox_transaction", "nonce_state"])
+
+
+def _rebuild_sqlite_table(conn, table, column_names, select_sql):
+    """Recriar uma tabela SQLite trocando o tipo de `column_names` pelo do modelo
+
+    O SQLite não altera tipos de colunas. A nova tabela copia o esquema real
+    (colunas que o modelo ganhou em migrações posteriores ainda não existem),
+    é criada sem índices, preenchida via `select_sql`, e só depois de trocar
+    de nome os índices do modelo são recriados.
+    """
+    quote = conn.dialect.identifier_preparer.quote
+    live = sa.Table(table.name, sa.MetaData(), autoload_with=conn)
+    new_table = live.to_metadata(sa.MetaData(), name=f"_{table.name}_new")
+    new_table.indexes.clear()
+    for name in column_names:
+        new_table.c[name].type = table.c[name].type
+        new_table.c[name].nullable = table.c[name].nullable
+    new_table.create(conn)
+
+    columns = ", ".join(quote(column.name) for column in live.columns)
+    conn.execute(sa.text(f"INSERT INTO {quote(new_table.name)} ({columns}) {select_sql}"))
+    conn.execute(sa.text(f"DROP TABLE {quote(table.name)}"))
+    conn.execute(sa.text(f"ALTER TABLE {quote(new_table.name)} RENAME TO {quote(table.name)}"))
+    _create_indexes(conn, table.metadata, [table.name])
+
+
+def _float_columns_to_units(conn, table, column_names, scale):
+    quote = conn.dialect.identifier_preparer.quote
+    if conn.dialect.name == "postgresql":
+        for name in column_names:
+            conn.execute(sa.text(
+                f"ALTER TABLE {quote(table.name)} ALTER COLUMN {quote(name)} TYPE BIGINT "
+                f"USING ROUND(COALESCE({quote(name)}, 0) * {scale})::bigint"
+            ))
+        return
+
+    # Só as colunas que a tabela já tem (user.updated_at chega na migração 10)
+    live_columns = [column["name"] for column in sa.inspect(conn).get_columns(table.name)]
+    select_list = ", ".join(
+        f"CAST(ROUND(COALESCE({quote(name)}, 0) * {scale}) AS INTEGER)"
+        if name in column_names else quote(name)
+        for name in live_columns
+    )
+    _rebuild_sqlite_table(conn, table, column_names, f"SELECT {select_list} FROM {quote(table.name)}")
+
+
+@migration(5, "Saldos e montantes em inteiros de ponto fixo (8 casas decimais)")
+def fixed_point_amounts(conn, metadata):
+    # Bases de dados do template que passaram a migração 1 antes de esta mover a tabela
+    _move_template_users(conn, metadata)
+    scale = 10 ** 8
+    user = metadata.tables.get("user")
+    if user is not None and "cfd_balance" in user.c:
+        _float_columns_to_units(
+            conn, user, ["cfd_balance", "staked_tokens", "earned_rewards", "affiliate_earnings"], scale
+        )
+    transaction = metadata.tables.get("transaction")
+    if transaction is not None:
+        _float_columns_to_units(conn, transaction, ["amount"], scale)
+
+
+@migration(6, "transaction_hash único em token_purchase, referral_earning e staking_record")
+def unique_transaction_hashes(conn, metadata):
+    if "token_purchase" not in metadata.tables or not _has_tables(conn, "token_purchase"):
+        return
+    for name in ("token_purchase", "referral_earning", "staking_record"):
+        table = metadata.tables[name]
+        tx_hash = table.c.transaction_hash
+
+        # Hash vazio passa a NULL (NULLs não colidem no índice único)
+        conn.execute(table.update().where(tx_hash == "").values(transaction_hash=None))
+
+        # Remover duplicados, mantendo o primeiro registo de cada hash
+        first_ids = sa.select(sa.func.min(table.c.id)).where(
+            tx_hash.is_not(None)
+        ).group_by(tx_hash).scalar_subquery()
+        removed = conn.execute(table.delete().where(
+            tx_hash.is_not(None), table.c.id.not_in(first_ids)
+        )).rowcount
+        if removed:
+            logger.warning(f"{removed} registos duplicados removidos de {name}")
+
+    _create_indexes(conn, metadata, ["token_purchase", "referral_earning", "staking_record"])
+    _backfill_purchase_stats(conn, metadata)
+
+
+@migration(7, "Versões de dados para invalidação de caches (data_version)")
+def data_versions(conn, metadata):
+    _create_tables(conn, metadata, ["data_version"])
+
+
+@migration(8, "Valor exato em wei e pagamento único por carteira e período em dividend_payment")
+def dividend_payment_wei(conn, metadata):
+    if "dividend_payment" not in metadata.tables or not _has_tables(conn, "dividend_payment"):
+        return
+    if "amount_wei" not in _live_columns(conn, "dividend_payment"):
+        conn.execute(sa.text("ALTER TABLE dividend_payment ADD COLUMN amount_wei VARCHAR(78)"))
+    _create_indexes(conn, metadata, ["dividend_payment"])
+
+
+def _backfill_staking_balances(conn, metadata):
+    """Recalcular staking_balance a partir dos registos de staking ativos"""
+    balances = metadata.tables["staking_balance"]
+    records = metadata.tables["staking_record"]
+    rows = conn.execute(sa.select(
+        records.c.wallet_address,
+        sa.func.coalesce(sa.func.sum(records.c.amount_staked), 0.0),
+        sa.func.count()
+    ).where(records.c.is_active == sa.true()).group_by(records.c.wallet_address)).all()
+
+    now = datetime.utcnow()
+    conn.execute(balances.delete())
+    if rows:
+        conn.execute(balances.insert(), [
+            {"wallet_address": wallet, "total_staked": total, "active_records": count, "updated_at": now}
+            for wallet, total, count in rows
+        ])
+
+
+@migration(9, "Totais de staking por carteira (staking_balance)")
+def staking_balances(conn, metadata):
+    if "staking_balance" not in metadata.tables or not _has_tables(conn, "staking_record"):
+        return
+    metadata.tables["staking_balance"].create(conn, checkfirst=True)
+    _backfill_staking_balances(conn, metadata)
+
+
+@migration(10, "Coluna user.updated_at para sincronização incremental do leaderboard")
+def user_updated_at(conn, metadata):
+    user = metadata.tables.get("user")
+    if user is None or "updated_at" not in user.c:
+        return
+    if "updated_at" not in _live_columns(conn, "user"):
+        conn.execute(sa.text('ALTER TABLE "user" ADD COLUMN updated_at TIMESTAMP'))
+        conn.execute(sa.text('UPDATE "user" SET updated_at = COALESCE(created_at, CURRENT_TIMESTAMP)'))
+    _create_indexes(conn, metadata, ["user"])
+
+
+
+@migration(11, "Base de dados única: tabelas e índices em falta e totais derivados")
+def unified_schema(conn, metadata):
+    # Bases de dados já migradas pela antiga main.py (até à versão 10) só tinham
+    # as tabelas dos seus modelos: faltam as do blueprint (as migrações 3, 6, 8
+    # e 9 não tiveram efeito) e a newsletter não tinha referrer
+    if _has_tables(conn, "newsletter") and "referrer" not in _live_columns(conn, "newsletter"):
+        conn.execute(sa.text("ALTER TABLE newsletter ADD COLUMN referrer VARCHAR(42)"))
+
+    metadata.create_all(conn)
+    _create_indexes(conn, metadata)
+    _backfill_purchase_stats(conn, metadata)
+    _backfill_staking_balances(conn, metadata)
+
+
+
+@migration(12, "Transação assinada (raw_tx) no outbox, gravada antes da difusão")
+def outbox_raw_tx(conn, metadata):
+    if not _has_tables(conn, "outbox_transaction"):
+        return
+    if "raw_tx" not in _live_columns(conn, "outbox_transaction"):
+        conn.execute(sa.text("ALTER TABLE outbox_transaction ADD COLUMN raw_tx TEXT"))
+
+
+@migration(13, "Total global de purchase_stats na linha -1 (a fase 0 somava duas vezes)")
+def purchase_stats_global_row(conn, metadata):
+    if "purchase_stats" not in metadata.tables or not _has_tables(conn, "purchase_stats", "token_purchase"):
+        return
+    _backfill_purchase_stats(conn, metadata)
+
+def applied_versions(conn):
+    _migrations_metadata.create_all(conn)
+    return {row.version for row in conn.execute(sa.select(schema_migrations.c.version))}
+
+
+def upgrade(db, engine=None, target=None):
+    """Aplicar por ordem as migrações pendentes (até `target`, se dado); devolve as versões aplicadas"""
+    engine = engine or db.engine
+    with engine.begin() as conn:
+        done = applied_versions(conn)
+
+    applied = []
+    for version, description, fn in MIGRATIONS:
+        if version in done:
+            continue
+        if target is not None and version > target:
+            break
+        try:
+            with engine.begin() as conn:
+                fn(conn, db.metadata)
+                conn.execute(schema_migrations.insert().values(
+                    version=version,
+                    description=description,
+                    applied_at=datetime.utcnow()
+                ))
+        except sa.exc.IntegrityError:
+            # Outro worker aplicou a mesma migração em paralelo
+            logger.info(f"Migração {version} já aplicada por outro processo")
+            continue
+        logger.info(f"Migração {version} aplicada: {description}")
+        applied.append(version)
+    return applied
@@ -0,0 +1,785 @@
+import functools
+import hmac
+import json
+import os
+import smtplib
+from datetime import datetime
+from email.mime.text import MIMEText
+from email.mime.multipart import MIMEMultipart
+
+from flask import Blueprint, Response, current_app, request, jsonify
+from web3 import Web3
+from sqlalchemy.exc import IntegrityError
+from src.models.db import db
+from src.models.casinofound import User, Newsletter, Transaction
+from src.models.chain import OutboxTransaction, NonceState, TokenBalance, TransferLog, IndexerCheckpoint, IndexedBlock
+from src.models.migrations import upgrade
+from src.routes.casinofound import referral_graph, response_cache, config_cache, idempotency_cache
+from src.services.cache import TTLCache
+from src.services.balance_reader import BatchBalanceReader
+from src.services.chain_indexer import ChainIndexer
+from src.services.tx_queue import TxSubmitter, ReceiptPoller, run_loop
+from src.services.chain_metadata import ChainMetadata
+from src.services.rpc_provider import FailoverHTTPProvider
+from src.services.amounts import to_units, from_units, wei_to_units
+from src.services.leaderboard import Leaderboards
+from src.services.db_routing import read_only, use_primary
+from src.services.metrics import RequestMetrics, render_histogram, render_stats
+
+# Rotas da aplicação principal (caminhos completos: /health e /api/...)
+# Os comandos CLI ficam no nível de topo: flask db-upgrade, flask run-indexer, ...
+api_bp = Blueprint('api', __name__, cli_group=None)
+
+# Configuração Web3 com as suas credenciais (carregadas de variáveis de ambiente)
+INFURA_API_KEY = os.getenv("INFURA_API_KEY")
+POLYGON_RPC_URL = os.getenv("POLYGON_RPC_URL", f"https://polygon-mainnet.infura.io/v3/{INFURA_API_KEY}")
+WALLETCONNECT_PROJECT_ID = os.getenv("WALLETCONNECT_PROJECT_ID")
+EMAILJS_SERVICE_ID = os.getenv("EMAILJS_SERVICE_ID")
+ADMIN_PRIVATE_KEY = os.getenv("ADMIN_PRIVATE_KEY") # Chave privada para assinar transações
+
+# Endereços dos contratos (carregados de variáveis de ambiente)
+CFD_TOKEN_ADDRESS = os.getenv("CFD_TOKEN_ADDRESS")
+ICO_PHASE1_ADDRESS = os.getenv("ICO_PHASE1_ADDRESS")
+AFFILIATE_MANAGER_ADDRESS = os.getenv("AFFILIATE_MANAGER_ADDRESS")
+
+# Vários URLs RPC separados por vírgula (failover); por defeito só POLYGON_RPC_URL
+POLYGON_RPC_URLS = [url.strip() for url in os.getenv("POLYGON_RPC_URLS", POLYGON_RPC_URL).split(",") if url.strip()]
+
+# Inicializar Web3
+rpc_provider = FailoverHTTPProvider(
+    POLYGON_RPC_URLS,
+    timeout=float(os.getenv("RPC_TIMEOUT", "10")),
+    pool_size=int(os.getenv("RPC_POOL_SIZE", "20")),
+    retries=int(os.getenv("RPC_RETRIES", "2")),
+    hedge_delay=float(os.getenv("RPC_HEDGE_DELAY", "0.25"))
+)
+w3 = Web3(rpc_provider)
+
+# Latência por rota (SQL, RPC e JSON) e cProfile amostrado de pedidos lentos
+request_metrics = RequestMetrics(
+    slow_ms=float(os.getenv("METRICS_SLOW_REQUEST_MS", "1000")),
+    profile_rate=float(os.getenv("METRICS_PROFILE_RATE", "0")),
+    keep_profiles=int(os.getenv("METRICS_PROFILE_KEEP", "20"))
+)
+w3.middleware_onion.add(request_metrics.web3_middleware, "request_metrics")
+# /metrics e /api/metrics/profiles só existem com METRICS_TOKEN (Authorization: Bearer <token>)
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+
+# chain_id, gas_price, último bloco e estado da ligação em cache (atualizados em segundo plano)
+chain_metadata = ChainMetadata(w3, refresh_interval=float(os.getenv("CHAIN_METADATA_REFRESH", "10")))
+# eth_chainId pedido pela validação antes de cada eth_call sai da mesma cache
+w3.middleware_onion.add(chain_metadata.web3_middleware, "chain_id_cache")
+
+# Cache de saldos on-chain (balanceOf) por carteira
+BALANCE_CACHE_TTL = float(os.getenv("BALANCE_CACHE_TTL", "15"))
+BALANCE_CACHE_MAX_SIZE = int(os.getenv("BALANCE_CACHE_MAX_SIZE", "50000"))
+balance_cache = TTLCache(ttl=BALANCE_CACHE_TTL, max_size=BALANCE_CACHE_MAX_SIZE)
+
+# Carregar ABIs dos arquivos JSON
+ABI_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "abi")
+
+def load_abi(filename):
+    filepath = os.path.join(ABI_DIR, filename)
+    with open(filepath, "r") as f:
+        return json.load(f)
+
+# Contratos construídos no primeiro uso, não no arranque de cada worker
+CONTRACTS = {
+    "cfd_token": (CFD_TOKEN_ADDRESS, "CFD.json"),
+    "affiliate_manager": (AFFILIATE_MANAGER_ADDRESS, "AffiliateManager.json"),
+    "ico_phase1": (ICO_PHASE1_ADDRESS, "ICOPhase1.json"),
+}
+
+@functools.cache
+def get_contract(name):
+    address, abi_file = CONTRACTS[name]
+    return w3.eth.contract(address=address, abi=load_abi(abi_file))
+
+# Leitura agregada de saldos (Multicall3) para pedidos com muitas carteiras
+MULTICALL_CHUNK_SIZE = int(os.getenv("MULTICALL_CHUNK_SIZE", "500"))
+MAX_BATCH_WALLETS = int(os.getenv("MAX_BATCH_WALLETS", "5000"))
+
+@functools.cache
+def get_batch_balance_reader():
+    return BatchBalanceReader(w3, get_contract("cfd_token"), chunk_size=MULTICALL_CHUNK_SIZE)
+
+# O esquema é criado/migrado num passo explícito antes do arranque dos workers:
+#   flask --app main db-upgrade
+@api_bp.cli.command("db-upgrade")
+def db_upgrade():
+    """Aplicar migrações pendentes do esquema"""
+    applied = upgrade(db)
+    print(f"Migrações aplicadas: {applied or 'nenhuma'}")
+
+# Indexador de eventos Transfer do CFD (executado num worker separado)
+BALANCE_SOURCE = os.getenv("BALANCE_SOURCE", "rpc")  # rpc ou indexer
+
+@functools.cache
+def get_chain_indexer():
+    return ChainIndexer(
+        w3, get_contract("cfd_token"), db,
+        balance_model=TokenBalance,
+        transfer_model=TransferLog,
+        checkpoint_model=IndexerCheckpoint,
+        block_model=IndexedBlock,
+        start_block=int(os.getenv("INDEXER_START_BLOCK", "0")),
+        window_size=int(os.getenv("INDEXER_WINDOW_SIZE", "2000")),
+        confirmations=int(os.getenv("INDEXER_CONFIRMATIONS", "32"))
+    )
+
+@api_bp.cli.command("run-indexer")
+def run_indexer():
+    """Sincronizar continuamente os eventos Transfer para a base de dados"""
+    get_chain_indexer().run_forever(poll_interval=float(os.getenv("INDEXER_POLL_INTERVAL", "5")))
+
+# Leaderboards ordenados em memória por worker, sincronizados por User.updated_at
+LEADERBOARD_COLUMNS = {
+    'balance': 'cfd_balance',
+    'staked': 'staked_tokens',
+    'affiliate_earnings': 'affiliate_earnings'
+}
+LEADERBOARD_MAX_LIMIT = 1000
+leaderboards = Leaderboards(
+    db, User, LEADERBOARD_COLUMNS,
+    sync_interval=float(os.getenv("LEADERBOARD_SYNC_INTERVAL", "2"))
+)
+
+# Alterações de saldo atómicas: um único UPDATE condicional com RETURNING,
+# sem SELECT prévio, para não haver gasto duplo entre workers
+def adjust_user_balances(wallet_address, deltas, require=None):
+    """Somar `deltas` ({coluna: unidades}) às colunas do usuário
+
+    `require` ({coluna: mínimo}) torna o UPDATE condicional. Devolve a linha
+    atualizada, ou None se o usuário não existe ou a condição falhou.
+    """
+    statement = db.update(User).where(User.wallet_address == wallet_address)
+    for column, minimum in (require or {}).items():
+        statement = statement.where(getattr(User, column) >= minimum)
+    statement = statement.values({
+        getattr(User, column): getattr(User, column) + delta
+        for column, delta in deltas.items()
+    }).returning(User.cfd_balance, User.staked_tokens, User.affiliate_earnings)
+    row = db.session.execute(statement).first()
+    if row is not None:
+        leaderboards.invalidate()
+    return row
+
+def credit_user(wallet_address, **deltas):
+    """Creditar saldos, criando o usuário se ainda não existir"""
+    if adjust_user_balances(wallet_address, deltas) is not None:
+        return
+    try:
+        with db.session.begin_nested():
+            db.session.add(User(wallet_address=wallet_address, referral_code=wallet_address, **deltas))
+    except IntegrityError:
+        # Criado entretanto por outro pedido
+        adjust_user_balances(wallet_address, deltas)
+
+# Fila de transações assinadas pelo administrador (outbox + worker de submissão)
+def credit_confirmed_transaction(job):
+    """Creditar o saldo local quando a transação on-chain é confirmada"""
+    transaction = job.transaction
+    if transaction is None:
+        return
+    # credit_user e não adjust_user_balances: o comprador pode ainda não ter linha em User
+    if transaction.transaction_type == 'buy':
+        credit_user(transaction.wallet_address, cfd_balance=transaction.amount)
+    elif transaction.transaction_type == 'affiliate':
+        credit_user(transaction.wallet_address, affiliate_earnings=transaction.amount)
+
+@functools.cache
+def get_tx_submitter():
+    """Submissor do outbox, ou None sem ADMIN_PRIVATE_KEY (modo simulado)"""
+    if not ADMIN_PRIVATE_KEY:
+        return None
+    return TxSubmitter(
+        w3,
+        {'cfd_token': get_contract('cfd_token'), 'affiliate_manager': get_contract('affiliate_manager')},
+        db,
+        outbox_model=OutboxTransaction,
+        nonce_model=NonceState,
+        private_key=ADMIN_PRIVATE_KEY,
+        chain_metadata=chain_metadata,
+        gas_limit=int(os.getenv("TX_GAS_LIMIT", "2000000")),
+        batch_size=int(os.getenv("TX_BATCH_SIZE", "20")),
+        # Segundos sem recibo até reenviar (ou dar como falhada) uma transação submetida
+        stuck_after=float(os.getenv("TX_STUCK_SECONDS", "600"))
+    )
+
+@functools.cache
+def get_receipt_poller():
+    return ReceiptPoller(w3, db, OutboxTransaction, on_confirmed=credit_confirmed_transaction)
+
+@api_bp.cli.command("run-tx-submitter")
+def run_tx_submitter():
+    """Assinar e difundir as transações do outbox (executar uma única instância)"""
+    tx_submitter = get_tx_submitter()
+    if tx_submitter is None:
+        raise SystemExit("ADMIN_PRIVATE_KEY não configurada")
+    run_loop(db, tx_submitter.submit_batch, float(os.getenv("TX_SUBMIT_INTERVAL", "1")), "submissão de transações")
+
+@api_bp.cli.command("run-receipt-poller")
+def run_receipt_poller():
+    """Acompanhar os recibos das transações submetidas"""
+    run_loop(db, get_receipt_poller().poll, float(os.getenv("TX_RECEIPT_INTERVAL", "3")), "leitura de recibos")
+
+def get_cfd_balance_wei(wallet_address):
+    """Saldo CFD em wei: do indexador ou do contrato (via cache)"""
+    if BALANCE_SOURCE == "indexer":
+        return get_chain_indexer().get_balance(wallet_address) or 0
+    return balance_cache.get_or_load(
+        wallet_address.lower(),
+        lambda: get_contract("cfd_token").functions.balanceOf(wallet_address).call()
+    )
+
+# Rotas da API
+
+@api_bp.route("/health", methods=["GET"])
+def health_check():
+    # Estado da ligação Web3 em cache: as sondas não geram chamadas RPC
+    chain_status = chain_metadata.snapshot()
+
+    db_connected = False
+    try:
+        db.session.execute(db.text("SELECT 1"))
+        db_connected = True
+    except Exception:
+        pass
+
+    return jsonify({
+        "status": "healthy",
+        "timestamp": datetime.utcnow().isoformat(),
+        "web3_connected": chain_status["connected"],
+        "web3_checked_at": chain_status["checked_at"],
+        "web3_status_age_seconds": chain_status["age_seconds"],
+        "latest_block": chain_status["latest_block"],
+        "database_connected": db_connected
+    })
+
+TOTAL_SUPPLY = 21000000  # 21 milhões de tokens
+
+def new_user_values(wallet_address):
+    """Colunas de um utilizador criado no primeiro acesso (partilhado com src/asgi.py)"""
+    return dict(
+        wallet_address=wallet_address,
+        referral_code=wallet_address,
+        cfd_balance=0,
+        staked_tokens=0,
+        earned_rewards=0,
+        affiliate_earnings=0
+    )
+
+def user_data_payload(cfd_balance, staked_tokens, earned_rewards, affiliate_earnings):
+    """Resposta de /api/user_data a partir do saldo (tokens) e dos valores em unidades"""
+    # Calcular percentagem do total supply
+    cfd_percentage = (cfd_balance / TOTAL_SUPPLY) * 100 if TOTAL_SUPPLY > 0 else 0
+    return {
+        "cfd_balance": f"{cfd_balance:.2f}",
+        "total_supply": f"{TOTAL_SUPPLY:,}",
+        "cfd_percentage": f"{cfd_percentage:.4f}",
+        "staked_tokens": f"{from_units(staked_tokens):.2f}",
+        "earned_rewards": f"{from_units(earned_rewards):.4f}",
+        "affiliate_earnings": f"{from_units(affiliate_earnings):.4f}"
+    }
+
+@api_bp.route("/api/user_data", methods=["GET"])
+@read_only
+def get_user_data():
+    """Obter dados do usuário"""
+    wallet_address = request.args.get('wallet_address')
+    
+    if not wallet_address:
+        return jsonify({'error': 'Endereço da carteira é obrigatório'}), 400
+    
+    try:
+        # Buscar ou criar usuário
+        user = User.query.filter_by(wallet_address=wallet_address).first()
+        if not user:
+            # A réplica pode estar atrasada: confirmar no primário antes de criar
+            use_primary()
+            user = User.query.filter_by(wallet_address=wallet_address).first()
+        if not user:
+            user = User(**new_user_values(wallet_address))
+            db.session.add(user)
+            db.session.commit()
+        
+        # Buscar saldo real (indexador ou contrato), se possível
+        cfd_balance = from_units(user.cfd_balance)
+        try:
+            real_balance = get_cfd_balance_wei(wallet_address)
+            cfd_balance = from_units(wei_to_units(real_balance))  # Converter de wei para tokens
+        except Exception as e:
+            current_app.logger.warning(f"Erro ao buscar saldo real: {e}")
+        
+        return jsonify(user_data_payload(
+            cfd_balance, user.staked_tokens, user.earned_rewards, user.affiliate_earnings
+        ))
+        
+    except Exception as e:
+        current_app.logger.error(f"Erro ao obter dados do usuário: {e}")
+        return jsonify({'error': 'Erro interno do servidor'}), 500
+
+@api_bp.route("/api/user_data/batch", methods=["POST"])
+@read_only
+def get_user_data_batch():
+    """Obter saldos CFD de várias carteiras num só pedido"""
+    data = request.get_json(silent=True) or {}
+    wallet_addresses = data.get('wallet_addresses')
+
+    if not isinstance(wallet_addresses, list) or not wallet_addresses:
+        return jsonify({'error': 'Lista de endereços de carteira é obrigatória'}), 400
+
+    if len(wallet_addresses) > MAX_BATCH_WALLETS:
+        return jsonify({'error': f'Máximo de {MAX_BATCH_WALLETS} carteiras por pedido'}), 400
+
+    invalid = [a for a in wallet_addresses if not isinstance(a, str) or not Web3.is_address(a)]
+    if invalid:
+        return jsonify({'error': 'Endereços de carteira inválidos', 'invalid': invalid[:100]}), 400
+
+    try:
+        wallets = list(dict.fromkeys(a.lower() for a in wallet_addresses))
+
+        # Servir o que já está indexado ou em cache e agregar o resto em chamadas Multicall
+        balances = {}
+        missing = []
+        if BALANCE_SOURCE == "indexer":
+            indexed = {
+                row.wallet_address: int(row.balance_wei)
+                for row in TokenBalance.query.filter(TokenBalance.wallet_address.in_(wallets))
+            }
+            balances = {wallet: indexed.get(wallet, 0) for wallet in wallets}
+        else:
+            for wallet in wallets:
+                cached = balance_cache.get(wallet)
+                if cached is None:
+                    missing.append(wallet)
+                else:
+                    balances[wallet] = cached
+
+        if missing:
+            fetched = get_batch_balance_reader().fetch(missing)
+            for wallet, balance in fetched.items():
+                if balance is not None:
+                    balance_cache.set(wallet, balance)
+                balances[wallet] = balance
+
+        return jsonify({
+            "balances": {
+                wallet: f"{balance / (10**18):.2f}" if balance is not None else None
+                for wallet, balance in balances.items()
+            },
+            "total": len(wallets),
+            "failed": [wallet for wallet, balance in balances.items() if balance is None]
+        })
+
+    except Exception as e:
+        current_app.logger.error(f"Erro ao obter saldos em lote: {e}")
+        return jsonify({'error': 'Erro interno do servidor'}), 500
+
+@api_bp.route("/api/tx_jobs/<int:job_id>", methods=["GET"])
+def get_tx_job(job_id):
+    """Obter o estado de uma transação em fila"""
+    job = db.session.get(OutboxTransaction, job_id)
+    if not job:
+        return jsonify({'error': 'Job não encontrado'}), 404
+    return jsonify(job.to_dict())
+
+@api_bp.route("/api/rpc/metrics", methods=["GET"])
+def get_rpc_metrics():
+    """Obter latências e erros por método RPC e o estado dos endpoints"""
+    metrics = rpc_provider.metrics.snapshot()
+    metrics["endpoints"] = rpc_provider.endpoint_status()
+    return jsonify(metrics)
+
+def require_metrics_token(fn):
+    """Rota de métricas: 404 sem METRICS_TOKEN configurado, 401 sem o token certo"""
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        if not METRICS_TOKEN:
+            return jsonify({'error': 'Não encontrado'}), 404
+        auth_header = request.headers.get('Authorization', '')
+        if not hmac.compare_digest(auth_header.encode(), f"Bearer {METRICS_TOKEN}".encode()):
+            return jsonify({'error': 'Não autorizado'}), 401
+        return fn(*args, **kwargs)
+    return wrapper
+
+@api_bp.route("/metrics", methods=["GET"])
+@require_metrics_token
+def get_metrics():
+    """Métricas no formato de texto do Prometheus"""
+    lines = []
+    request_metrics.render(lines)
+
+    rpc = rpc_provider.metrics.snapshot()
+    render_histogram(lines, "rpc_request_duration_seconds", "Latência das chamadas RPC por método",
+                     ("method",), rpc["buckets"],
+                     {(method,): entry for method, entry in rpc["methods"].items()})
+    lines.append("# HELP rpc_errors_total Erros RPC por método")
+    lines.append("# TYPE rpc_errors_total counter")
+    for method, entry in sorted(rpc["methods"].items()):
+        lines.append(f'rpc_errors_total{{method="{method}"}} {entry["errors"]}')
+
+    render_stats(lines, "app_cache_stat", "Contadores das caches e índices em memória", {
+        "balances": balance_cache.stats(),
+        "responses": response_cache.stats(),
+        "config": config_cache.stats(),
+        "idempotency": idempotency_cache.stats(),
+        "referral_graph": referral_graph.stats()
+    })
+    return Response("\n".join(lines) + "\n", mimetype="text/plain; version=0.0.4")
+
+@api_bp.route("/api/metrics/profiles", methods=["GET"])
+@require_metrics_token
+def get_metrics_profiles():
+    """Obter os perfis cProfile dos pedidos lentos amostrados mais recentes"""
+    return jsonify({
+        "slow_ms": request_metrics.slow_ms,
+        "profile_rate": request_metrics.profile_rate,
+        "profiles": request_metrics.recent_profiles()
+    })
+
+@api_bp.route("/api/balance_cache/stats", methods=["GET"])
+def get_balance_cache_stats():
+    """Obter contadores da cache de saldos"""
+    return jsonify(balance_cache.stats())
+
+@api_bp.route("/api/leaderboard", methods=["GET"])
+def get_leaderboard():
+    """Obter o top de carteiras por saldo, staking ou ganhos de afiliado"""
+    by = request.args.get('by', 'balance')
+    limit = request.args.get('limit', 100, type=int)
+    
+    if by not in LEADERBOARD_COLUMNS:
+        return jsonify({'error': f"'by' deve ser um de: {', '.join(LEADERBOARD_COLUMNS)}"}), 400
+    if limit < 1 or limit > LEADERBOARD_MAX_LIMIT:
+        return jsonify({'error': f'limit deve estar entre 1 e {LEADERBOARD_MAX_LIMIT}'}), 400
+    
+    try:
+        return jsonify({
+            'by': by,
+            'leaderboard': [
+                {'rank': position, 'wallet_address': wallet, 'value': f"{from_units(value):.4f}"}
+                for position, (wallet, value) in enumerate(leaderboards.top(by, limit), start=1)
+            ]
+        })
+        
+    except Exception as e:
+        current_app.logger.error(f"Erro ao obter leaderboard: {e}")
+        return jsonify({'error': 'Erro interno do servidor'}), 500
+
+@api_bp.route("/api/leaderboard/rank/<wallet_address>", methods=["GET"])
+def get_leaderboard_rank(wallet_address):
+    """Obter a posição de uma carteira no leaderboard"""
+    by = request.args.get('by', 'balance')
+    if by not in LEADERBOARD_COLUMNS:
+        return jsonify({'error': f"'by' deve ser um de: {', '.join(LEADERBOARD_COLUMNS)}"}), 400
+    
+    try:
+        rank, value, total = leaderboards.rank(by, wallet_address)
+        return jsonify({
+            'by': by,
+            'wallet_address': wallet_address,
+            'rank': rank,
+            'value': f"{from_units(value):.4f}",
+            'ranked_wallets': total
+        })
+        
+    except Exception as e:
+        current_app.logger.error(f"Erro ao obter posição no leaderboard: {e}")
+        return jsonify({'error': 'Erro interno do servidor'}), 500
+
+@api_bp.route("/api/buy_tokens", methods=["POST"])
+def buy_tokens():
+    """Comprar tokens CFD"""
+    data = request.get_json()
+    wallet_address = data.get('wallet_address')
+    amount = float(data.get('amount', 0))
+    currency = data.get('currency', 'usdt')
+    
+    if not wallet_address or amount <= 0:
+        return jsonify({'error': 'Dados inválidos'}), 400
+    
+    try:
+        # Simular compra (em produção, interagir com contrato real)
+        price_per_token = 0.02  # Preço da Fase 1
+        tokens_to_receive = amount / price_per_token
+        token_units = to_units(tokens_to_receive)
+        
+        # Com chave de administrador a transferência vai para o outbox; o worker
+        # de submissão assina e difunde e o pedido não espera pelo recibo
+        tx_submitter = get_tx_submitter()
+        if tx_submitter:
+            new_transaction = Transaction(
+                wallet_address=wallet_address,
+                transaction_type='buy',
+                amount=token_units,
+                currency='CFD',
+                status='pending'
+            )
+            db.session.add(new_transaction)
+            job = tx_submitter.enqueue(
+                new_transaction, 'cfd_token', 'transfer',
+                [Web3.to_checksum_address(wallet_address), int(tokens_to_receive * (10**18))]
+            )
+            db.session.commit()
+            
+            return jsonify({
+                "message": "Compra em processamento",
+                "tokens_received": tokens_to_receive,
+                "job_id": job.id,
+                "status": "pending"
+            }), 202
+        
+        tx_hash_str = "simulated_tx_hash"
+
+        # Registrar transação
+        new_transaction = Transaction(
+            wallet_address=wallet_address,
+            transaction_type='buy',
+            amount=token_units,
+            currency='CFD',
+            tx_hash=tx_hash_str,
+            status='confirmed'
+        )
+        db.session.add(new_transaction)
+        
+        credit_user(wallet_address, cfd_balance=token_units)
+        db.session.commit()
+        
+        return jsonify({
+            "message": "Compra simulada com sucesso!",
+            "tokens_received": tokens_to_receive,
+            "tx_hash": tx_hash_str
+        })
+        
+    except Exception as e:
+        current_app.logger.error(f"Erro ao comprar tokens: {e}")
+        return jsonify({'error': 'Erro interno do servidor'}), 500
+
+@api_bp.route("/api/stake_tokens", methods=["POST"])
+def stake_tokens():
+    """Fazer staking de tokens CFD"""
+    data = request.get_json()
+    wallet_address = data.get('wallet_address')
+    amount = float(data.get('amount', 0))
+    
+    if not wallet_address or amount <= 0:
+        return jsonify({'error': 'Dados inválidos'}), 400
+    
+    try:
+        units = to_units(amount)
+        
+        # Debitar só se houver saldo, no mesmo UPDATE
+        updated = adjust_user_balances(
+            wallet_address,
+            {'cfd_balance': -units, 'staked_tokens': units},
+            require={'cfd_balance': units}
+        )
+        if updated is None:
+            db.session.rollback()
+            return jsonify({'error': 'Saldo insuficiente de CFD'}), 400
+        
+        # Simular staking
+        tx_hash_str = "simulated_stake_tx_hash"
+
+        new_transaction = Transaction(
+            wallet_address=wallet_address,
+            transaction_type='stake',
+            amount=units,
+            currency='CFD',
+            tx_hash=tx_hash_str,
+            status='confirmed'
+        )
+        db.session.add(new_transaction)
+        db.session.commit()
+        
+        return jsonify({
+            "message": "Staking simulado com sucesso!",
+            "staked_amount": amount,
+            "tx_hash": tx_hash_str
+        })
+        
+    except Exception as e:
+        current_app.logger.error(f"Erro ao fazer staking: {e}")
+        return jsonify({'error': 'Erro interno do servidor'}), 500
+
+@api_bp.route("/api/unstake_tokens", methods=["POST"])
+def unstake_tokens():
+    """Remover staking de tokens CFD"""
+    data = request.get_json()
+    wallet_address = data.get('wallet_address')
+    amount = float(data.get('amount', 0))
+    
+    if not wallet_address or amount <= 0:
+        return jsonify({'error': 'Dados inválidos'}), 400
+    
+    try:
+        units = to_units(amount)
+        
+        updated = adjust_user_balances(
+            wallet_address,
+            {'cfd_balance': units, 'staked_tokens': -units},
+            require={'staked_tokens': units}
+        )
+        if updated is None:
+            db.session.rollback()
+            return jsonify({'error': 'Tokens em staking insuficientes'}), 400
+        
+        # Simular unstaking
+        tx_hash_str = "simulated_unstake_tx_hash"
+
+        new_transaction = Transaction(
+            wallet_address=wallet_address,
+            transaction_type='unstake',
+            amount=units,
+            currency='CFD',
+            tx_hash=tx_hash_str,
+            status='confirmed'
+        )
+        db.session.add(new_transaction)
+        db.session.commit()
+        
+        return jsonify({
+            "message": "Unstaking simulado com sucesso!",
+            "unstaked_amount": amount,
+            "tx_hash": tx_hash_str
+        })
+        
+    except Exception as e:
+        current_app.logger.error(f"Erro ao remover staking: {e}")
+        return jsonify({'error': 'Erro interno do servidor'}), 500
+
+@api_bp.route("/api/subscribe_newsletter", methods=["POST"])
+def subscribe_newsletter():
+    """Subscrever newsletter"""
+    data = request.get_json()
+    email = data.get('email')
+    
+    if not email:
+        return jsonify({'error': 'Email é obrigatório'}), 400
+    
+    try:
+        newsletter_entry = Newsletter.query.filter_by(email=email).first()
+        if newsletter_entry:
+            if newsletter_entry.is_active:
+                return jsonify({'message': 'Email já subscrito'})
+            else:
+                newsletter_entry.is_active = True
+                newsletter_entry.subscribed_at = datetime.utcnow()
+                db.session.commit()
+                return jsonify({'message': 'Subscrição reativada com sucesso!'})
+        else:
+            new_entry = Newsletter(email=email)
+            db.session.add(new_entry)
+            db.session.commit()
+            
+            # Enviar email de confirmação (usando EmailJS ou SMTP)
+            # email_user = os.getenv("EMAIL_USER")
+            # email_password = os.getenv("EMAIL_PASSWORD")
+            # if email_user and email_password:
+            #     try:
+            #         msg = MIMEMultipart('alternative')
+            #         msg['Subject'] = 'Confirmação de Subscrição - CasinoFound'
+            #         msg['From'] = email_user
+            #         msg['To'] = email
+            #         
+            #         text = "Obrigado por subscrever a nossa newsletter!"
+            #         html = """""<p>Obrigado por subscrever a nossa newsletter!</p>"""""
+            #         
+            #         part1 = MIMEText(text, 'plain')
+            #         part2 = MIMEText(html, 'html')
+            #         
+            #         msg.attach(part1)
+            #         msg.attach(part2)
+            #         
+            #         with smtplib.SMTP_SSL('smtp.gmail.com', 465) as smtp:
+            #             smtp.login(email_user, email_password)
+            #             smtp.send_message(msg)
+            #     except Exception as e:
+            #         current_app.logger.error(f"Erro ao enviar email de confirmação: {e}")
+            
+            return jsonify({'message': 'Subscrito com sucesso!'})
+            
+    except Exception as e:
+        current_app.logger.error(f"Erro ao subscrever newsletter: {e}")
+        return jsonify({'error': 'Erro interno do servidor'}), 500
+
+@api_bp.route("/api/affiliate_share", methods=["POST"])
+def affiliate_share():
+    """Registrar e processar partilha de afiliados"""
+    data = request.get_json()
+    referrer_address = data.get('referrer_address')
+    new_user_address = data.get('new_user_address')
+    
+    if not referrer_address or not new_user_address:
+        return jsonify({'error': 'Endereços de referência e novo usuário são obrigatórios'}), 400
+    
+    try:
+        referrer = User.query.filter_by(wallet_address=referrer_address).first()
+        if not referrer:
+            return jsonify({'error': 'Referenciador não encontrado'}), 404
+            
+        new_user = User.query.filter_by(wallet_address=new_user_address).first()
+        if new_user and new_user.referred_by:
+            return jsonify({'message': 'Novo usuário já foi referido'})
+            
+        if not new_user:
+            new_user = User(wallet_address=new_user_address, referral_code=new_user_address)
+            db.session.add(new_user)
+            
+        new_user.referred_by = referrer_address
+        db.session.commit()
+        referral_graph.invalidate()
+        
+        commission_amount = 0.001  # Exemplo de comissão em MATIC
+        
+        tx_submitter = get_tx_submitter()
+        if tx_submitter:
+            new_transaction = Transaction(
+                wallet_address=referrer_address,
+                transaction_type='affiliate',
+                amount=to_units(commission_amount),
+                currency='MATIC',
+                status='pending'
+            )
+            db.session.add(new_transaction)
+            job = tx_submitter.enqueue(
+                new_transaction, 'affiliate_manager', 'payAffiliate',
+                [Web3.to_checksum_address(referrer_address), w3.to_wei(commission_amount, 'ether')]
+            )
+            db.session.commit()
+            
+            return jsonify({
+                "message": "Afiliado registrado; comissão em processamento",
+                "referrer": referrer_address,
+                "new_user": new_user_address,
+                "job_id": job.id,
+                "status": "pending"
+            }), 202
+        
+        # Simular pagamento de comissão
+        tx_hash_str = "simulated_affiliate_tx_hash"
+
+        new_transaction = Transaction(
+            wallet_address=referrer_address,
+            transaction_type='affiliate',
+            amount=to_units(commission_amount), # Simulado
+            currency='MATIC',
+            tx_hash=tx_hash_str,
+            status='confirmed'
+        )
+        db.session.add(new_transaction)
+        
+        adjust_user_balances(referrer_address, {'affiliate_earnings': to_units(commission_amount)}) # Simulado
+        db.session.commit()
+        
+        return jsonify({
+            "message": "Afiliado registrado e comissão simulada!",
+            "referrer": referrer_address,
+            "new_user": new_user_address,
+            "tx_hash": tx_hash_str
+        })
+        
+    except Exception as e:
+        current_app.logger.error(f"Erro ao registrar afiliado: {e}")
+        return jsonify({'error': 'Erro interno do servidor'}), 500
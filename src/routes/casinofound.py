@@ -1,19 +1,152 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, Response, current_app, request, jsonify, stream_with_context
 from src.models.casinofound import db, Newsletter, ReferralEarning, TokenPurchase, StakingRecord, DividendPayment, SiteConfig
+from src.services.purchase_stats import PURCHASE_PHASES, record_purchase_stats, read_purchase_stats, reconcile_purchase_stats
+from src.services.write_behind import WriteBehindQueue, QueueFullError, insert_records
+from src.services.cache import TTLCache
+from src.services.idempotency import idempotent, violates_unique
+from src.services.config_cache import ConfigCache, CONFIG_VERSION
+from src.services.data_versions import bump_version
+from src.services.response_cache import ResponseCache
+from src.services.staking_balance import apply_staking_deltas, read_staking_balance, reconcile_staking_balances
+from src.services.referral_graph import ReferralGraph
+from src.services.dividends import distribute_dividends, WEI_PER_MATIC
+from src.services.db_routing import read_only
+from sqlalchemy.exc import IntegrityError
 from datetime import datetime
+from decimal import Decimal
+import click
+import csv
+import io
+import json
+import os
 import re
+import threading
 
-casinofound_bp = Blueprint('casinofound', __name__)
+# Comandos CLI no nível de topo (flask reconcile-purchase-stats, ...)
+casinofound_bp = Blueprint('casinofound', __name__, cli_group=None)
+
+# fullmatch: com match e `$` um "\n" final passava na validação
+EMAIL_RE = re.compile(r'[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}')
+WALLET_RE = re.compile(r'0x[a-fA-F0-9]{40}')
 
 # Validação de email
 def is_valid_email(email):
-    pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
-    return re.match(pattern, email) is not None
+    return EMAIL_RE.fullmatch(email) is not None
 
 # Validação de endereço Ethereum
 def is_valid_wallet(address):
-    pattern = r'^0x[a-fA-F0-9]{40}$'
-    return re.match(pattern, address) is not None
+    return WALLET_RE.fullmatch(address) is not None
+
+# transaction_hash vazio fica NULL para não colidir no índice único
+def normalize_tx_hash(value):
+    return (value or '').strip() or None
+
+# Respostas de POSTs com Idempotency-Key, por processo
+IDEMPOTENCY_TTL = int(os.getenv('IDEMPOTENCY_TTL', '86400'))
+IDEMPOTENCY_CACHE_SIZE = int(os.getenv('IDEMPOTENCY_CACHE_SIZE', '10000'))
+idempotency_cache = TTLCache(ttl=IDEMPOTENCY_TTL, max_size=IDEMPOTENCY_CACHE_SIZE)
+
+# Paginação por cursor (keyset): ?limit=N&after_id=ID
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+def get_page_args():
+    limit = request.args.get('limit', DEFAULT_PAGE_SIZE, type=int)
+    after_id = request.args.get('after_id', 0, type=int)
+    if limit < 1 or after_id < 0:
+        raise ValueError('Parâmetros de paginação inválidos')
+    return min(limit, MAX_PAGE_SIZE), after_id
+
+def keyset_page(query, id_column, limit, after_id):
+    """Devolver (linhas, next_cursor) da página seguinte a after_id"""
+    rows = query.filter(id_column > after_id).order_by(id_column).limit(limit + 1).all()
+    next_cursor = rows[limit - 1].id if len(rows) > limit else None
+    return rows[:limit], next_cursor
+
+# Escrita de registos: commit por pedido (off) ou group commit em segundo plano,
+# respondendo após o commit do lote (flush) ou logo após entrar na fila (enqueue)
+GROUP_COMMIT_MODES = ('off', 'flush', 'enqueue')
+GROUP_COMMIT_MODE = os.getenv('GROUP_COMMIT_MODE', 'off').strip().lower()
+if GROUP_COMMIT_MODE not in GROUP_COMMIT_MODES:
+    # Um valor desconhecido não pode cair em 'enqueue' (202 antes de estar gravado)
+    raise ValueError(f"GROUP_COMMIT_MODE desconhecido: {GROUP_COMMIT_MODE} (opções: {', '.join(GROUP_COMMIT_MODES)})")
+GROUP_COMMIT_MAX_ROWS = int(os.getenv('GROUP_COMMIT_MAX_ROWS', '500'))
+GROUP_COMMIT_MAX_DELAY_MS = int(os.getenv('GROUP_COMMIT_MAX_DELAY_MS', '20'))
+GROUP_COMMIT_MAX_QUEUE = int(os.getenv('GROUP_COMMIT_MAX_QUEUE', '10000'))
+# Espera máxima (flush) até o lote começar a ser escrito; depois responde 503
+GROUP_COMMIT_FLUSH_TIMEOUT_MS = int(os.getenv('GROUP_COMMIT_FLUSH_TIMEOUT_MS', '5000'))
+
+_write_behind_lock = threading.Lock()
+
+def purchase_stats_hook(rows):
+    record_purchase_stats([(r['phase'], r['amount_invested'], r['tokens_received']) for r in rows])
+
+def referral_earnings_hook(rows):
+    # Ordem fixa para que workers concorrentes não bloqueiem entre si
+    for wallet in sorted({r['referrer_wallet'] for r in rows}):
+        bump_version(f'referral:{wallet}')
+    referral_graph.invalidate()
+
+def staking_hook(rows):
+    apply_staking_deltas([(r['wallet_address'], r['amount_staked'], 1) for r in rows])
+    for wallet in sorted({r['wallet_address'] for r in rows}):
+        bump_version(f'staking:{wallet}')
+
+# Atualizações derivadas feitas na mesma transação das inserções
+FLUSH_HOOKS = {
+    TokenPurchase: purchase_stats_hook,
+    ReferralEarning: referral_earnings_hook,
+    StakingRecord: staking_hook
+}
+
+# Grafo de referrals em memória, sincronizado pelo id das linhas novas
+REFERRAL_GRAPH_SYNC_INTERVAL = float(os.getenv('REFERRAL_GRAPH_SYNC_INTERVAL', '2'))
+REFERRAL_GRAPH_MAX_DEPTH = 5
+referral_graph = ReferralGraph(sync_interval=REFERRAL_GRAPH_SYNC_INTERVAL)
+
+@casinofound_bp.record_once
+def load_referral_graph(state):
+    if not state.app.config.get('WARM_CACHES', True):
+        return
+    with state.app.app_context():
+        try:
+            referral_graph.sync(force=True)
+        except Exception as e:
+            state.app.logger.warning(f"Grafo de referrals não carregado no arranque: {type(e).__name__}")
+
+# Respostas de leitura em cache, validadas pelas versões em data_version
+RESPONSE_CACHE_SIZE = int(os.getenv('RESPONSE_CACHE_SIZE', '2000'))
+response_cache = ResponseCache(max_size=RESPONSE_CACHE_SIZE)
+
+def get_write_behind_queue():
+    if GROUP_COMMIT_MODE == 'off':
+        return None
+    queue = current_app.extensions.get('write_behind')
+    if queue is None:
+        with _write_behind_lock:
+            queue = current_app.extensions.get('write_behind')
+            if queue is None:
+                queue = WriteBehindQueue(
+                    current_app._get_current_object(), db,
+                    hooks=FLUSH_HOOKS,
+                    max_rows=GROUP_COMMIT_MAX_ROWS,
+                    max_delay_ms=GROUP_COMMIT_MAX_DELAY_MS,
+                    max_queue=GROUP_COMMIT_MAX_QUEUE,
+                    ack=GROUP_COMMIT_MODE,
+                    flush_timeout=GROUP_COMMIT_FLUSH_TIMEOUT_MS / 1000.0
+                )
+                current_app.extensions['write_behind'] = queue
+    return queue
+
+def save_records(records):
+    """Guardar [(Model, valores)]; devolve 201 se já escrito ou 202 se só em fila"""
+    queue = get_write_behind_queue()
+    if queue is None:
+        insert_records(db, records, FLUSH_HOOKS)
+        db.session.commit()
+        return 201
+    queue.submit(records)
+    return 201 if queue.ack == 'flush' else 202
 
 # Newsletter Routes
 @casinofound_bp.route('/newsletter/subscribe', methods=['POST'])
@@ -50,6 +183,8 @@ def subscribe_newsletter():
         
         db.session.add(newsletter)
         db.session.commit()
+        if referrer:
+            referral_graph.invalidate()
         
         return jsonify({'message': 'Subscrito com sucesso'}), 201
         
@@ -80,6 +215,7 @@ def unsubscribe_newsletter():
         return jsonify({'error': 'Erro interno do servidor'}), 500
 
 @casinofound_bp.route('/newsletter/list', methods=['GET'])
+@read_only
 def get_newsletter_list():
     try:
         # Verificar autorização (simplificado)
@@ -87,39 +223,146 @@ def get_newsletter_list():
         if not auth_header or auth_header != 'Bearer admin-token':
             return jsonify({'error': 'Não autorizado'}), 401
         
-        newsletters = Newsletter.query.filter_by(is_active=True).all()
-        return jsonify({
+        export_format = request.args.get('format', 'json')
+        if export_format in ('ndjson', 'csv'):
+            return stream_newsletter_export(export_format)
+        if export_format != 'json':
+            return jsonify({'error': 'Formato inválido'}), 400
+        
+        try:
+            limit, after_id = get_page_args()
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        active = Newsletter.query.filter(Newsletter.is_active == True)
+        newsletters, next_cursor = keyset_page(active, Newsletter.id, limit, after_id)
+        payload = {
             'newsletters': [n.to_dict() for n in newsletters],
-            'total': len(newsletters)
-        }), 200
+            'next_cursor': next_cursor
+        }
+        # O COUNT percorre todos os ativos: só na primeira página ou com ?with_total=1
+        if after_id == 0 or request.args.get('with_total') == '1':
+            payload['total'] = active.count()
+        return jsonify(payload), 200
         
     except Exception as e:
         return jsonify({'error': 'Erro interno do servidor'}), 500
 
+NEWSLETTER_EXPORT_BATCH = 1000
+NEWSLETTER_EXPORT_FIELDS = ('id', 'email', 'subscribed_at', 'is_active', 'referrer')
+
+def stream_newsletter_export(export_format):
+    """Exportar subscritores ativos em NDJSON ou CSV com memória constante"""
+    # Colunas simples (sem objetos ORM) lidas de um cursor do lado do servidor
+    rows = db.session.query(
+        Newsletter.id, Newsletter.email, Newsletter.subscribed_at,
+        Newsletter.is_active, Newsletter.referrer
+    ).filter(Newsletter.is_active == True).order_by(Newsletter.id).yield_per(NEWSLETTER_EXPORT_BATCH)
+
+    def serialize(row):
+        return (
+            row.id,
+            row.email,
+            row.subscribed_at.isoformat() if row.subscribed_at else None,
+            row.is_active,
+            row.referrer
+        )
+
+    def generate_ndjson():
+        for row in rows:
+            yield json.dumps(dict(zip(NEWSLETTER_EXPORT_FIELDS, serialize(row)))) + '\n'
+
+    def generate_csv():
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(NEWSLETTER_EXPORT_FIELDS)
+        for row in rows:
+            writer.writerow(serialize(row))
+            if buffer.tell() >= 64 * 1024:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+        yield buffer.getvalue()
+
+    if export_format == 'csv':
+        return Response(
+            stream_with_context(generate_csv()),
+            mimetype='text/csv',
+            headers={'Content-Disposition': 'attachment; filename=newsletter.csv'}
+        )
+    return Response(stream_with_context(generate_ndjson()), mimetype='application/x-ndjson')
+
 # Referral Routes
 @casinofound_bp.route('/referral/earnings/<wallet_address>', methods=['GET'])
+@read_only
+@response_cache.cached(lambda wallet_address: [f'referral:{wallet_address.lower()}'])
 def get_referral_earnings(wallet_address):
     try:
         if not is_valid_wallet(wallet_address):
             return jsonify({'error': 'Endereço de carteira inválido'}), 400
         
-        earnings = ReferralEarning.query.filter_by(referrer_wallet=wallet_address.lower()).all()
-        
-        total_earned = sum(e.commission_earned for e in earnings)
-        pending_earnings = sum(e.commission_earned for e in earnings if not e.is_paid)
-        total_referrals = len(set(e.referred_wallet for e in earnings))
+        try:
+            limit, after_id = get_page_args()
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        referrer_wallet = wallet_address.lower()
+        
+        # Totais calculados numa única consulta agrupada
+        total_earned, pending_earnings, total_referrals = db.session.query(
+            db.func.coalesce(db.func.sum(ReferralEarning.commission_earned), 0),
+            db.func.coalesce(db.func.sum(db.case(
+                (ReferralEarning.is_paid.isnot(True), ReferralEarning.commission_earned),
+                else_=0
+            )), 0),
+            db.func.count(db.distinct(ReferralEarning.referred_wallet))
+        ).filter(ReferralEarning.referrer_wallet == referrer_wallet).one()
+        
+        earnings, next_cursor = keyset_page(
+            ReferralEarning.query.filter_by(referrer_wallet=referrer_wallet),
+            ReferralEarning.id, limit, after_id
+        )
         
         return jsonify({
             'total_earned': total_earned,
             'pending_earnings': pending_earnings,
             'total_referrals': total_referrals,
-            'earnings': [e.to_dict() for e in earnings]
+            'earnings': [e.to_dict() for e in earnings],
+            'next_cursor': next_cursor
         }), 200
         
     except Exception as e:
         return jsonify({'error': 'Erro interno do servidor'}), 500
 
+@casinofound_bp.route('/referral/graph/<wallet_address>', methods=['GET'])
+def get_referral_graph(wallet_address):
+    try:
+        if not is_valid_wallet(wallet_address):
+            return jsonify({'error': 'Endereço de carteira inválido'}), 400
+        
+        depth = request.args.get('depth', 1, type=int)
+        if depth < 1 or depth > REFERRAL_GRAPH_MAX_DEPTH:
+            return jsonify({'error': f'depth deve estar entre 1 e {REFERRAL_GRAPH_MAX_DEPTH}'}), 400
+        
+        return jsonify(referral_graph.summary(wallet_address.lower(), depth=depth)), 200
+        
+    except Exception as e:
+        return jsonify({'error': 'Erro interno do servidor'}), 500
+
+@casinofound_bp.route('/referral/leaderboard', methods=['GET'])
+def get_referral_leaderboard():
+    try:
+        limit = request.args.get('limit', 10, type=int)
+        if limit < 1 or limit > 100:
+            return jsonify({'error': 'limit deve estar entre 1 e 100'}), 400
+        
+        return jsonify({'leaderboard': referral_graph.top(limit)}), 200
+        
+    except Exception as e:
+        return jsonify({'error': 'Erro interno do servidor'}), 500
+
 @casinofound_bp.route('/referral/record', methods=['POST'])
+@idempotent(idempotency_cache)
 def record_referral_earning():
     try:
         data = request.get_json()
@@ -128,7 +371,7 @@ def record_referral_earning():
         referred_wallet = data.get('referred_wallet', '').strip().lower()
         amount_invested = float(data.get('amount_invested', 0))
         currency = data.get('currency', '').upper()
-        transaction_hash = data.get('transaction_hash', '').strip()
+        transaction_hash = normalize_tx_hash(data.get('transaction_hash'))
         
         if not is_valid_wallet(referrer_wallet) or not is_valid_wallet(referred_wallet):
             return jsonify({'error': 'Endereços de carteira inválidos'}), 400
@@ -143,115 +386,290 @@ def record_referral_earning():
         commission_earned = amount_invested * 0.05
         
         # Registar ganho de referral
-        earning = ReferralEarning(
-            referrer_wallet=referrer_wallet,
-            referred_wallet=referred_wallet,
-            amount_invested=amount_invested,
-            commission_earned=commission_earned,
-            currency=currency,
-            transaction_hash=transaction_hash
-        )
-        
-        db.session.add(earning)
-        db.session.commit()
+        status = save_records([(ReferralEarning, {
+            'referrer_wallet': referrer_wallet,
+            'referred_wallet': referred_wallet,
+            'amount_invested': amount_invested,
+            'commission_earned': commission_earned,
+            'currency': currency,
+            'transaction_hash': transaction_hash
+        })])
         
         return jsonify({
             'message': 'Ganho de referral registado com sucesso',
             'commission_earned': commission_earned
-        }), 201
+        }), status
         
+    except IntegrityError:
+        db.session.rollback()
+        existing = ReferralEarning.query.filter_by(transaction_hash=transaction_hash).first()
+        if existing is not None and (existing.referrer_wallet, existing.referred_wallet) != (referrer_wallet, referred_wallet):
+            # O hash já pertence a outro ganho (ex.: gravado com a compra): não é uma repetição
+            return jsonify({'error': 'transaction_hash já registado noutro ganho de referral'}), 409
+        # transaction_hash já registado: pedido repetido
+        return jsonify({
+            'message': 'Ganho de referral já registado',
+            'commission_earned': commission_earned
+        }), 200
+    except QueueFullError:
+        return jsonify({'error': 'Serviço ocupado, tente novamente'}), 503
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': 'Erro interno do servidor'}), 500
 
 # Token Purchase Routes
-@casinofound_bp.route('/purchase/record', methods=['POST'])
-def record_token_purchase():
+REFERRAL_COMMISSION_RATE = 0.05
+
+def purchase_records(data):
+    """Validar uma compra e devolver [(Model, valores)] da compra e da comissão de referral"""
+    wallet_address = data.get('wallet_address', '').strip().lower()
     try:
-        data = request.get_json()
-        
-        wallet_address = data.get('wallet_address', '').strip().lower()
         amount_invested = float(data.get('amount_invested', 0))
         tokens_received = float(data.get('tokens_received', 0))
-        currency = data.get('currency', '').upper()
         phase = int(data.get('phase', 1))
         price_per_token = float(data.get('price_per_token', 0))
-        transaction_hash = data.get('transaction_hash', '').strip()
-        referrer = data.get('referrer', '').strip().lower() if data.get('referrer') else None
-        
-        if not is_valid_wallet(wallet_address):
-            return jsonify({'error': 'Endereço de carteira inválido'}), 400
-        
-        if referrer and not is_valid_wallet(referrer):
-            return jsonify({'error': 'Endereço de referrer inválido'}), 400
-        
-        # Registar compra
-        purchase = TokenPurchase(
-            wallet_address=wallet_address,
-            amount_invested=amount_invested,
-            tokens_received=tokens_received,
-            currency=currency,
-            phase=phase,
-            price_per_token=price_per_token,
-            transaction_hash=transaction_hash,
-            referrer=referrer
-        )
+    except (TypeError, ValueError):
+        raise ValueError('Valores numéricos inválidos')
+    currency = data.get('currency', '').upper()
+    transaction_hash = normalize_tx_hash(data.get('transaction_hash'))
+    referrer = data.get('referrer', '').strip().lower() if data.get('referrer') else None
+    
+    if not is_valid_wallet(wallet_address):
+        raise ValueError('Endereço de carteira inválido')
+    
+    if referrer and not is_valid_wallet(referrer):
+        raise ValueError('Endereço de referrer inválido')
+    
+    if phase not in PURCHASE_PHASES:
+        raise ValueError('Fase inválida')
+    
+    # Registar compra
+    records = [(TokenPurchase, {
+        'wallet_address': wallet_address,
+        'amount_invested': amount_invested,
+        'tokens_received': tokens_received,
+        'currency': currency,
+        'phase': phase,
+        'price_per_token': price_per_token,
+        'transaction_hash': transaction_hash,
+        'referrer': referrer
+    })]
+    
+    # Se há referrer, registar ganho de referral
+    if referrer:
+        commission = amount_invested * REFERRAL_COMMISSION_RATE
+        records.append((ReferralEarning, {
+            'referrer_wallet': referrer,
+            'referred_wallet': wallet_address,
+            'amount_invested': amount_invested,
+            'commission_earned': commission,
+            'currency': currency,
+            'transaction_hash': transaction_hash
+        }))
+    
+    return records
+
+def save_purchase(records, save):
+    """Gravar a compra e o ganho de referral com `save`; devolve o resultado de `save`
+
+    Se o ganho desta transação já foi registado por /referral/record (índice
+    único de referral_earning), grava só a compra em vez de a perder.
+    """
+    try:
+        return save(records)
+    except IntegrityError as e:
+        db.session.rollback()
+        if len(records) == 1 or violates_unique(e, TokenPurchase) or not violates_unique(e, ReferralEarning):
+            raise
+        return save(records[:1])
+
+def commit_records(records):
+    insert_records(db, records, FLUSH_HOOKS)
+    db.session.commit()
+
+@casinofound_bp.route('/purchase/record', methods=['POST'])
+@idempotent(idempotency_cache)
+def record_token_purchase():
+    try:
+        data = request.get_json()
         
-        db.session.add(purchase)
+        try:
+            records = purchase_records(data)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         
-        # Se há referrer, registar ganho de referral
-        if referrer:
-            commission = amount_invested * 0.05
-            earning = ReferralEarning(
-                referrer_wallet=referrer,
-                referred_wallet=wallet_address,
-                amount_invested=amount_invested,
-                commission_earned=commission,
-                currency=currency,
-                transaction_hash=transaction_hash
-            )
-            db.session.add(earning)
+        status = save_purchase(records, save_records)
         
-        db.session.commit()
+        return jsonify({'message': 'Compra registada com sucesso'}), status
         
-        return jsonify({'message': 'Compra registada com sucesso'}), 201
+    except IntegrityError:
+        db.session.rollback()
+        return jsonify({'message': 'Compra já registada'}), 200
+    except QueueFullError:
+        return jsonify({'error': 'Serviço ocupado, tente novamente'}), 503
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': 'Erro interno do servidor'}), 500
+
+BULK_MAX_ROWS = 10000
+BULK_CHUNK_SIZE = 500
+
+def read_bulk_items():
+    """Ler o corpo como array JSON ou NDJSON; devolve [(índice, item ou None, erro)]"""
+    body = request.get_data(as_text=True)
+    if body.lstrip().startswith('['):
+        items = json.loads(body)
+        return [(index, item, None) for index, item in enumerate(items)]
+    
+    parsed = []
+    for index, line in enumerate(line for line in body.splitlines() if line.strip()):
+        try:
+            parsed.append((index, json.loads(line), None))
+        except ValueError:
+            parsed.append((index, None, 'JSON inválido'))
+    return parsed
+
+def existing_purchase_hashes(hashes):
+    """transaction_hash já registados, consultados em blocos para limitar o IN"""
+    existing = set()
+    hashes = list(hashes)
+    for start in range(0, len(hashes), BULK_CHUNK_SIZE):
+        chunk = hashes[start:start + BULK_CHUNK_SIZE]
+        rows = db.session.query(TokenPurchase.transaction_hash).filter(
+            TokenPurchase.transaction_hash.in_(chunk)
+        ).all()
+        existing.update(row[0] for row in rows)
+    return existing
+
+@casinofound_bp.route('/purchase/record/bulk', methods=['POST'])
+@idempotent(idempotency_cache)
+def record_token_purchases_bulk():
+    try:
+        try:
+            items = read_bulk_items()
+        except ValueError:
+            return jsonify({'error': 'JSON inválido'}), 400
+        
+        if len(items) > BULK_MAX_ROWS:
+            return jsonify({'error': f'Máximo de {BULK_MAX_ROWS} registos por pedido'}), 413
+        
+        # Validação num só passo; erros por linha não interrompem o lote
+        errors = []
+        valid = []
+        seen_hashes = set()
+        duplicates = 0
+        for index, item, error in items:
+            if error is None and not isinstance(item, dict):
+                error = 'Registo inválido'
+            if error is None:
+                try:
+                    records = purchase_records(item)
+                except ValueError as e:
+                    error = str(e)
+                except (TypeError, AttributeError):
+                    error = 'Registo inválido'
+            if error is not None:
+                errors.append({'index': index, 'error': error})
+                continue
+            
+            transaction_hash = records[0][1]['transaction_hash']
+            if transaction_hash:
+                if transaction_hash in seen_hashes:
+                    duplicates += 1
+                    continue
+                seen_hashes.add(transaction_hash)
+            valid.append((index, transaction_hash, records))
+        
+        # Compras já registadas são ignoradas (reenvio idempotente)
+        existing = existing_purchase_hashes(seen_hashes)
+        if existing:
+            duplicates += sum(1 for _, transaction_hash, _ in valid if transaction_hash in existing)
+            valid = [entry for entry in valid if entry[1] not in existing]
+        
+        inserted = 0
+        for start in range(0, len(valid), BULK_CHUNK_SIZE):
+            chunk = valid[start:start + BULK_CHUNK_SIZE]
+            try:
+                commit_records([record for _, _, records in chunk for record in records])
+                inserted += len(chunk)
+            except Exception:
+                db.session.rollback()
+                # Isolar as linhas que falham sem perder o resto do bloco
+                for index, _, records in chunk:
+                    try:
+                        save_purchase(records, commit_records)
+                        inserted += 1
+                    except IntegrityError as e:
+                        db.session.rollback()
+                        # Gravada por outro pedido depois da verificação: duplicado, não erro
+                        if violates_unique(e, TokenPurchase):
+                            duplicates += 1
+                        else:
+                            errors.append({'index': index, 'error': 'Erro ao gravar registo'})
+                    except Exception:
+                        db.session.rollback()
+                        errors.append({'index': index, 'error': 'Erro ao gravar registo'})
+        
+        errors.sort(key=lambda error: error['index'])
+        return jsonify({
+            'received': len(items),
+            'inserted': inserted,
+            'duplicates': duplicates,
+            'errors': errors
+        }), 200
         
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': 'Erro interno do servidor'}), 500
 
 @casinofound_bp.route('/purchase/stats', methods=['GET'])
+@read_only
+@response_cache.cached(lambda: ['purchase_stats'])
 def get_purchase_stats():
     try:
-        # Estatísticas gerais
-        total_purchases = TokenPurchase.query.count()
-        total_invested = db.session.query(db.func.sum(TokenPurchase.amount_invested)).scalar() or 0
-        total_tokens_sold = db.session.query(db.func.sum(TokenPurchase.tokens_received)).scalar() or 0
-        
-        # Estatísticas por fase
-        phase1_sold = db.session.query(db.func.sum(TokenPurchase.tokens_received)).filter_by(phase=1).scalar() or 0
-        phase2_sold = db.session.query(db.func.sum(TokenPurchase.tokens_received)).filter_by(phase=2).scalar() or 0
-        
-        return jsonify({
-            'total_purchases': total_purchases,
-            'total_invested': total_invested,
-            'total_tokens_sold': total_tokens_sold,
-            'phase1_sold': phase1_sold,
-            'phase2_sold': phase2_sold
-        }), 200
+        # Totais mantidos incrementalmente em purchase_stats
+        return jsonify(read_purchase_stats()), 200
         
     except Exception as e:
         return jsonify({'error': 'Erro interno do servidor'}), 500
 
+@casinofound_bp.cli.command('reconcile-purchase-stats')
+@click.option('--fix', is_flag=True, help='Corrigir os totais divergentes')
+def reconcile_purchase_stats_command(fix):
+    """Recalcular purchase_stats a partir de token_purchase e reportar diferenças"""
+    drift = reconcile_purchase_stats(fix=fix)
+    if not drift:
+        click.echo('Sem diferenças')
+        return
+    for entry in drift:
+        click.echo(json.dumps(entry))
+    click.echo(f"{len(drift)} fase(s) com diferenças{' corrigidas' if fix else ''}")
+
+@casinofound_bp.cli.command('distribute-dividends')
+@click.option('--start', 'period_start', required=True, type=click.DateTime(), help='Início do período (UTC)')
+@click.option('--end', 'period_end', required=True, type=click.DateTime(), help='Fim do período (UTC)')
+@click.option('--pool-matic', required=True, help='Total de MATIC a distribuir')
+@click.option('--dry-run', is_flag=True, help='Calcular sem gravar os pagamentos')
+def distribute_dividends_command(period_start, period_end, pool_matic, dry_run):
+    """Distribuir dividendos em MATIC pelo stake médio de cada carteira no período"""
+    pool_wei = int(Decimal(pool_matic) * WEI_PER_MATIC)
+    try:
+        payments = distribute_dividends(period_start, period_end, pool_wei, dry_run=dry_run)
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    distributed = sum(share for _, _, share in payments)
+    click.echo(f"{len(payments)} pagamentos, {distributed} wei{' (simulação)' if dry_run else ''}")
+
 # Staking Routes
 @casinofound_bp.route('/staking/record', methods=['POST'])
+@idempotent(idempotency_cache)
 def record_staking():
     try:
         data = request.get_json()
         
         wallet_address = data.get('wallet_address', '').strip().lower()
         amount_staked = float(data.get('amount_staked', 0))
-        transaction_hash = data.get('transaction_hash', '').strip()
+        transaction_hash = normalize_tx_hash(data.get('transaction_hash'))
         
         if not is_valid_wallet(wallet_address):
             return jsonify({'error': 'Endereço de carteira inválido'}), 400
@@ -260,56 +678,165 @@ def record_staking():
             return jsonify({'error': 'Quantidade mínima para staking é 100 CFD'}), 400
         
         # Registar staking
-        staking = StakingRecord(
-            wallet_address=wallet_address,
-            amount_staked=amount_staked,
-            transaction_hash=transaction_hash
-        )
+        status = save_records([(StakingRecord, {
+            'wallet_address': wallet_address,
+            'amount_staked': amount_staked,
+            'transaction_hash': transaction_hash
+        })])
         
-        db.session.add(staking)
-        db.session.commit()
-        
-        return jsonify({'message': 'Staking registado com sucesso'}), 201
+        return jsonify({'message': 'Staking registado com sucesso'}), status
         
+    except IntegrityError:
+        db.session.rollback()
+        return jsonify({'message': 'Staking já registado'}), 200
+    except QueueFullError:
+        return jsonify({'error': 'Serviço ocupado, tente novamente'}), 503
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': 'Erro interno do servidor'}), 500
 
 @casinofound_bp.route('/staking/balance/<wallet_address>', methods=['GET'])
+@read_only
+@response_cache.cached(lambda wallet_address: [f'staking:{wallet_address.lower()}'])
 def get_staking_balance(wallet_address):
     try:
         if not is_valid_wallet(wallet_address):
             return jsonify({'error': 'Endereço de carteira inválido'}), 400
         
-        # Calcular saldo em staking
-        staked = db.session.query(db.func.sum(StakingRecord.amount_staked)).filter_by(
-            wallet_address=wallet_address.lower(),
-            is_active=True
-        ).scalar() or 0
+        wallet_address = wallet_address.lower()
+        
+        # Total mantido em staking_balance: uma leitura por chave primária
+        balance = read_staking_balance(wallet_address)
+        response = {
+            'total_staked': balance['total_staked'],
+            'active_records': balance['active_records']
+        }
+        
+        # Registos ativos só quando pedidos (?records=1), paginados por cursor
+        if request.args.get('records', type=int):
+            try:
+                limit, after_id = get_page_args()
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
+            
+            records, next_cursor = keyset_page(
+                StakingRecord.query.filter_by(wallet_address=wallet_address, is_active=True),
+                StakingRecord.id, limit, after_id
+            )
+            response['records'] = [r.to_dict() for r in records]
+            response['next_cursor'] = next_cursor
         
-        # Buscar registos de staking ativos
-        records = StakingRecord.query.filter_by(
-            wallet_address=wallet_address.lower(),
-            is_active=True
-        ).all()
+        return jsonify(response), 200
+        
+    except Exception as e:
+        return jsonify({'error': 'Erro interno do servidor'}), 500
+
+@casinofound_bp.route('/staking/unstake', methods=['POST'])
+@idempotent(idempotency_cache)
+def unstake_record():
+    try:
+        data = request.get_json()
+        
+        wallet_address = data.get('wallet_address', '').strip().lower()
+        record_id = data.get('record_id')
+        transaction_hash = normalize_tx_hash(data.get('transaction_hash'))
+        
+        if not is_valid_wallet(wallet_address):
+            return jsonify({'error': 'Endereço de carteira inválido'}), 400
+        
+        if not record_id and not transaction_hash:
+            return jsonify({'error': 'Indique record_id ou transaction_hash'}), 400
+        
+        if record_id and not str(record_id).isdigit():
+            return jsonify({'error': 'record_id inválido'}), 400
+        
+        query = StakingRecord.query.filter_by(wallet_address=wallet_address, is_active=True)
+        if record_id:
+            query = query.filter_by(id=record_id)
+        else:
+            query = query.filter_by(transaction_hash=transaction_hash)
+        record = query.first()
+        if not record:
+            return jsonify({'error': 'Staking ativo não encontrado'}), 404
+        
+        # Condicional em is_active: dois pedidos concorrentes não descontam duas vezes
+        updated = StakingRecord.query.filter_by(id=record.id, is_active=True).update({
+            StakingRecord.is_active: False,
+            StakingRecord.unstaked_at: datetime.utcnow()
+        }, synchronize_session=False)
+        if not updated:
+            db.session.rollback()
+            return jsonify({'error': 'Staking ativo não encontrado'}), 404
+        
+        apply_staking_deltas([(wallet_address, -record.amount_staked, -1)])
+        bump_version(f'staking:{wallet_address}')
+        db.session.commit()
         
         return jsonify({
-            'total_staked': staked,
-            'records': [r.to_dict() for r in records]
+            'message': 'Unstake registado com sucesso',
+            'record_id': record.id,
+            'amount_unstaked': record.amount_staked,
+            'total_staked': read_staking_balance(wallet_address)['total_staked']
         }), 200
         
     except Exception as e:
+        db.session.rollback()
         return jsonify({'error': 'Erro interno do servidor'}), 500
 
+@casinofound_bp.cli.command('reconcile-staking-balances')
+@click.option('--fix', is_flag=True, help='Corrigir os totais divergentes')
+def reconcile_staking_balances_command(fix):
+    """Comparar staking_balance com os registos de staking ativos e reportar diferenças"""
+    drift = reconcile_staking_balances(fix=fix)
+    if not drift:
+        click.echo('Sem diferenças')
+        return
+    for entry in drift:
+        click.echo(json.dumps(entry))
+    click.echo(f"{len(drift)} carteira(s) com diferenças{' corrigidas' if fix else ''}")
+
 # Configuration Routes
+# Configuração em memória por worker, invalidada pela versão 'config'
+CONFIG_CACHE_CHECK_INTERVAL = float(os.getenv('CONFIG_CACHE_CHECK_INTERVAL', '5'))
+config_cache = ConfigCache(check_interval=CONFIG_CACHE_CHECK_INTERVAL)
+
+@casinofound_bp.record_once
+def load_config_cache(state):
+    if not state.app.config.get('WARM_CACHES', True):
+        return
+    with state.app.app_context():
+        try:
+            config_cache.load()
+        except Exception as e:
+            # Esquema ainda não migrado: a cache carrega no primeiro pedido
+            state.app.logger.warning(f"Cache de configuração não carregada no arranque: {type(e).__name__}")
+
+def conditional_json(payload):
+    """Resposta JSON já serializada com ETag; If-None-Match igual dá 304"""
+    body, etag = payload
+    response = Response(body, mimetype='application/json')
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response.make_conditional(request)
+
+@casinofound_bp.route('/config', methods=['GET'])
+@read_only
+def get_all_config():
+    try:
+        return conditional_json(config_cache.get_all())
+        
+    except Exception as e:
+        return jsonify({'error': 'Erro interno do servidor'}), 500
+
 @casinofound_bp.route('/config/<key>', methods=['GET'])
+@read_only
 def get_config(key):
     try:
-        config = SiteConfig.query.filter_by(key=key).first()
-        if not config:
+        payload = config_cache.get(key)
+        if not payload:
             return jsonify({'error': 'Configuração não encontrada'}), 404
         
-        return jsonify(config.to_dict()), 200
+        return conditional_json(payload)
         
     except Exception as e:
         return jsonify({'error': 'Erro interno do servidor'}), 500
@@ -333,7 +860,9 @@ def set_config(key):
             config = SiteConfig(key=key, value=value)
             db.session.add(config)
         
+        bump_version(CONFIG_VERSION)
         db.session.commit()
+        config_cache.invalidate()
         
         return jsonify({'message': 'Configuração guardada com sucesso'}), 200
         
@@ -341,6 +870,15 @@ def set_config(key):
         db.session.rollback()
         return jsonify({'error': 'Erro interno do servidor'}), 500
 
+@casinofound_bp.route('/cache/stats', methods=['GET'])
+def get_cache_stats():
+    return jsonify({
+        'responses': response_cache.stats(),
+        'config': config_cache.stats(),
+        'idempotency': idempotency_cache.stats(),
+        'referral_graph': referral_graph.stats()
+    }), 200
+
 # Health check
 @casinofound_bp.route('/health', methods=['GET'])
 def health_check():
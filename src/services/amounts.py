@@ -0,0 +1,26 @@
+from decimal import Decimal, ROUND_DOWN
+
+# Saldos guardados como inteiros de ponto fixo com 8 casas decimais.
+# Wei (18 casas) não cabe num INTEGER de 64 bits do SQLite para 21M de tokens;
+# com 8 casas o total (2.1e15) cabe até num REAL sem perda de precisão.
+AMOUNT_DECIMALS = 8
+AMOUNT_SCALE = 10 ** AMOUNT_DECIMALS
+WEI_PER_UNIT = 10 ** (18 - AMOUNT_DECIMALS)
+
+
+def to_units(value):
+    """Converter um valor decimal (str, float, Decimal) para unidades inteiras"""
+    return int((Decimal(str(value)) * AMOUNT_SCALE).to_integral_value(rounding=ROUND_DOWN))
+
+
+def from_units(units):
+    """Converter unidades inteiras para Decimal com 8 casas"""
+    return Decimal(int(units or 0)) / AMOUNT_SCALE
+
+
+def wei_to_units(wei):
+    return int(wei) // WEI_PER_UNIT
+
+
+def units_to_wei(units):
+    return int(units) * WEI_PER_UNIT
@@ -0,0 +1,79 @@
+from web3 import Web3
+
+# Multicall3 está implantado no mesmo endereço em Polygon e na maioria das redes EVM
+MULTICALL3_ADDRESS = "0xcA11bde05977b3631167028862bE2a173976CA11"
+
+MULTICALL3_ABI = [
+    {
+        "inputs": [
+            {
+                "components": [
+                    {"internalType": "address", "name": "target", "type": "address"},
+                    {"internalType": "bool", "name": "allowFailure", "type": "bool"},
+                    {"internalType": "bytes", "name": "callData", "type": "bytes"}
+                ],
+                "internalType": "struct Multicall3.Call3[]",
+                "name": "calls",
+                "type": "tuple[]"
+            }
+        ],
+        "name": "aggregate3",
+        "outputs": [
+            {
+                "components": [
+                    {"internalType": "bool", "name": "success", "type": "bool"},
+                    {"internalType": "bytes", "name": "returnData", "type": "bytes"}
+                ],
+                "internalType": "struct Multicall3.Result[]",
+                "name": "returnData",
+                "type": "tuple[]"
+            }
+        ],
+        "stateMutability": "payable",
+        "type": "function"
+    }
+]
+
+
+class BatchBalanceReader:
+    """Lê o balanceOf de muitas carteiras agregando as chamadas via Multicall3
+
+    Cada bloco de `chunk_size` carteiras custa um único eth_call ao provider.
+    """
+
+    def __init__(self, w3, token_contract, chunk_size=500, multicall_address=MULTICALL3_ADDRESS):
+        self.w3 = w3
+        self.token_contract = token_contract
+        self.chunk_size = max(1, int(chunk_size))
+        self.multicall = w3.eth.contract(
+            address=Web3.to_checksum_address(multicall_address),
+            abi=MULTICALL3_ABI
+        )
+
+    def fetch(self, wallet_addresses):
+        """Devolver {carteira: saldo em wei}; carteiras cuja chamada falhou ficam com None"""
+        balances = {}
+        wallets = list(dict.fromkeys(wallet_addresses))
+        for start in range(0, len(wallets), self.chunk_size):
+            chunk = wallets[start:start + self.chunk_size]
+            balances.update(self._fetch_chunk(chunk))
+        return balances
+
+    def _fetch_chunk(self, wallets):
+        token_address = self.token_contract.address
+        calls = [
+            (token_address, True, self.token_contract.encode_abi(
+                fn_name="balanceOf",
+                args=[Web3.to_checksum_address(wallet)]
+            ))
+            for wallet in wallets
+        ]
+        results = self.multicall.functions.aggregate3(calls).call()
+
+        balances = {}
+        for wallet, (success, return_data) in zip(wallets, results):
+            if success and len(return_data) == 32:
+                balances[wallet] = int.from_bytes(return_data, "big")
+            else:
+                balances[wallet] = None
+        return balances
@@ -0,0 +1,130 @@
+import threading
+import time
+from collections import OrderedDict
+
+_MISSING = object()
+
+
+class _InFlight:
+    """Chamada em curso partilhada pelos pedidos concorrentes da mesma chave"""
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class TTLCache:
+    """Cache LRU em memória com expiração (TTL) e coalescência de pedidos
+
+    Pedidos concorrentes para a mesma chave partilham uma única chamada ao
+    loader (single-flight), evitando rajadas de chamadas RPC idênticas.
+    """
+
+    def __init__(self, ttl=15.0, max_size=10000, clock=time.monotonic):
+        self.ttl = float(ttl)
+        self.max_size = int(max_size)
+        self._clock = clock
+        self._entries = OrderedDict()  # chave -> (expira_em, valor)
+        self._in_flight = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            value = self._lookup(key)
+            if value is _MISSING:
+                return default
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._store(key, value)
+
+    def invalidate(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def get_or_load(self, key, loader):
+        """Devolver o valor em cache ou carregá-lo uma única vez para todos os pedidos"""
+        with self._lock:
+            value = self._lookup(key)
+            if value is not _MISSING:
+                self.hits += 1
+                return value
+
+            flight = self._in_flight.get(key)
+            if flight is None:
+                flight = _InFlight()
+                self._in_flight[key] = flight
+                self.misses += 1
+                leader = True
+            else:
+                self.coalesced += 1
+                leader = False
+
+        if not leader:
+            flight.event.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+
+        try:
+            flight.value = loader()
+        except Exception as e:
+            # Erros não ficam em cache: o próximo pedido tenta de novo
+            flight.error = e
+            raise
+        else:
+            with self._lock:
+                self._store(key, flight.value)
+            return flight.value
+        finally:
+            with self._lock:
+                self._in_flight.pop(key, None)
+            flight.event.set()
+
+    def stats(self):
+        # Sem o lock: cada /metrics lê só contadores e len(), atómicos sob o GIL,
+        # e não atrasa os get/set (a expiração é feita sob o lock em _lookup)
+        return {
+            'size': len(self._entries),
+            'max_size': self.max_size,
+            'ttl': self.ttl,
+            'hits': self.hits,
+            'misses': self.misses,
+            'coalesced': self.coalesced,
+            'evictions': self.evictions,
+            'in_flight': len(self._in_flight)
+        }
+
+    def __len__(self):
+        return len(self._entries)
+
+    # Os métodos abaixo assumem que self._lock já está adquirido
+    def _lookup(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return _MISSING
+        expires_at, value = entry
+        if expires_at <= self._clock():
+            del self._entries[key]
+            return _MISSING
+        self._entries.move_to_end(key)
+        return value
+
+    def _store(self, key, value):
+        self._entries[key] = (self._clock() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
@@ -0,0 +1,253 @@
+import logging
+import time
+from collections import defaultdict
+from datetime import datetime
+
+from web3 import Web3
+
+logger = logging.getLogger(__name__)
+
+TRANSFER_TOPIC = Web3.to_hex(Web3.keccak(text="Transfer(address,address,uint256)"))
+ZERO_ADDRESS = "0x" + "0" * 40
+
+
+class ChainIndexer:
+    """Sincroniza eventos Transfer do token CFD para a base de dados
+
+    Lê os logs em janelas de blocos com eth_getLogs, mantém a tabela
+    carteira -> saldo e guarda checkpoints retomáveis. O hash de cada um dos
+    últimos `keep_blocks` blocos seguros fica em IndexedBlock; se o hash do
+    checkpoint deixar de coincidir com a cadeia (reorg), os blocos acima do
+    último hash que ainda coincide são revertidos antes de continuar.
+    """
+
+    def __init__(self, w3, token_contract, db, balance_model, transfer_model,
+                 checkpoint_model, block_model, name="cfd_transfers",
+                 start_block=0, window_size=2000, confirmations=32, keep_blocks=256):
+        self.w3 = w3
+        self.token_address = token_contract.address
+        self.db = db
+        self.TokenBalance = balance_model
+        self.TransferLog = transfer_model
+        self.IndexerCheckpoint = checkpoint_model
+        self.IndexedBlock = block_model
+        self.name = name
+        self.start_block = int(start_block)
+        self.max_window = max(1, int(window_size))
+        self.window_size = self.max_window
+        self.confirmations = int(confirmations)
+        self.keep_blocks = int(keep_blocks)
+
+    # Checkpoints
+    def _checkpoint(self):
+        return self.db.session.get(self.IndexerCheckpoint, self.name)
+
+    def _save_checkpoint(self, block_number, block_hash):
+        checkpoint = self._checkpoint()
+        if checkpoint is None:
+            checkpoint = self.IndexerCheckpoint(name=self.name)
+            self.db.session.add(checkpoint)
+        checkpoint.block_number = block_number
+        checkpoint.block_hash = block_hash
+        checkpoint.updated_at = datetime.utcnow()
+
+        self._save_block_hashes({block_number: block_hash})
+        self.IndexedBlock.query.filter(
+            self.IndexedBlock.number < block_number - self.keep_blocks
+        ).delete(synchronize_session=False)
+
+    def _save_block_hashes(self, hashes):
+        for number, block_hash in hashes.items():
+            self.db.session.merge(self.IndexedBlock(number=number, block_hash=block_hash))
+
+    def last_indexed_block(self):
+        checkpoint = self._checkpoint()
+        return checkpoint.block_number if checkpoint else self.start_block - 1
+
+    # Saldos
+    def _apply_deltas(self, deltas, block_number):
+        deltas = {wallet: delta for wallet, delta in deltas.items() if delta}
+        if not deltas:
+            return
+
+        rows = {
+            row.wallet_address: row
+            for row in self.TokenBalance.query.filter(
+                self.TokenBalance.wallet_address.in_(list(deltas))
+            )
+        }
+        for wallet, delta in deltas.items():
+            row = rows.get(wallet)
+            if row is None:
+                row = self.TokenBalance(wallet_address=wallet, balance_wei="0")
+                self.db.session.add(row)
+            row.balance_wei = str(int(row.balance_wei) + delta)
+            row.updated_block = block_number
+
+    @staticmethod
+    def _add_transfer(deltas, from_address, to_address, value):
+        if from_address != ZERO_ADDRESS:
+            deltas[from_address] -= value
+        if to_address != ZERO_ADDRESS:
+            deltas[to_address] += value
+
+    # Reorgs
+    def _find_fork_point(self):
+        """Devolver o último bloco indexado que ainda pertence à cadeia canónica"""
+        blocks = self.IndexedBlock.query.order_by(self.IndexedBlock.number.desc()).all()
+        for block in blocks:
+            chain_block = self.w3.eth.get_block(block.number)
+            if Web3.to_hex(chain_block["hash"]) == block.block_hash:
+                return block
+        return None
+
+    def _rollback_to(self, block_number):
+        """Reverter transferências e saldos acima de block_number"""
+        deltas = defaultdict(int)
+        orphaned = self.TransferLog.query.filter(self.TransferLog.block_number > block_number)
+        for log in orphaned:
+            # Aplicar a transferência no sentido inverso
+            self._add_transfer(deltas, log.to_address, log.from_address, int(log.value_wei))
+        self._apply_deltas(deltas, block_number)
+
+        orphaned.delete(synchronize_session=False)
+        self.IndexedBlock.query.filter(
+            self.IndexedBlock.number > block_number
+        ).delete(synchronize_session=False)
+
+    def check_reorg(self):
+        """Detetar um reorg no checkpoint atual e reverter até ao ponto de divergência"""
+        checkpoint = self._checkpoint()
+        if checkpoint is None:
+            return False
+
+        chain_block = self.w3.eth.get_block(checkpoint.block_number)
+        if Web3.to_hex(chain_block["hash"]) == checkpoint.block_hash:
+            return False
+
+        fork = self._find_fork_point()
+        if fork is not None:
+            fork_number, fork_hash = fork.number, fork.block_hash
+            logger.warning(f"Reorg detetado no bloco {checkpoint.block_number}; a reverter até {fork_number}")
+        else:
+            # Reorg mais fundo que os blocos guardados: reverter só até abaixo do
+            # mais antigo, e não reindexar a cadeia inteira desde start_block
+            oldest = self.db.session.query(self.db.func.min(self.IndexedBlock.number)).scalar()
+            fork_number = max(self.start_block - 1, (oldest if oldest is not None else checkpoint.block_number) - 1)
+            fork_hash = None
+            if fork_number >= self.start_block:
+                fork_hash = Web3.to_hex(self.w3.eth.get_block(fork_number)["hash"])
+            logger.error(
+                f"Reorg no bloco {checkpoint.block_number} mais fundo que os {self.keep_blocks} blocos guardados; "
+                f"a reverter até {fork_number} sem confirmar o hash"
+            )
+
+        self._rollback_to(fork_number)
+        if fork_hash is not None:
+            self._save_checkpoint(fork_number, fork_hash)
+        else:
+            self.db.session.delete(checkpoint)
+        self.db.session.commit()
+        return True
+
+    # Ingestão
+    def _get_logs(self, from_block, to_block):
+        return self.w3.eth.get_logs({
+            "address": self.token_address,
+            "fromBlock": from_block,
+            "toBlock": to_block,
+            "topics": [TRANSFER_TOPIC]
+        })
+
+    def _index_window(self, from_block, to_block, head=None):
+        logs = self._get_logs(from_block, to_block)
+
+        deltas = defaultdict(int)
+        hashes = {}
+        for log in logs:
+            topics = log["topics"]
+            from_address = "0x" + bytes(topics[1])[-20:].hex()
+            to_address = "0x" + bytes(topics[2])[-20:].hex()
+            value = int.from_bytes(bytes(log["data"]), "big")
+
+            self._add_transfer(deltas, from_address, to_address, value)
+            hashes[log["blockNumber"]] = Web3.to_hex(log["blockHash"])
+            self.db.session.add(self.TransferLog(
+                block_number=log["blockNumber"],
+                block_hash=hashes[log["blockNumber"]],
+                log_index=log["logIndex"],
+                tx_hash=Web3.to_hex(log["transactionHash"]),
+                from_address=from_address,
+                to_address=to_address,
+                value_wei=str(value)
+            ))
+
+        self._apply_deltas(deltas, to_block)
+        # Hash de cada bloco dentro de keep_blocks do topo seguro, para achar o ponto
+        # de divergência de um reorg (os de blocos com logs já vieram no eth_getLogs)
+        head = to_block if head is None else head
+        kept = {
+            number: hashes.get(number) or Web3.to_hex(self.w3.eth.get_block(number)["hash"])
+            for number in range(max(from_block, head - self.keep_blocks + 1), to_block)
+        }
+        self._save_block_hashes(kept)
+        end_block = self.w3.eth.get_block(to_block)
+        self._save_checkpoint(to_block, Web3.to_hex(end_block["hash"]))
+        self.db.session.commit()
+        return len(logs)
+
+    def run_once(self):
+        """Indexar até ao bloco seguro mais recente; devolve estatísticas de throughput"""
+        self.check_reorg()
+
+        head = self.w3.eth.block_number - self.confirmations
+        next_block = self.last_indexed_block() + 1
+        started = time.perf_counter()
+        blocks = events = 0
+
+        while next_block <= head:
+            to_block = min(next_block + self.window_size - 1, head)
+            try:
+                events += self._index_window(next_block, to_block, head)
+            except Exception as e:
+                self.db.session.rollback()
+                if self.window_size == 1:
+                    raise
+                # Providers limitam o número de logs por pedido: reduzir a janela
+                self.window_size = max(1, self.window_size // 2)
+                logger.warning(f"Erro em eth_getLogs ({e}); janela reduzida para {self.window_size} blocos")
+                continue
+
+            blocks += to_block - next_block + 1
+            next_block = to_block + 1
+            self.window_size = min(self.max_window, self.window_size * 2)
+
+        elapsed = time.perf_counter() - started
+        return {
+            "blocks": blocks,
+            "events": events,
+            "elapsed": elapsed,
+            "blocks_per_second": blocks / elapsed if elapsed > 0 else 0.0,
+            "events_per_second": events / elapsed if elapsed > 0 else 0.0,
+            "last_block": next_block - 1
+        }
+
+    def run_forever(self, poll_interval=5.0):
+        while True:
+            try:
+                stats = self.run_once()
+                if stats["blocks"]:
+                    logger.info(
+                        f"Indexados {stats['blocks']} blocos e {stats['events']} eventos "
+                        f"({stats['blocks_per_second']:.1f} blocos/s, "
+                        f"{stats['events_per_second']:.1f} eventos/s) até ao bloco {stats['last_block']}"
+                    )
+            except Exception as e:
+                self.db.session.rollback()
+                logger.error(f"Erro no indexador: {e}")
+            time.sleep(poll_interval)
+
+    def get_balance(self, wallet_address):
+        """Saldo indexado em wei, ou None se a carteira nunca foi vista"""
+        row = self.db.session.get(self.TokenBalance, wallet_address.lower())
+        return int(row.balance_wei) if row else None
@@ -0,0 +1,117 @@
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+
+class ChainMetadata:
+    """Metadados da rede partilhados pelo processo, sem uma chamada RPC por pedido
+
+    O chain_id fica em cache para sempre; gas_price, último bloco e o estado
+    da ligação são atualizados por uma thread em segundo plano, iniciada
+    preguiçosamente em cada processo (compatível com o fork do gunicorn).
+    """
+
+    def __init__(self, w3, refresh_interval=10.0):
+        self.w3 = w3
+        self.refresh_interval = float(refresh_interval)
+        self._lock = threading.Lock()
+        self._chain_id = None
+        self._gas_price = None
+        self._latest_block = None
+        self._connected = False
+        self._checked_at = None  # time.time() da última atualização
+        self._error = None
+        self._thread_pid = None
+
+    @property
+    def chain_id(self):
+        if self._chain_id is None:
+            with self._lock:
+                if self._chain_id is None:
+                    self._chain_id = self.w3.eth.chain_id
+        return self._chain_id
+
+    def web3_middleware(self, make_request, w3):
+        """Middleware Web3 (v6): eth_chainId respondido pela cache
+
+        A validação do web3 pede o chain_id antes de cada eth_call; sem isto
+        cada leitura de saldo custaria duas chamadas RPC.
+        """
+        def middleware(method, params):
+            if method != "eth_chainId":
+                return make_request(method, params)
+            if self._chain_id is not None:
+                return {"jsonrpc": "2.0", "id": 0, "result": hex(self._chain_id)}
+            response = make_request(method, params)
+            result = response.get("result")
+            if result is not None:
+                self._chain_id = int(result, 16) if isinstance(result, str) else int(result)
+            return response
+        return middleware
+
+    @property
+    def gas_price(self):
+        self.ensure_started()
+        if self._gas_price is None:
+            self.refresh()
+        if self._gas_price is None:
+            raise RuntimeError(f"gas_price indisponível: {self._error}")
+        return self._gas_price
+
+    @property
+    def latest_block(self):
+        self.ensure_started()
+        return self._latest_block
+
+    def refresh(self):
+        try:
+            gas_price = self.w3.eth.gas_price
+            latest_block = self.w3.eth.block_number
+        except Exception as e:
+            with self._lock:
+                self._connected = False
+                self._error = str(e)
+                self._checked_at = time.time()
+            return False
+
+        with self._lock:
+            self._gas_price = gas_price
+            self._latest_block = latest_block
+            self._connected = True
+            self._error = None
+            self._checked_at = time.time()
+        return True
+
+    def ensure_started(self):
+        if self._thread_pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread_pid == os.getpid():
+                return
+            self._thread_pid = os.getpid()
+        thread = threading.Thread(target=self._run, name="chain-metadata", daemon=True)
+        thread.start()
+
+    def _run(self):
+        while True:
+            self.refresh()
+            time.sleep(self.refresh_interval)
+
+    def snapshot(self):
+        """Estado em cache para /health, com a idade da última verificação"""
+        self.ensure_started()
+        with self._lock:
+            checked_at = self._checked_at
+            return {
+                "connected": self._connected,
+                "chain_id": self._chain_id,
+                "gas_price": self._gas_price,
+                "latest_block": self._latest_block,
+                "checked_at": datetime.utcfromtimestamp(checked_at).isoformat() if checked_at else None,
+                "age_seconds": round(time.time() - checked_at, 3) if checked_at else None,
+                "error": self._error
+            }
@@ -0,0 +1,82 @@
+import hashlib
+import json
+import logging
+import threading
+import time
+
+from src.models.casinofound import SiteConfig
+from src.services.data_versions import read_version
+
+logger = logging.getLogger(__name__)
+
+CONFIG_VERSION = "config"
+
+
+def _payload(data):
+    """Corpo JSON já serializado e o respetivo ETag forte"""
+    body = json.dumps(data, sort_keys=True).encode("utf-8")
+    return body, hashlib.sha1(body).hexdigest()
+
+
+class ConfigCache:
+    """Cópia em memória de SiteConfig, servida a partir de um dict
+
+    A tabela é carregada por inteiro; a linha de versão ('config' em
+    data_version) é consultada no máximo a cada `check_interval` segundos e,
+    se mudou (set_config noutro worker), a tabela é recarregada.
+    """
+
+    def __init__(self, check_interval=5.0, clock=time.monotonic):
+        self.check_interval = float(check_interval)
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._entries = {}  # chave -> (corpo, etag)
+        self._all = None  # (corpo, etag) de todas as chaves
+        self._version = None
+        self._checked_at = None
+        self.reloads = 0
+
+    def load(self):
+        """Ler toda a tabela e a versão atual (requer contexto da aplicação)"""
+        version = read_version(CONFIG_VERSION)
+        configs = [config.to_dict() for config in SiteConfig.query.all()]
+        entries = {config["key"]: _payload(config) for config in configs}
+        all_payload = _payload({config["key"]: config for config in configs})
+        with self._lock:
+            self._entries = entries
+            self._all = all_payload
+            self._version = version
+            self._checked_at = self._clock()
+            self.reloads += 1
+
+    def invalidate(self):
+        """Forçar a verificação da versão no próximo acesso"""
+        with self._lock:
+            self._checked_at = None
+
+    def _ensure_fresh(self):
+        checked_at = self._checked_at
+        if checked_at is not None and self._clock() - checked_at < self.check_interval:
+            return
+        version = read_version(CONFIG_VERSION)
+        if version != self._version or self._all is None:
+            self.load()
+        else:
+            with self._lock:
+                self._checked_at = self._clock()
+
+    def get(self, key):
+        """(corpo, etag) da configuração `key`, ou None se não existir"""
+        self._ensure_fresh()
+        return self._entries.get(key)
+
+    def get_all(self):
+        self._ensure_fresh()
+        return self._all
+
+    def stats(self):
+        return {
+            "keys": len(self._entries),
+            "version": self._version,
+            "reloads": self.reloads
+        }
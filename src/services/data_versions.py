@@ -0,0 +1,36 @@
+from sqlalchemy.exc import IntegrityError
+
+from src.models.casinofound import db, DataVersion
+
+
+def bump_version(name):
+    """Incrementar a versão de `name` na transação atual (o commit fica a cargo de quem chama)"""
+    updated = DataVersion.query.filter_by(name=name).update(
+        {DataVersion.version: DataVersion.version + 1}, synchronize_session=False
+    )
+    if updated:
+        return
+
+    # Primeira escrita deste conjunto: criar a linha (outro worker pode ganhar a corrida)
+    try:
+        with db.session.begin_nested():
+            db.session.add(DataVersion(name=name, version=1))
+    except IntegrityError:
+        DataVersion.query.filter_by(name=name).update(
+            {DataVersion.version: DataVersion.version + 1}, synchronize_session=False
+        )
+
+
+def read_versions(names):
+    """Versões atuais de `names` numa única consulta; nomes sem linha valem 0"""
+    names = list(names)
+    rows = db.session.query(DataVersion.name, DataVersion.version).filter(
+        DataVersion.name.in_(names)
+    ).all()
+    versions = dict.fromkeys(names, 0)
+    versions.update(rows)
+    return versions
+
+
+def read_version(name):
+    return read_versions([name])[name]
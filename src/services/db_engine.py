@@ -0,0 +1,158 @@
+import logging
+import os
+
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import NullPool
+
+logger = logging.getLogger(__name__)
+
+# Perfis nomeados; cada valor pode ser substituído pela variável DB_* correspondente
+PROFILES = {
+    # SQLite num só servidor: WAL deixa leitores e um escritor trabalhar em paralelo
+    # e busy_timeout faz os escritores esperar pelo lock em vez de falhar
+    "sqlite-wal": {
+        "pool_size": 5,
+        "max_overflow": 10,
+        "pool_timeout": 30,
+        "pool_recycle": -1,
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "busy_timeout_ms": 5000
+    },
+    # Postgres direto: pool por worker, ligações recicladas antes do timeout do servidor
+    "postgres-pooled": {
+        "pool_size": 10,
+        "max_overflow": 20,
+        "pool_timeout": 30,
+        "pool_recycle": 1800,
+        "statement_timeout_ms": 15000
+    },
+    # Postgres atrás do PgBouncer em modo transação: o pool é do PgBouncer,
+    # sem prepared statements nem parâmetros de arranque por ligação
+    "postgres-pgbouncer": {
+        "pool_size": None,
+        "prepared_statements": False,
+        "statement_timeout_ms": 15000
+    }
+}
+
+_ENV_OVERRIDES = {
+    "pool_size": "DB_POOL_SIZE",
+    "max_overflow": "DB_MAX_OVERFLOW",
+    "pool_timeout": "DB_POOL_TIMEOUT",
+    "pool_recycle": "DB_POOL_RECYCLE",
+    "statement_timeout_ms": "DB_STATEMENT_TIMEOUT_MS",
+    "busy_timeout_ms": "DB_BUSY_TIMEOUT_MS",
+    "journal_mode": "DB_SQLITE_JOURNAL_MODE",
+    "synchronous": "DB_SQLITE_SYNCHRONOUS"
+}
+
+
+def normalize_database_url(url):
+    """Aceitar o esquema postgres:// usado por alguns fornecedores"""
+    if url.startswith("postgres://"):
+        return "postgresql://" + url[len("postgres://"):]
+    return url
+
+
+def default_profile(url):
+    backend = make_url(url).get_backend_name()
+    if backend == "sqlite":
+        return "sqlite-wal"
+    if backend == "postgresql":
+        return "postgres-pooled"
+    return None
+
+
+def resolve_profile(url, name=None):
+    """Definições do perfil `name` (ou do perfil por omissão para o URL) com as substituições do ambiente"""
+    name = name or os.getenv("DB_ENGINE_PROFILE") or default_profile(url)
+    if name is None:
+        return None, {}
+    if name not in PROFILES:
+        raise ValueError(f"Perfil de base de dados desconhecido: {name} (opções: {', '.join(PROFILES)})")
+
+    settings = dict(PROFILES[name])
+    for key, env_name in _ENV_OVERRIDES.items():
+        value = os.getenv(env_name)
+        if value is None or value == "":
+            continue
+        settings[key] = value if key in ("journal_mode", "synchronous") else int(value)
+    return name, settings
+
+
+def engine_options(url, name=None):
+    """SQLALCHEMY_ENGINE_OPTIONS para o perfil; os pragmas SQLite ficam para `configure_engine`"""
+    name, settings = resolve_profile(url, name)
+    options = {"pool_pre_ping": True}
+    if name is None:
+        return options
+
+    url_obj = make_url(url)
+    backend, driver = url_obj.get_backend_name(), url_obj.get_driver_name()
+    in_memory = backend == "sqlite" and url_obj.database in (None, "", ":memory:")
+
+    if settings.get("pool_size") is None:
+        options["poolclass"] = NullPool
+        options.pop("pool_pre_ping")
+    elif not in_memory:
+        for key in ("pool_size", "max_overflow", "pool_timeout", "pool_recycle"):
+            if key in settings:
+                options[key] = settings[key]
+
+    connect_args = {}
+    if backend == "sqlite" and settings.get("busy_timeout_ms"):
+        connect_args["timeout"] = settings["busy_timeout_ms"] / 1000
+    if backend == "postgresql":
+        timeout = settings.get("statement_timeout_ms")
+        behind_pgbouncer = settings.get("prepared_statements") is False
+        if driver == "asyncpg" and behind_pgbouncer:
+            # Cache do asyncpg e do dialeto do SQLAlchemy
+            connect_args["statement_cache_size"] = 0
+            connect_args["prepared_statement_cache_size"] = 0
+        # O PgBouncer rejeita parâmetros de arranque: aí o timeout vai em SET LOCAL por transação
+        if timeout and not behind_pgbouncer:
+            if driver == "asyncpg":
+                connect_args["server_settings"] = {"statement_timeout": str(timeout)}
+            else:
+                connect_args["options"] = f"-c statement_timeout={timeout}"
+    if connect_args:
+        options["connect_args"] = connect_args
+    return options
+
+
+def configure_engine(engine, name=None):
+    """Instalar os eventos de ligação do perfil (pragmas SQLite, timeout em PgBouncer)
+
+    Para engines assíncronos passa-se `async_engine.sync_engine`.
+    """
+    name, settings = resolve_profile(str(engine.url), name)
+    backend = engine.url.get_backend_name()
+
+    if backend == "sqlite":
+        pragmas = []
+        if settings.get("journal_mode") and engine.url.database not in (None, "", ":memory:"):
+            pragmas.append(f"PRAGMA journal_mode={settings['journal_mode']}")
+        if settings.get("synchronous"):
+            pragmas.append(f"PRAGMA synchronous={settings['synchronous']}")
+        if settings.get("busy_timeout_ms"):
+            pragmas.append(f"PRAGMA busy_timeout={int(settings['busy_timeout_ms'])}")
+        if pragmas:
+            @event.listens_for(engine, "connect")
+            def set_sqlite_pragmas(dbapi_connection, connection_record):
+                cursor = dbapi_connection.cursor()
+                for pragma in pragmas:
+                    cursor.execute(pragma)
+                cursor.close()
+
+    elif (backend == "postgresql" and settings.get("prepared_statements") is False
+          and settings.get("statement_timeout_ms")):
+        timeout = int(settings["statement_timeout_ms"])
+
+        @event.listens_for(engine, "begin")
+        def set_statement_timeout(connection):
+            connection.exec_driver_sql(f"SET LOCAL statement_timeout = {timeout}")
+
+    logger.info(f"Perfil de base de dados: {name or 'nenhum'} ({backend})")
+    return name
@@ -0,0 +1,100 @@
+import os
+import time
+from functools import wraps
+
+from flask import g, request
+
+from src.services.cache import TTLCache
+
+# Read-your-writes com vários workers (gunicorn): recent_writers é uma TTLCache
+# por processo e só cobre leituras servidas pelo worker que fez a escrita.
+# A garantia entre workers é STICKY_HEADER, que não depende de estado no
+# servidor: o cliente que o repete lê do primário em qualquer worker.
+
+# Janela em que uma carteira (ou cliente) que escreveu lê do primário
+REPLICA_STICKY_SECONDS = float(os.getenv("REPLICA_STICKY_SECONDS", "5"))
+REPLICA_STICKY_MAX_WALLETS = int(os.getenv("REPLICA_STICKY_MAX_WALLETS", "100000"))
+# Cabeçalho devolvido nas escritas que o cliente repete nas leituras seguintes.
+# Não é um cookie: o frontend chama a API de outra origem e um cookie
+# SameSite=Lax não volta nesses fetch.
+STICKY_HEADER = "X-DB-Primary-Until"
+WRITE_METHODS = {"POST", "PUT", "PATCH", "DELETE"}
+# Chaves do corpo JSON com uma carteira (referrer_address/new_user_address: /api/affiliate_share)
+WALLET_KEYS = (
+    "wallet_address", "referrer_wallet", "referred_wallet", "wallet", "referrer",
+    "referrer_address", "new_user_address"
+)
+
+# Só deste processo (ver acima)
+recent_writers = TTLCache(ttl=REPLICA_STICKY_SECONDS, max_size=REPLICA_STICKY_MAX_WALLETS)
+
+
+def _request_wallets():
+    """Carteiras referidas no pedido: URL, query string e corpo JSON (objeto ou lista)"""
+    wallets = set()
+    view_args = request.view_args or {}
+    for value in (view_args.get("wallet_address"), request.args.get("wallet_address"), request.args.get("wallet")):
+        if value:
+            wallets.add(value.lower())
+
+    data = request.get_json(silent=True) if request.is_json else None
+    items = data if isinstance(data, list) else [data]
+    for item in items:
+        if isinstance(item, dict):
+            for key in WALLET_KEYS:
+                value = item.get(key)
+                if isinstance(value, str) and value:
+                    wallets.add(value.lower())
+            values = item.get("wallet_addresses")
+            if isinstance(values, list):
+                wallets.update(value.lower() for value in values if isinstance(value, str) and value)
+    return wallets
+
+
+def wants_primary(wallets, primary_until=None):
+    """Ler do primário: STICKY_HEADER ainda válido ou escrita recente de uma das carteiras (em minúsculas)"""
+    try:
+        if float(primary_until or 0) > time.time():
+            return True
+    except ValueError:
+        pass
+    return any(recent_writers.get(wallet) for wallet in wallets)
+
+
+def _is_sticky():
+    return wants_primary(_request_wallets(), request.headers.get(STICKY_HEADER))
+
+
+def read_only(fn):
+    """Rota só de leitura: consultas na réplica, salvo escrita recente da mesma carteira ou cliente
+
+    Também serve para POST que só leem (ex.: /user_data/batch), que assim não fixam o cliente no primário.
+    """
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        g.db_read_only_route = True
+        g.db_read_replica = not _is_sticky()
+        return fn(*args, **kwargs)
+    return wrapper
+
+
+def use_primary():
+    """Voltar ao primário no resto do pedido (ex.: confirmar antes de criar uma linha)"""
+    g.db_read_replica = False
+
+
+def remember_writes(response):
+    """after_request: fixar no primário as carteiras e o cliente que acabaram de escrever
+
+    As carteiras do pedido ficam em recent_writers (só neste worker) durante
+    REPLICA_STICKY_SECONDS; o cliente recebe STICKY_HEADER, que tem de repetir
+    para ler as próprias escritas em qualquer worker.
+    """
+    if (request.method not in WRITE_METHODS or response.status_code >= 400
+            or g.get("db_read_only_route")):
+        return response
+    for wallet in _request_wallets():
+        recent_writers.set(wallet, True)
+    response.headers[STICKY_HEADER] = f"{time.time() + REPLICA_STICKY_SECONDS:.3f}"
+    return response
+
@@ -0,0 +1,136 @@
+from decimal import Decimal
+
+import numpy as np
+
+from src.models.casinofound import db, DividendPayment, StakingRecord
+
+WEI_PER_MATIC = 10 ** 18
+# Pesos convertidos para inteiros com 8 casas antes da divisão exata do prémio
+WEIGHT_SCALE = 10 ** 8
+INSERT_CHUNK_SIZE = 5000
+
+
+def load_stakes(period_start, period_end):
+    """Registos de staking que se sobrepõem ao período, lidos numa única consulta
+
+    Devolve arrays (carteiras, montantes, início, fim) com datas em datetime64[us];
+    staking ainda ativo termina no fim do período.
+    """
+    rows = db.session.execute(
+        db.select(
+            StakingRecord.wallet_address,
+            StakingRecord.amount_staked,
+            StakingRecord.staked_at,
+            StakingRecord.unstaked_at
+        ).where(
+            StakingRecord.staked_at < period_end,
+            db.or_(StakingRecord.unstaked_at.is_(None), StakingRecord.unstaked_at > period_start)
+        )
+    ).all()
+    if not rows:
+        empty = np.array([], dtype='datetime64[us]')
+        return np.array([], dtype=object), np.array([], dtype=np.float64), empty, empty
+
+    wallets, amounts, staked_at, unstaked_at = zip(*rows)
+    ends = np.array(unstaked_at, dtype='datetime64[us]')
+    ends[np.isnat(ends)] = np.datetime64(period_end, 'us')
+    return (
+        np.array(wallets, dtype=object),
+        np.array(amounts, dtype=np.float64),
+        np.array(staked_at, dtype='datetime64[us]'),
+        ends
+    )
+
+
+def time_weighted_stakes(wallets, amounts, starts, ends, period_start, period_end):
+    """Stake médio de cada carteira no período (montante × fração de tempo em staking)
+
+    Devolve (carteiras únicas ordenadas, pesos); carteiras sem sobreposição ficam de fora.
+    """
+    period_start = np.datetime64(period_start, 'us')
+    period_end = np.datetime64(period_end, 'us')
+    duration = (period_end - period_start).astype(np.int64)
+    if duration <= 0:
+        raise ValueError("O fim do período tem de ser posterior ao início")
+
+    overlap = (np.minimum(ends, period_end) - np.maximum(starts, period_start)).astype(np.int64)
+    np.clip(overlap, 0, None, out=overlap)
+
+    # Fatorizar com um dict: np.unique ordena 1M strings e é várias vezes mais lento
+    index = {}
+    inverse = np.fromiter(
+        (index.setdefault(wallet, len(index)) for wallet in wallets), dtype=np.int64, count=len(wallets)
+    )
+    unique_wallets = np.array(list(index), dtype=object)
+    weights = np.bincount(inverse, weights=amounts * (overlap / duration), minlength=len(unique_wallets))
+
+    order = np.argsort(unique_wallets, kind='stable')
+    unique_wallets, weights = unique_wallets[order], weights[order]
+    keep = weights > 0
+    return unique_wallets[keep], weights[keep]
+
+
+def allocate_pro_rata(pool_wei, weights):
+    """Dividir pool_wei por pesos com inteiros exatos (método do maior resto)
+
+    A soma das partes é sempre igual a pool_wei; os restos são atribuídos às
+    carteiras com maior parte fracionária (empates pela ordem dos pesos).
+    """
+    units = np.floor(np.asarray(weights, dtype=np.float64) * WEIGHT_SCALE).astype(np.int64)
+    # Produtos até ~1e42: aritmética inteira do Python, fora do int64
+    exact_units = units.astype(object)
+    total = int(exact_units.sum())
+    if total <= 0:
+        return [0] * len(units)
+
+    products = exact_units * int(pool_wei)
+    shares = products // total
+    # Os restos só ordenam o desempate; float basta e evita overflow
+    remainders = (products % total).astype(np.float64)
+
+    leftover = int(pool_wei) - int(shares.sum())
+    if leftover:
+        order = np.argsort(-remainders, kind='stable')[:leftover]
+        shares[order] += 1
+    return [int(share) for share in shares]
+
+
+def compute_dividends(period_start, period_end, pool_wei):
+    """Pagamentos [(carteira, stake médio, wei)] do período, sem escrever na base de dados"""
+    wallets, amounts, starts, ends = load_stakes(period_start, period_end)
+    stakers, weights = time_weighted_stakes(wallets, amounts, starts, ends, period_start, period_end)
+    shares = allocate_pro_rata(pool_wei, weights)
+    return [
+        (wallet, float(weight), share)
+        for wallet, weight, share in zip(stakers, weights, shares)
+        if share > 0
+    ]
+
+
+def distribute_dividends(period_start, period_end, pool_wei, dry_run=False):
+    """Calcular e gravar os DividendPayment do período numa única transação"""
+    already_paid = db.session.query(DividendPayment.id).filter_by(
+        period_start=period_start, period_end=period_end
+    ).first()
+    if already_paid:
+        raise ValueError("Dividendos já distribuídos para este período")
+
+    payments = compute_dividends(period_start, period_end, pool_wei)
+    if dry_run or not payments:
+        return payments
+
+    rows = [
+        {
+            'wallet_address': wallet,
+            'amount_matic': float(Decimal(share) / WEI_PER_MATIC),
+            'amount_wei': str(share),
+            'staked_tokens': weight,
+            'period_start': period_start,
+            'period_end': period_end
+        }
+        for wallet, weight, share in payments
+    ]
+    for start in range(0, len(rows), INSERT_CHUNK_SIZE):
+        db.session.execute(db.insert(DividendPayment), rows[start:start + INSERT_CHUNK_SIZE])
+    db.session.commit()
+    return payments
@@ -0,0 +1,68 @@
+import hashlib
+from functools import wraps
+
+from flask import Response, current_app, jsonify, request
+
+IDEMPOTENCY_HEADER = "Idempotency-Key"
+MAX_KEY_LENGTH = 255
+
+
+def violates_unique(error, model, column="transaction_hash"):
+    """IntegrityError causado pelo índice único de `column` em `model` (SQLite ou Postgres)
+
+    O SQLite indica "tabela.coluna" e o Postgres o nome do índice (uq_<tabela>_<coluna>).
+    """
+    table = model.__tablename__
+    message = str(getattr(error, "orig", error))
+    return f"uq_{table}_{column}" in message or f"{table}.{column}" in message
+
+
+class _ServerError(Exception):
+    """Resposta 5xx: devolvida a quem esperava mas nunca guardada em cache"""
+
+    def __init__(self, response):
+        self.response = response
+
+
+def idempotent(cache):
+    """Repetir a resposta original a POSTs com o mesmo Idempotency-Key
+
+    A resposta (corpo, status, mimetype) fica em `cache` (TTLCache, limitada
+    e com expiração) por endpoint e chave; pedidos concorrentes com a mesma
+    chave esperam pelo primeiro. A mesma chave com outro corpo dá 409.
+    A cache é por processo: entre workers a garantia vem dos índices únicos.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            key = request.headers.get(IDEMPOTENCY_HEADER)
+            if not key:
+                return view(*args, **kwargs)
+            if len(key) > MAX_KEY_LENGTH:
+                return jsonify({'error': 'Idempotency-Key inválido'}), 400
+
+            body_hash = hashlib.sha256(request.get_data()).hexdigest()
+            replayed = True
+
+            def load():
+                nonlocal replayed
+                replayed = False
+                response = current_app.make_response(view(*args, **kwargs))
+                stored = (body_hash, response.get_data(), response.status_code, response.mimetype)
+                if response.status_code >= 500:
+                    raise _ServerError(stored)
+                return stored
+
+            try:
+                stored = cache.get_or_load((request.endpoint, key), load)
+            except _ServerError as e:
+                stored = e.response
+
+            if stored[0] != body_hash:
+                return jsonify({'error': 'Idempotency-Key já usado com outro pedido'}), 409
+            response = Response(stored[1], status=stored[2], mimetype=stored[3])
+            if replayed:
+                response.headers['Idempotent-Replayed'] = 'true'
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,127 @@
+import threading
+import time
+from bisect import bisect_left, insort
+from datetime import timedelta
+
+# Linhas relidas em cada sincronização: relógios de workers diferentes e
+# commits atrasados podem gravar updated_at ligeiramente no passado
+SYNC_OVERLAP = timedelta(seconds=10)
+
+
+class SortedIndex:
+    """Lista ordenada de (-valor, carteira) com posição por bisect
+
+    Rank e top-N são O(log n) / O(limit); atualizar uma carteira custa
+    O(log n) na procura mais a deslocação da lista. Valores nulos ou zero
+    ficam fora do índice.
+    """
+
+    def __init__(self):
+        self._keys = []
+        self._values = {}
+
+    def build(self, items):
+        """Carregar de uma vez [(carteira, valor)], ordenando uma só vez"""
+        self._values = {wallet: value for wallet, value in items if value}
+        self._keys = sorted((-value, wallet) for wallet, value in self._values.items())
+
+    def update(self, wallet, value):
+        old = self._values.get(wallet)
+        if old == value or (not old and not value):
+            return
+        if old:
+            del self._keys[bisect_left(self._keys, (-old, wallet))]
+        if value:
+            insort(self._keys, (-value, wallet))
+            self._values[wallet] = value
+        else:
+            self._values.pop(wallet, None)
+
+    def rank(self, wallet):
+        """Posição (1 = maior valor) e valor da carteira, ou (None, 0)"""
+        value = self._values.get(wallet)
+        if not value:
+            return None, 0
+        return bisect_left(self._keys, (-value, wallet)) + 1, value
+
+    def top(self, limit):
+        return [(wallet, -key) for key, wallet in self._keys[:limit]]
+
+    def __len__(self):
+        return len(self._keys)
+
+
+class Leaderboards:
+    """Índices ordenados por coluna de User, sincronizados por updated_at
+
+    `columns` mapeia o nome público (ex.: 'balance') para a coluna do modelo.
+    A primeira leitura carrega a tabela; as seguintes só leem as linhas
+    alteradas desde a última sincronização, no máximo a cada `sync_interval`
+    segundos (ou logo após `invalidate`).
+    """
+
+    def __init__(self, db, user_model, columns, sync_interval=2.0, clock=time.monotonic):
+        self.db = db
+        self.User = user_model
+        self.columns = dict(columns)
+        self.sync_interval = float(sync_interval)
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._indexes = {name: SortedIndex() for name in self.columns}
+        self._watermark = None
+        self._loaded = False
+        self._synced_at = None
+
+    def _select(self):
+        User = self.User
+        return self.db.select(
+            User.wallet_address,
+            User.updated_at,
+            *(getattr(User, column) for column in self.columns.values())
+        )
+
+    def _load(self):
+        rows = self.db.session.execute(self._select()).all()
+        for position, name in enumerate(self.columns, start=2):
+            self._indexes[name].build((row[0], row[position]) for row in rows)
+        self._watermark = max((row[1] for row in rows if row[1] is not None), default=None)
+        self._loaded = True
+
+    def _sync_changes(self):
+        User = self.User
+        statement = self._select()
+        if self._watermark is not None:
+            statement = statement.where(User.updated_at >= self._watermark - SYNC_OVERLAP)
+        for row in self.db.session.execute(statement.order_by(User.updated_at)).yield_per(10000):
+            for position, name in enumerate(self.columns, start=2):
+                self._indexes[name].update(row[0], row[position])
+            if row[1] is not None and (self._watermark is None or row[1] > self._watermark):
+                self._watermark = row[1]
+
+    def sync(self, force=False):
+        """Aplicar as alterações desde a última sincronização (requer contexto da aplicação)"""
+        if not force and self._synced_at is not None and self._clock() - self._synced_at < self.sync_interval:
+            return
+        with self._lock:
+            if not force and self._synced_at is not None and self._clock() - self._synced_at < self.sync_interval:
+                return
+            if self._loaded:
+                self._sync_changes()
+            else:
+                self._load()
+            self._synced_at = self._clock()
+
+    def invalidate(self):
+        """Sincronizar no próximo acesso, sem esperar pelo intervalo"""
+        self._synced_at = None
+
+    def top(self, name, limit):
+        self.sync()
+        with self._lock:
+            return self._indexes[name].top(limit)
+
+    def rank(self, name, wallet):
+        self.sync()
+        with self._lock:
+            rank, value = self._indexes[name].rank(wallet)
+            return rank, value, len(self._indexes[name])
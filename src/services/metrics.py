@@ -0,0 +1,289 @@
+import cProfile
+import io
+import logging
+import pstats
+import random
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
+
+from flask import g, has_request_context, request
+from flask.json.provider import DefaultJSONProvider
+from sqlalchemy import event
+
+from src.services.rpc_provider import LATENCY_BUCKETS
+
+logger = logging.getLogger(__name__)
+
+# Buckets do número de consultas por pedido (N+1 aparece nos buckets altos)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+
+
+class Histogram:
+    """Histograma por conjunto de labels; buckets não cumulativos, o último é +Inf"""
+
+    def __init__(self, buckets):
+        self.buckets = tuple(buckets)
+        self.series = {}
+
+    def observe(self, labels, value):
+        entry = self.series.get(labels)
+        if entry is None:
+            entry = {"buckets": [0] * (len(self.buckets) + 1), "sum": 0.0, "count": 0}
+            self.series[labels] = entry
+        index = len(self.buckets)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                index = i
+                break
+        entry["buckets"][index] += 1
+        entry["sum"] += value
+        entry["count"] += 1
+
+
+class Summary:
+    """Só soma e contagem por conjunto de labels (tempo médio sem o custo dos buckets)"""
+
+    def __init__(self):
+        self.series = {}
+
+    def observe(self, labels, value):
+        entry = self.series.get(labels)
+        if entry is None:
+            entry = {"sum": 0.0, "count": 0}
+            self.series[labels] = entry
+        entry["sum"] += value
+        entry["count"] += 1
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra=""):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}"
+
+
+def render_histogram(lines, name, help_text, label_names, buckets, series):
+    """Acrescentar um histograma no formato de texto do Prometheus (buckets cumulativos)"""
+    lines.append(f"# HELP {name} {help_text}")
+    lines.append(f"# TYPE {name} histogram")
+    for labels, entry in sorted(series.items()):
+        cumulative = 0
+        for bound, count in zip(list(buckets) + ["+Inf"], entry["buckets"]):
+            cumulative += count
+            le = f'le="{bound}"'
+            lines.append(f"{name}_bucket{_labels(label_names, labels, le)} {cumulative}")
+        lines.append(f"{name}_sum{_labels(label_names, labels)} {entry['sum']}")
+        lines.append(f"{name}_count{_labels(label_names, labels)} {entry['count']}")
+
+
+def render_summary(lines, name, help_text, label_names, series):
+    """Acrescentar um summary sem quantis (_sum e _count) no formato do Prometheus"""
+    lines.append(f"# HELP {name} {help_text}")
+    lines.append(f"# TYPE {name} summary")
+    for labels, entry in sorted(series.items()):
+        lines.append(f"{name}_sum{_labels(label_names, labels)} {entry['sum']}")
+        lines.append(f"{name}_count{_labels(label_names, labels)} {entry['count']}")
+
+
+def _flatten(source, prefix=""):
+    for key, value in sorted(source.items(), key=lambda item: str(item[0])):
+        path = f"{prefix}.{key}" if prefix else str(key)
+        if isinstance(value, dict):
+            yield from _flatten(value, path)
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            yield path, value
+
+
+def render_stats(lines, name, help_text, stats):
+    """Valores numéricos de {componente: stats()} como gauge; o caminho da chave vai no label `stat`"""
+    lines.append(f"# HELP {name} {help_text}")
+    lines.append(f"# TYPE {name} gauge")
+    for component, values in sorted(stats.items()):
+        for path, value in _flatten(values):
+            lines.append(f"{name}{_labels(('component', 'stat'), (component, path))} {value}")
+
+
+class TimedJSONProvider(DefaultJSONProvider):
+    """Fornecedor JSON do Flask que soma o tempo de serialização ao pedido atual"""
+
+    def dumps(self, obj, **kwargs):
+        if not has_request_context():
+            return super().dumps(obj, **kwargs)
+        started = time.perf_counter()
+        try:
+            return super().dumps(obj, **kwargs)
+        finally:
+            g.metrics_serialization = g.get("metrics_serialization", 0.0) + time.perf_counter() - started
+
+
+class RequestMetrics:
+    """Latência por rota separada em tempo de base de dados, RPC e serialização
+
+    O tempo de base de dados vem dos eventos before/after_cursor_execute, o de
+    RPC de um middleware Web3 e o de serialização do fornecedor JSON do Flask.
+    Pedidos amostrados (profile_rate) correm sob cProfile; os que passam de
+    slow_ms ficam com as funções mais pesadas em `profiles`.
+    """
+
+    def __init__(self, buckets=LATENCY_BUCKETS, slow_ms=1000.0, profile_rate=0.0, keep_profiles=20):
+        self.buckets = tuple(buckets)
+        self.slow_ms = float(slow_ms)
+        self.profile_rate = float(profile_rate)
+        self._lock = threading.Lock()
+        # Histograma só da duração total; as parcelas ficam em soma/contagem por rota
+        self.duration = Histogram(self.buckets)
+        self.db = Summary()
+        self.rpc = Summary()
+        self.serialization = Summary()
+        self.queries = Histogram(QUERY_COUNT_BUCKETS)
+        self.responses = {}
+        self.profiles = deque(maxlen=int(keep_profiles))
+
+    # Ligação à aplicação
+
+    def init_app(self, app, engines):
+        app.json = TimedJSONProvider(app)
+        for engine in engines:
+            event.listen(engine, "before_cursor_execute", self._before_cursor_execute)
+            event.listen(engine, "after_cursor_execute", self._after_cursor_execute)
+        app.before_request(self._start_request)
+        app.after_request(self._finish_request)
+
+    def web3_middleware(self, make_request, w3):
+        """Middleware Web3 (v6): tempo de cada chamada RPC feita durante um pedido"""
+        def middleware(method, params):
+            # Chamadas aninhadas (ex.: eth_chainId pedido pela validação do eth_call) já contam na exterior
+            if not has_request_context() or g.get("metrics_rpc_active"):
+                return make_request(method, params)
+            g.metrics_rpc_active = True
+            started = time.perf_counter()
+            try:
+                return make_request(method, params)
+            finally:
+                g.metrics_rpc_active = False
+                g.metrics_rpc = g.get("metrics_rpc", 0.0) + time.perf_counter() - started
+                g.metrics_rpc_calls = g.get("metrics_rpc_calls", 0) + 1
+        return middleware
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        if has_request_context() and context is not None:
+            context._metrics_started = time.perf_counter()
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        started = getattr(context, "_metrics_started", None)
+        if started is None or not has_request_context():
+            return
+        g.metrics_db = g.get("metrics_db", 0.0) + time.perf_counter() - started
+        g.metrics_queries = g.get("metrics_queries", 0) + 1
+
+    def _start_request(self):
+        g.metrics_started = time.perf_counter()
+        if self.profile_rate > 0 and random.random() < self.profile_rate:
+            profiler = cProfile.Profile()
+            try:
+                profiler.enable()
+            except ValueError:
+                return  # outro profiler ativo nesta thread
+            g.metrics_profiler = profiler
+
+    def _finish_request(self, response):
+        started = g.pop("metrics_started", None)
+        if started is None:
+            return response
+        profiler = g.pop("metrics_profiler", None)
+        if profiler is not None:
+            profiler.disable()
+
+        elapsed = time.perf_counter() - started
+        db_time = g.get("metrics_db", 0.0)
+        rpc_time = g.get("metrics_rpc", 0.0)
+        serialization = g.get("metrics_serialization", 0.0)
+        queries = g.get("metrics_queries", 0)
+        rpc_calls = g.get("metrics_rpc_calls", 0)
+        # Regra da rota e não o caminho: /staking/balance/<wallet_address> é uma só série
+        route = request.url_rule.rule if request.url_rule is not None else "<sem rota>"
+
+        slow = self.observe(request.method, route, response.status_code, elapsed, db_time,
+                            rpc_time, serialization, queries, rpc_calls)
+        if slow and profiler is not None:
+            stream = io.StringIO()
+            pstats.Stats(profiler, stream=stream).sort_stats("cumulative").print_stats(25)
+            with self._lock:
+                self.profiles.append({
+                    "at": datetime.now(timezone.utc).isoformat(),
+                    "method": request.method,
+                    "route": route,
+                    "duration_ms": round(elapsed * 1000, 1),
+                    "db_ms": round(db_time * 1000, 1),
+                    "rpc_ms": round(rpc_time * 1000, 1),
+                    "serialization_ms": round(serialization * 1000, 1),
+                    "queries": queries,
+                    "profile": stream.getvalue()
+                })
+        return response
+
+    def observe(self, method, route, status_code, elapsed, db_time=0.0, rpc_time=0.0,
+                serialization=0.0, queries=0, rpc_calls=0):
+        """Registar um pedido já medido; devolve True (e deixa aviso no log) se passou de slow_ms
+
+        Usado pelo after_request e pelas rotas servidas fora do Flask (src/asgi.py).
+        """
+        labels = (method, route)
+        with self._lock:
+            self.duration.observe(labels, elapsed)
+            self.db.observe(labels, db_time)
+            self.rpc.observe(labels, rpc_time)
+            self.serialization.observe(labels, serialization)
+            self.queries.observe(labels, queries)
+            key = labels + (str(status_code),)
+            self.responses[key] = self.responses.get(key, 0) + 1
+
+        if elapsed * 1000 < self.slow_ms:
+            return False
+        logger.warning(
+            f"{method} {route} lento: {elapsed * 1000:.0f} ms "
+            f"(db {db_time * 1000:.0f} ms em {queries} consultas, rpc {rpc_time * 1000:.0f} ms em {rpc_calls} chamadas, "
+            f"json {serialization * 1000:.0f} ms)"
+        )
+        return True
+
+    # Exportação
+
+    def render(self, lines):
+        with self._lock:
+            series = {
+                name: {labels: dict(entry, buckets=list(entry["buckets"])) for labels, entry in hist.series.items()}
+                for name, hist in (("duration", self.duration), ("queries", self.queries))
+            }
+            series.update({
+                name: {labels: dict(entry) for labels, entry in summary.series.items()}
+                for name, summary in (("db", self.db), ("rpc", self.rpc), ("serialization", self.serialization))
+            })
+            responses = dict(self.responses)
+
+        label_names = ("method", "route")
+        render_histogram(lines, "http_request_duration_seconds", "Duração total do pedido",
+                         label_names, self.buckets, series["duration"])
+        render_summary(lines, "http_request_db_seconds", "Tempo em consultas SQL por pedido",
+                       label_names, series["db"])
+        render_summary(lines, "http_request_rpc_seconds", "Tempo em chamadas RPC por pedido",
+                       label_names, series["rpc"])
+        render_summary(lines, "http_request_serialization_seconds", "Tempo de serialização JSON por pedido",
+                       label_names, series["serialization"])
+        render_histogram(lines, "http_request_db_queries", "Consultas SQL por pedido",
+                         label_names, QUERY_COUNT_BUCKETS, series["queries"])
+
+        lines.append("# HELP http_responses_total Respostas por rota e código HTTP")
+        lines.append("# TYPE http_responses_total counter")
+        for labels, count in sorted(responses.items()):
+            lines.append(f"http_responses_total{_labels(('method', 'route', 'status'), labels)} {count}")
+
+    def recent_profiles(self):
+        with self._lock:
+            return list(self.profiles)
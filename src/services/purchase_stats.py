@@ -0,0 +1,122 @@
+from collections import defaultdict
+
+from sqlalchemy.exc import IntegrityError
+
+from src.models.casinofound import db, PurchaseStats, TokenPurchase
+from src.services.data_versions import bump_version
+
+GLOBAL_PHASE = PurchaseStats.GLOBAL_PHASE
+STATS_VERSION = 'purchase_stats'
+PURCHASE_PHASES = (1, 2)
+REPORTED_PHASES = (GLOBAL_PHASE,) + PURCHASE_PHASES
+
+
+def _aggregate(purchases):
+    """Agrupar (phase, amount_invested, tokens_received) por fase e no total global"""
+    totals = defaultdict(lambda: [0, 0.0, 0.0])
+    for phase, amount_invested, tokens_received in purchases:
+        for key in (GLOBAL_PHASE, phase):
+            totals[key][0] += 1
+            totals[key][1] += amount_invested or 0.0
+            totals[key][2] += tokens_received or 0.0
+    return totals
+
+
+def _increment(phase, count, invested, tokens):
+    return PurchaseStats.query.filter_by(phase=phase).update({
+        PurchaseStats.total_purchases: PurchaseStats.total_purchases + count,
+        PurchaseStats.total_invested: PurchaseStats.total_invested + invested,
+        PurchaseStats.total_tokens_sold: PurchaseStats.total_tokens_sold + tokens
+    }, synchronize_session=False)
+
+
+def record_purchase_stats(purchases):
+    """Somar compras aos totais na transação atual (o commit fica a cargo de quem chama)"""
+    for phase, (count, invested, tokens) in _aggregate(purchases).items():
+        if _increment(phase, count, invested, tokens):
+            continue
+
+        # Primeira compra desta fase: criar a linha (outro worker pode ganhar a corrida)
+        try:
+            with db.session.begin_nested():
+                db.session.add(PurchaseStats(
+                    phase=phase,
+                    total_purchases=count,
+                    total_invested=invested,
+                    total_tokens_sold=tokens
+                ))
+        except IntegrityError:
+            _increment(phase, count, invested, tokens)
+    bump_version(STATS_VERSION)
+
+
+def read_purchase_stats():
+    """Ler os totais pré-calculados numa única consulta por chave primária"""
+    rows = {
+        row.phase: row
+        for row in PurchaseStats.query.filter(PurchaseStats.phase.in_(REPORTED_PHASES))
+    }
+    overall = rows.get(GLOBAL_PHASE)
+    return {
+        'total_purchases': overall.total_purchases if overall else 0,
+        'total_invested': overall.total_invested if overall else 0,
+        'total_tokens_sold': overall.total_tokens_sold if overall else 0,
+        'phase1_sold': rows[1].total_tokens_sold if 1 in rows else 0,
+        'phase2_sold': rows[2].total_tokens_sold if 2 in rows else 0
+    }
+
+
+def compute_purchase_stats():
+    """Recalcular os totais a partir de token_purchase (uma consulta agrupada)"""
+    rows = db.session.query(
+        TokenPurchase.phase,
+        db.func.count(TokenPurchase.id),
+        db.func.coalesce(db.func.sum(TokenPurchase.amount_invested), 0.0),
+        db.func.coalesce(db.func.sum(TokenPurchase.tokens_received), 0.0)
+    ).group_by(TokenPurchase.phase).all()
+
+    overall = [0, 0.0, 0.0]
+    totals = {}
+    for phase, count, invested, tokens in rows:
+        totals[phase] = [count, invested, tokens]
+        overall = [overall[0] + count, overall[1] + invested, overall[2] + tokens]
+    totals[GLOBAL_PHASE] = overall
+    return totals
+
+
+def reconcile_purchase_stats(fix=False, tolerance=1e-6):
+    """Comparar os totais mantidos com um recálculo completo e devolver as diferenças
+
+    Com fix=True as linhas divergentes são substituídas pelos valores recalculados.
+    """
+    expected = compute_purchase_stats()
+    current = {row.phase: row for row in PurchaseStats.query.all()}
+
+    drift = []
+    for phase in sorted(set(expected) | set(current)):
+        count, invested, tokens = expected.get(phase, [0, 0.0, 0.0])
+        row = current.get(phase)
+        actual = (
+            (row.total_purchases, row.total_invested, row.total_tokens_sold)
+            if row else (0, 0.0, 0.0)
+        )
+        if (actual[0] != count
+                or abs(actual[1] - invested) > tolerance * max(1.0, abs(invested))
+                or abs(actual[2] - tokens) > tolerance * max(1.0, abs(tokens))):
+            drift.append({
+                'phase': phase,
+                'expected': {'total_purchases': count, 'total_invested': invested, 'total_tokens_sold': tokens},
+                'actual': {'total_purchases': actual[0], 'total_invested': actual[1], 'total_tokens_sold': actual[2]}
+            })
+            if fix:
+                if row is None:
+                    row = PurchaseStats(phase=phase)
+                    db.session.add(row)
+                row.total_purchases = count
+                row.total_invested = invested
+                row.total_tokens_sold = tokens
+
+    if fix and drift:
+        bump_version(STATS_VERSION)
+        db.session.commit()
+    return drift
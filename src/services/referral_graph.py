@@ -0,0 +1,217 @@
+import heapq
+import threading
+import time
+from collections import defaultdict, deque
+from datetime import timedelta
+
+from src.models.casinofound import db, Newsletter, ReferralEarning, User
+
+SYNC_BATCH_SIZE = 10000
+# Ids reprocessados em cada sincronização: commits fora de ordem no Postgres
+# podem tornar visível um id abaixo da marca já lida
+SYNC_OVERLAP = 1000
+# User.referred_by pode ser definido em linhas antigas: sincronizado por updated_at
+USER_SYNC_OVERLAP = timedelta(seconds=10)
+
+
+class ReferralGraph:
+    """Índice em memória do grafo de referrals de um processo
+
+    Guarda as arestas referrer -> referido (de referral_earning e de
+    user.referred_by) e a comissão acumulada por referrer. É carregado da base de dados no primeiro uso e atualizado de
+    forma incremental pelo id das linhas novas, no máximo a cada
+    `sync_interval` segundos (ou logo após `invalidate`).
+    """
+
+    def __init__(self, sync_interval=2.0, clock=time.monotonic):
+        self.sync_interval = float(sync_interval)
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+        self._children = defaultdict(set)
+        self._parent = {}
+        self._wallet_count = 0  # carteiras em _children ou _parent, sem percorrer os dois em stats()
+        self._invested = defaultdict(float)  # investido por cada referido via referral
+        self._commission = defaultdict(float)
+        self._newsletter_referrals = defaultdict(int)
+        self._heap = []  # (-comissão, carteira); entradas obsoletas são ignoradas
+        self._watermarks = {}
+        self._recent_ids = {}
+        self._users_synced_until = None
+        self._synced_at = None
+
+    # Atualização
+
+    def add_referral(self, referrer, referred):
+        if not referrer or not referred or referrer == referred:
+            return
+        for wallet in (referrer, referred):
+            if wallet not in self._children and wallet not in self._parent:
+                self._wallet_count += 1
+        self._children[referrer].add(referred)
+        self._parent.setdefault(referred, referrer)
+
+    def _apply_earning(self, row):
+        referrer, referred, invested, commission = row[1:]
+        self.add_referral(referrer, referred)
+        self._invested[referred] += invested or 0.0
+        self._commission[referrer] += commission or 0.0
+        heapq.heappush(self._heap, (-self._commission[referrer], referrer))
+
+    def _apply_newsletter(self, row):
+        self._newsletter_referrals[row[1].lower()] += 1
+
+    def _compact_heap(self):
+        """Reconstruir o heap quando as entradas obsoletas dominam"""
+        if len(self._heap) > 2 * len(self._commission) + 1000:
+            self._heap = [(-commission, wallet) for wallet, commission in self._commission.items()]
+            heapq.heapify(self._heap)
+
+    def _sync_source(self, name, columns, id_column, condition, apply):
+        watermark = self._watermarks.get(name, 0)
+        recent = self._recent_ids.setdefault(name, set())
+        low = max(0, watermark - SYNC_OVERLAP)
+        while True:
+            rows = db.session.execute(
+                db.select(*columns).where(id_column > low, condition).order_by(id_column).limit(SYNC_BATCH_SIZE)
+            ).all()
+            if not rows:
+                break
+            with self._lock:
+                for row in rows:
+                    if row[0] in recent:
+                        continue
+                    apply(row)
+                    recent.add(row[0])
+                    watermark = max(watermark, row[0])
+            low = rows[-1][0]
+            if len(rows) < SYNC_BATCH_SIZE:
+                break
+
+        # Só é preciso lembrar os ids dentro da janela de sobreposição
+        floor = watermark - SYNC_OVERLAP
+        self._recent_ids[name] = {row_id for row_id in recent if row_id > floor}
+        self._watermarks[name] = watermark
+
+    def _sync_user_referrals(self):
+        statement = db.select(User.referred_by, User.wallet_address, User.updated_at).where(
+            User.referred_by.isnot(None)
+        )
+        if self._users_synced_until is not None:
+            statement = statement.where(User.updated_at >= self._users_synced_until - USER_SYNC_OVERLAP)
+        watermark = self._users_synced_until
+        for referrer, referred, updated_at in db.session.execute(statement).yield_per(SYNC_BATCH_SIZE):
+            with self._lock:
+                self.add_referral(referrer.lower(), referred.lower())
+            if updated_at is not None and (watermark is None or updated_at > watermark):
+                watermark = updated_at
+        self._users_synced_until = watermark
+
+    def sync(self, force=False):
+        """Ler as linhas novas desde a última sincronização (requer contexto da aplicação)"""
+        if not force and self._synced_at is not None and self._clock() - self._synced_at < self.sync_interval:
+            return
+        with self._sync_lock:
+            if not force and self._synced_at is not None and self._clock() - self._synced_at < self.sync_interval:
+                return
+            self._sync_source(
+                'referral_earning',
+                (ReferralEarning.id, ReferralEarning.referrer_wallet, ReferralEarning.referred_wallet,
+                 ReferralEarning.amount_invested, ReferralEarning.commission_earned),
+                ReferralEarning.id, db.true(), self._apply_earning
+            )
+            self._sync_source(
+                'newsletter',
+                (Newsletter.id, Newsletter.referrer),
+                Newsletter.id, Newsletter.referrer.isnot(None), self._apply_newsletter
+            )
+            self._sync_user_referrals()
+            with self._lock:
+                self._compact_heap()
+            self._synced_at = self._clock()
+
+    def invalidate(self):
+        """Sincronizar no próximo acesso, sem esperar pelo intervalo"""
+        self._synced_at = None
+
+    # Consultas
+
+    def direct_count(self, wallet):
+        self.sync()
+        return len(self._children.get(wallet, ()))
+
+    def summary(self, wallet, depth=1, max_nodes=10000):
+        """Dados da carteira e a rede descendente até `depth` níveis (BFS limitada)"""
+        self.sync()
+        with self._lock:
+            levels = []
+            visited = {wallet}
+            frontier = deque([wallet])
+            truncated = False
+            for level in range(1, depth + 1):
+                next_frontier = deque()
+                for node in frontier:
+                    for child in self._children.get(node, ()):
+                        if child in visited:
+                            continue
+                        if len(visited) > max_nodes:
+                            truncated = True
+                            break
+                        visited.add(child)
+                        next_frontier.append(child)
+                    if truncated:
+                        break
+                if not next_frontier:
+                    break
+                levels.append({
+                    'level': level,
+                    'count': len(next_frontier),
+                    'invested': sum(self._invested.get(child, 0.0) for child in next_frontier),
+                    'wallets': sorted(next_frontier)[:100]
+                })
+                frontier = next_frontier
+                if truncated:
+                    break
+
+            return {
+                'wallet': wallet,
+                'referrer': self._parent.get(wallet),
+                'direct_referrals': len(self._children.get(wallet, ())),
+                'newsletter_referrals': self._newsletter_referrals.get(wallet, 0),
+                'commission_earned': self._commission.get(wallet, 0.0),
+                'downline': levels,
+                'downline_total': sum(level['count'] for level in levels),
+                'truncated': truncated
+            }
+
+    def top(self, k=10):
+        """Top-K referrers por comissão; as entradas válidas retiradas voltam ao heap"""
+        self.sync()
+        with self._lock:
+            result = []
+            seen = set()
+            popped = []
+            while self._heap and len(result) < k:
+                entry = heapq.heappop(self._heap)
+                commission, wallet = -entry[0], entry[1]
+                if wallet in seen or self._commission.get(wallet) != commission:
+                    continue  # entrada obsoleta
+                seen.add(wallet)
+                popped.append(entry)
+                result.append({
+                    'wallet': wallet,
+                    'commission_earned': commission,
+                    'direct_referrals': len(self._children.get(wallet, ()))
+                })
+            for entry in popped:
+                heapq.heappush(self._heap, entry)
+            return result
+
+    def stats(self):
+        # Chamado a cada /metrics: só contadores e len(), sem o lock dos pedidos
+        return {
+            'wallets': self._wallet_count,
+            'referred_wallets': len(self._parent),
+            'heap_size': len(self._heap),
+            'watermarks': dict(self._watermarks)
+        }
@@ -0,0 +1,77 @@
+import hashlib
+import threading
+from collections import defaultdict
+from functools import wraps
+
+from flask import Response, current_app, request
+
+from src.services.cache import TTLCache
+from src.services.data_versions import read_versions
+
+
+class ResponseCache:
+    """Cache de respostas JSON de rotas de leitura, validada por versões de dados
+
+    Cada rota declara os conjuntos de dados de que depende (nomes em
+    data_version). O ETag é derivado da rota, do URL e dessas versões, pelo
+    que um If-None-Match válido dá 304 sem executar a rota; caso contrário o
+    corpo vem de uma LRU de bytes já serializados.
+    """
+
+    def __init__(self, max_size=2000, ttl=300.0):
+        self._entries = TTLCache(ttl=ttl, max_size=max_size)
+        self._lock = threading.Lock()
+        self._routes = defaultdict(lambda: {"hits": 0, "misses": 0, "not_modified": 0, "bypass": 0})
+
+    def _count(self, endpoint, outcome):
+        with self._lock:
+            self._routes[endpoint][outcome] += 1
+
+    def cached(self, scopes, max_age=0):
+        """Decorator; `scopes(**view_args)` devolve os nomes de versão da rota"""
+        def decorator(view):
+            @wraps(view)
+            def wrapper(*args, **kwargs):
+                names = scopes(**kwargs)
+                versions = read_versions(names)
+                stamp = ",".join(f"{name}={versions[name]}" for name in names)
+                key = f"{request.endpoint}|{request.full_path}|{stamp}"
+                etag = hashlib.sha1(key.encode("utf-8")).hexdigest()
+
+                if request.if_none_match.contains(etag):
+                    self._count(request.endpoint, "not_modified")
+                    response = Response(status=304)
+                else:
+                    entry = self._entries.get(key)
+                    if entry is None:
+                        response = current_app.make_response(view(*args, **kwargs))
+                        if response.status_code != 200:
+                            # Erros e 404 não ficam em cache
+                            self._count(request.endpoint, "bypass")
+                            return response
+                        entry = (response.get_data(), response.mimetype)
+                        self._entries.set(key, entry)
+                        self._count(request.endpoint, "misses")
+                    else:
+                        self._count(request.endpoint, "hits")
+                    response = Response(entry[0], mimetype=entry[1])
+
+                response.set_etag(etag)
+                response.headers["Cache-Control"] = (
+                    f"max-age={max_age}, must-revalidate" if max_age else "no-cache"
+                )
+                return response
+            return wrapper
+        return decorator
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            routes = {}
+            for endpoint, counts in self._routes.items():
+                total = sum(counts.values())
+                served = counts["hits"] + counts["not_modified"]
+                routes[endpoint] = dict(counts, hit_ratio=round(served / total, 4) if total else 0.0)
+        return {"entries": self._entries.stats(), "routes": routes}
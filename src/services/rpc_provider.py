@@ -0,0 +1,213 @@
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from web3.providers.base import JSONBaseProvider
+
+logger = logging.getLogger(__name__)
+
+# Limites dos buckets do histograma de latência, em segundos
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class RPCMetrics:
+    """Histogramas de latência e contadores de erro por método RPC e por endpoint"""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._methods = {}
+        self._endpoint_errors = {}
+
+    def observe(self, method, endpoint, seconds, error=False):
+        with self._lock:
+            entry = self._methods.get(method)
+            if entry is None:
+                entry = {"buckets": [0] * (len(self.buckets) + 1), "count": 0, "sum": 0.0, "errors": 0}
+                self._methods[method] = entry
+            index = len(self.buckets)
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    index = i
+                    break
+            entry["buckets"][index] += 1
+            entry["count"] += 1
+            entry["sum"] += seconds
+            if error:
+                entry["errors"] += 1
+                self._endpoint_errors[endpoint] = self._endpoint_errors.get(endpoint, 0) + 1
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "buckets": list(self.buckets),
+                "methods": {
+                    method: {
+                        "buckets": list(entry["buckets"]),
+                        "count": entry["count"],
+                        "sum": entry["sum"],
+                        "errors": entry["errors"]
+                    }
+                    for method, entry in self._methods.items()
+                },
+                "endpoint_errors": dict(self._endpoint_errors)
+            }
+
+
+class _Endpoint:
+    """Estado de saúde de um URL RPC: latência média (EWMA) e falhas seguidas"""
+
+    def __init__(self, url):
+        self.url = url
+        # Sem caminho nem query: os URLs do Infura levam a chave da API
+        self.label = urlparse(url).netloc or url
+        self.latency = 0.1
+        self.failures = 0
+        self.down_until = 0.0
+
+    def record_success(self, seconds):
+        self.latency = 0.8 * self.latency + 0.2 * seconds
+        self.failures = 0
+        self.down_until = 0.0
+
+    def record_failure(self, cooldown):
+        self.failures += 1
+        # Afastar o endpoint durante um período crescente com as falhas seguidas
+        self.down_until = time.monotonic() + cooldown * min(self.failures, 10)
+
+    def score(self):
+        penalty = 1000.0 if self.down_until > time.monotonic() else 0.0
+        return penalty + self.latency * (1 + self.failures)
+
+
+class FailoverHTTPProvider(JSONBaseProvider):
+    """Provider HTTP com sessão keep-alive por processo, failover entre URLs e leituras com hedge
+
+    Os pedidos vão para o endpoint mais saudável; em erro de transporte passam
+    ao seguinte. Métodos em `hedged_methods` (eth_call) disparam um segundo
+    pedido noutro endpoint se o primeiro não responder em `hedge_delay`.
+    """
+
+    def __init__(self, endpoint_uris, timeout=10.0, pool_size=20, retries=2,
+                 hedge_delay=0.25, hedged_methods=("eth_call",), failure_cooldown=5.0, metrics=None):
+        super().__init__()
+        if not endpoint_uris:
+            raise ValueError("É necessário pelo menos um URL RPC")
+        self.endpoints = [_Endpoint(url) for url in endpoint_uris]
+        self.endpoint_uri = endpoint_uris[0]
+        self.timeout = timeout
+        self.pool_size = pool_size
+        self.retries = retries
+        self.hedge_delay = hedge_delay
+        self.hedged_methods = set(hedged_methods)
+        self.failure_cooldown = failure_cooldown
+        self.metrics = metrics or RPCMetrics()
+        self._lock = threading.Lock()
+        self._pid = None
+        self._session = None
+        self._executor = None
+
+    def _resources(self):
+        """Sessão e executor criados por processo (não sobrevivem ao fork do gunicorn)"""
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    session = requests.Session()
+                    retry = Retry(
+                        total=self.retries,
+                        backoff_factor=0.1,
+                        status_forcelist=(429, 502, 503, 504),
+                        allowed_methods=frozenset(["POST"])
+                    )
+                    adapter = HTTPAdapter(
+                        pool_connections=len(self.endpoints),
+                        pool_maxsize=self.pool_size,
+                        max_retries=retry
+                    )
+                    session.mount("http://", adapter)
+                    session.mount("https://", adapter)
+                    session.headers.update({"Content-Type": "application/json"})
+                    self._session = session
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=self.pool_size, thread_name_prefix="rpc-hedge"
+                    )
+                    self._pid = os.getpid()
+        return self._session, self._executor
+
+    def ranked_endpoints(self):
+        return sorted(self.endpoints, key=lambda endpoint: endpoint.score())
+
+    def _post(self, endpoint, method, request_data):
+        session, _ = self._resources()
+        started = time.perf_counter()
+        try:
+            response = session.post(endpoint.url, data=request_data, timeout=self.timeout)
+            response.raise_for_status()
+            decoded = self.decode_rpc_response(response.content)
+        except Exception:
+            elapsed = time.perf_counter() - started
+            endpoint.record_failure(self.failure_cooldown)
+            self.metrics.observe(method, endpoint.label, elapsed, error=True)
+            raise
+        elapsed = time.perf_counter() - started
+        endpoint.record_success(elapsed)
+        # Erros JSON-RPC (ex.: execution reverted) não indicam um endpoint avariado
+        self.metrics.observe(method, endpoint.label, elapsed, error="error" in decoded)
+        return decoded
+
+    def _failover_request(self, method, request_data, endpoints):
+        last_error = None
+        for endpoint in endpoints:
+            try:
+                return self._post(endpoint, method, request_data)
+            except Exception as e:
+                last_error = e
+                logger.warning(f"Falha no RPC {endpoint.label} ({method}): {type(e).__name__}")
+        raise last_error
+
+    def _hedged_request(self, method, request_data, endpoints):
+        _, executor = self._resources()
+        primary, secondary = endpoints[0], endpoints[1]
+        futures = {executor.submit(self._post, primary, method, request_data)}
+        done, _ = wait(futures, timeout=self.hedge_delay)
+        if not done or next(iter(done)).exception() is not None:
+            futures.add(executor.submit(self._post, secondary, method, request_data))
+
+        last_error = None
+        pending = futures
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    return future.result()
+                last_error = future.exception()
+
+        # Ambos falharam: tentar os restantes endpoints em sequência
+        if len(endpoints) > 2:
+            return self._failover_request(method, request_data, endpoints[2:])
+        raise last_error
+
+    def make_request(self, method, params):
+        request_data = self.encode_rpc_request(method, params)
+        endpoints = self.ranked_endpoints()
+        if method in self.hedged_methods and len(endpoints) > 1:
+            return self._hedged_request(method, request_data, endpoints)
+        return self._failover_request(method, request_data, endpoints)
+
+    def endpoint_status(self):
+        now = time.monotonic()
+        return [
+            {
+                "endpoint": endpoint.label,
+                "latency_ewma": round(endpoint.latency, 4),
+                "consecutive_failures": endpoint.failures,
+                "available": endpoint.down_until <= now
+            }
+            for endpoint in self.endpoints
+        ]
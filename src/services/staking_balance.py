@@ -0,0 +1,92 @@
+from collections import defaultdict
+
+from sqlalchemy.exc import IntegrityError
+
+from src.models.casinofound import db, StakingBalance, StakingRecord
+from src.services.data_versions import bump_version
+
+
+def _increment(wallet, amount, count):
+    return StakingBalance.query.filter_by(wallet_address=wallet).update({
+        StakingBalance.total_staked: StakingBalance.total_staked + amount,
+        StakingBalance.active_records: StakingBalance.active_records + count
+    }, synchronize_session=False)
+
+
+def apply_staking_deltas(deltas):
+    """Somar (carteira, montante, registos) aos totais na transação atual
+
+    Montantes e registos negativos correspondem a unstake; o commit fica a
+    cargo de quem chama.
+    """
+    totals = defaultdict(lambda: [0.0, 0])
+    for wallet, amount, count in deltas:
+        totals[wallet][0] += amount or 0.0
+        totals[wallet][1] += count
+
+    # Ordem fixa para que workers concorrentes não bloqueiem entre si
+    for wallet in sorted(totals):
+        amount, count = totals[wallet]
+        if _increment(wallet, amount, count):
+            continue
+
+        # Primeiro staking desta carteira: criar a linha (outro worker pode ganhar a corrida)
+        try:
+            with db.session.begin_nested():
+                db.session.add(StakingBalance(
+                    wallet_address=wallet,
+                    total_staked=amount,
+                    active_records=count
+                ))
+        except IntegrityError:
+            _increment(wallet, amount, count)
+
+
+def read_staking_balance(wallet):
+    """Total em staking da carteira por chave primária"""
+    balance = db.session.get(StakingBalance, wallet)
+    if balance is None:
+        return {'wallet_address': wallet, 'total_staked': 0, 'active_records': 0}
+    return balance.to_dict()
+
+
+def compute_staking_balances():
+    """Recalcular os totais a partir dos registos ativos (uma consulta agrupada)"""
+    rows = db.session.query(
+        StakingRecord.wallet_address,
+        db.func.coalesce(db.func.sum(StakingRecord.amount_staked), 0.0),
+        db.func.count(StakingRecord.id)
+    ).filter(StakingRecord.is_active == True).group_by(StakingRecord.wallet_address).all()
+    return {wallet: (total, count) for wallet, total, count in rows}
+
+
+def reconcile_staking_balances(fix=False, tolerance=1e-6):
+    """Comparar staking_balance com os registos e devolver as carteiras divergentes
+
+    Com fix=True as linhas divergentes são substituídas pelos valores recalculados.
+    """
+    expected = compute_staking_balances()
+    current = {row.wallet_address: row for row in StakingBalance.query.all()}
+
+    drift = []
+    for wallet in sorted(set(expected) | set(current)):
+        total, count = expected.get(wallet, (0.0, 0))
+        row = current.get(wallet)
+        actual = (row.total_staked, row.active_records) if row else (0.0, 0)
+        if actual[1] != count or abs(actual[0] - total) > tolerance * max(1.0, abs(total)):
+            drift.append({
+                'wallet_address': wallet,
+                'expected': {'total_staked': total, 'active_records': count},
+                'actual': {'total_staked': actual[0], 'active_records': actual[1]}
+            })
+            if fix:
+                if row is None:
+                    row = StakingBalance(wallet_address=wallet)
+                    db.session.add(row)
+                row.total_staked = total
+                row.active_records = count
+                bump_version(f'staking:{wallet}')
+
+    if fix and drift:
+        db.session.commit()
+    return drift
@@ -0,0 +1,318 @@
+import json
+import logging
+import time
+from datetime import datetime, timedelta
+
+from eth_account import Account
+from web3 import Web3
+from web3.exceptions import TransactionNotFound
+
+logger = logging.getLogger(__name__)
+
+
+# Erros de difusão que indicam que o nó já tem (ou já minerou) a transação
+ALREADY_KNOWN_ERRORS = ("already known", "known transaction", "already imported", "replacement transaction underpriced")
+NONCE_TOO_LOW_ERRORS = ("nonce too low", "nonce has already been used")
+
+
+def rpc_error_message(error):
+    """Mensagem de um erro JSON-RPC devolvido pelo nó, ou None se a falha foi de transporte
+
+    Só um erro JSON-RPC prova que o nó recusou (ou já conhecia) a transação;
+    num timeout ou ligação perdida o nó pode tê-la aceitado.
+    """
+    if isinstance(error, ValueError) and error.args and isinstance(error.args[0], dict):
+        return str(error.args[0].get("message", "")).lower()
+    return None
+
+
+class NonceAllocator:
+    """Atribui nonces localmente a partir de uma linha persistida por endereço
+
+    Só o processo submissor (um único escritor) deve usar esta classe; a rede
+    é consultada apenas para inicializar ou para `sync` quando outra transação
+    consumiu um nonce.
+    """
+
+    def __init__(self, w3, address, db, nonce_model):
+        self.w3 = w3
+        self.address = address
+        self.db = db
+        self.NonceState = nonce_model
+
+    def _state(self):
+        state = self.db.session.get(self.NonceState, self.address)
+        if state is None:
+            state = self.NonceState(
+                address=self.address,
+                next_nonce=self.w3.eth.get_transaction_count(self.address, "pending")
+            )
+            self.db.session.add(state)
+        return state
+
+    def reserve(self, count):
+        state = self._state()
+        first = state.next_nonce
+        state.next_nonce = first + count
+        return list(range(first, first + count))
+
+    def sync(self, chain_nonce=None):
+        """Avançar até ao nonce da rede (transações enviadas fora desta fila)"""
+        if chain_nonce is None:
+            chain_nonce = self.w3.eth.get_transaction_count(self.address, "pending")
+        state = self._state()
+        if chain_nonce > state.next_nonce:
+            state.next_nonce = chain_nonce
+
+    def release(self, nonce):
+        """Devolver `nonce` e os seguintes; só para nonces sem transação difundida"""
+        state = self.db.session.get(self.NonceState, self.address)
+        if state is not None and nonce < state.next_nonce:
+            state.next_nonce = nonce
+
+    def is_last(self, nonce):
+        state = self.db.session.get(self.NonceState, self.address)
+        return state is not None and state.next_nonce == nonce + 1
+
+
+class TxSubmitter:
+    """Assina e difunde em lote as transações administrativas pendentes no outbox
+
+    Cada job passa por queued -> signed -> submitted. O nonce, a transação
+    assinada e o hash ficam gravados (status "signed") antes da difusão; um job
+    "signed" é sempre reenviado com os mesmos bytes, nunca reassinado com outro
+    nonce, para que uma falha a meio (ou um timeout em que o nó aceitou a
+    transação) não execute a mesma transferência duas vezes.
+    """
+
+    def __init__(self, w3, contracts, db, outbox_model, nonce_model, private_key, chain_metadata,
+                 gas_limit=2000000, batch_size=20, max_attempts=5, stuck_after=600):
+        self.w3 = w3
+        self.contracts = contracts
+        self.db = db
+        self.OutboxTransaction = outbox_model
+        self.account = Account.from_key(private_key)
+        self.nonces = NonceAllocator(w3, self.account.address, db, nonce_model)
+        self.gas_limit = gas_limit
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.stuck_after = stuck_after
+        self.chain_metadata = chain_metadata
+
+    def enqueue(self, transaction, contract_name, function_name, args):
+        """Criar o job no outbox (o commit fica a cargo de quem chama)"""
+        job = self.OutboxTransaction(
+            transaction=transaction,
+            contract_name=contract_name,
+            function_name=function_name,
+            args=json.dumps(args),
+            status="queued"
+        )
+        self.db.session.add(job)
+        return job
+
+    def _build_and_sign(self, job, nonce, gas_price, chain_id):
+        contract = self.contracts[job.contract_name]
+        function = getattr(contract.functions, job.function_name)(*json.loads(job.args))
+        tx = function.build_transaction({
+            "from": self.account.address,
+            "chainId": chain_id,
+            "gas": self.gas_limit,
+            "gasPrice": gas_price,
+            "nonce": nonce,
+        })
+        return self.account.sign_transaction(tx)
+
+    @staticmethod
+    def _fail(job, error):
+        job.status = "failed"
+        job.error = str(error)[:500]
+        if job.transaction is not None:
+            job.transaction.status = "failed"
+
+    @staticmethod
+    def _requeue(job, error, keep_nonce):
+        """Voltar a queued sem a transação assinada (o nó não a tem)"""
+        job.status = "queued"
+        job.raw_tx = None
+        job.tx_hash = None
+        job.error = str(error)[:500]
+        if not keep_nonce:
+            job.nonce = None
+
+    def _sign_queued(self):
+        """Assinar os jobs queued e gravá-los como signed antes de qualquer difusão"""
+        jobs = self.OutboxTransaction.query.filter_by(status="queued").order_by(
+            self.OutboxTransaction.id
+        ).limit(self.batch_size).all()
+        if not jobs:
+            return set()
+
+        gas_price = self.chain_metadata.gas_price
+        chain_id = self.chain_metadata.chain_id
+        # Jobs recusados pelo nó mantêm o nonce e são reassinados com o mesmo
+        nonces = self.nonces.reserve(sum(1 for job in jobs if job.nonce is None))
+
+        signed = set()
+        used = 0
+        for job in jobs:
+            nonce = job.nonce if job.nonce is not None else nonces[used]
+            try:
+                signed_tx = self._build_and_sign(job, nonce, gas_price, chain_id)
+            except Exception as e:
+                if job.nonce is None:
+                    # Um job inválido não consome nonce
+                    self._fail(job, e)
+                else:
+                    job.error = str(e)[:500]
+                logger.error(f"Erro ao assinar job {job.id}: {e}")
+                continue
+            if job.nonce is None:
+                used += 1
+            job.nonce = nonce
+            job.raw_tx = Web3.to_hex(signed_tx.rawTransaction)
+            job.tx_hash = Web3.to_hex(signed_tx.hash)
+            job.status = "signed"
+            if job.transaction is not None:
+                job.transaction.tx_hash = job.tx_hash
+            signed.add(job.id)
+        if used < len(nonces):
+            self.nonces.release(nonces[used])
+
+        self.db.session.commit()
+        return signed
+
+    def _broadcast(self, job, fresh):
+        """Enviar a transação gravada; devolve False se os jobs seguintes devem esperar"""
+        job.attempts = (job.attempts or 0) + 1
+        try:
+            self.w3.eth.send_raw_transaction(job.raw_tx)
+        except Exception as e:
+            message = rpc_error_message(e)
+            if message is None:
+                # Timeout/ligação: o nó pode ter aceitado; reenviar os mesmos bytes depois
+                job.error = str(e)[:500]
+                logger.error(f"Erro ao difundir job {job.id} (nonce {job.nonce}): {e}")
+                return False
+            if any(known in message for known in ALREADY_KNOWN_ERRORS) or (
+                    not fresh and any(low in message for low in NONCE_TOO_LOW_ERRORS)):
+                # Já no mempool, ou já minerada numa difusão anterior: o recibo decide
+                pass
+            elif any(low in message for low in NONCE_TOO_LOW_ERRORS):
+                # Assinada agora e nunca enviada: o nonce foi usado fora da fila
+                self._requeue(job, e, keep_nonce=False)
+                self.nonces.sync()
+                logger.warning(f"Nonce {job.nonce} do job {job.id} já usado fora da fila")
+                return True
+            else:
+                # Recusa do nó: reassinar com o mesmo nonce (novo gas price) no próximo lote
+                logger.error(f"Job {job.id} recusado pelo nó (nonce {job.nonce}): {e}")
+                if job.attempts >= self.max_attempts and self.nonces.is_last(job.nonce):
+                    self.nonces.release(job.nonce)
+                    job.nonce = None
+                    self._fail(job, e)
+                else:
+                    self._requeue(job, e, keep_nonce=True)
+                return False
+
+        job.status = "submitted"
+        job.error = None
+        return True
+
+    def _recover_stuck(self):
+        """Jobs submitted sem recibo há mais de stuck_after segundos
+
+        Com o nonce ainda livre a transação saiu do mempool e volta a signed
+        (reenvio dos mesmos bytes). Com o nonce já usado por outra transação o
+        job falha para verificação manual, sem nova assinatura.
+        """
+        cutoff = datetime.utcnow() - timedelta(seconds=self.stuck_after)
+        jobs = self.OutboxTransaction.query.filter(
+            self.OutboxTransaction.status == "submitted",
+            self.OutboxTransaction.updated_at < cutoff
+        ).order_by(self.OutboxTransaction.nonce).limit(self.batch_size).all()
+        if not jobs:
+            return
+
+        mined_nonce = self.w3.eth.get_transaction_count(self.account.address, "latest")
+        for job in jobs:
+            try:
+                self.w3.eth.get_transaction_receipt(job.tx_hash)
+                continue  # minerada; o ReceiptPoller trata dela
+            except TransactionNotFound:
+                pass
+            if job.nonce >= mined_nonce:
+                job.status = "signed"
+                logger.warning(f"Job {job.id} sem recibo; a reenviar a transação (nonce {job.nonce})")
+            else:
+                self._fail(job, f"Nonce {job.nonce} usado por outra transação; verificar {job.tx_hash}")
+                logger.error(f"Job {job.id}: nonce {job.nonce} consumido sem recibo de {job.tx_hash}")
+        self.nonces.sync(mined_nonce)
+        self.db.session.commit()
+
+    def submit_batch(self):
+        """Assinar e enviar até batch_size jobs; devolve o número de jobs submetidos"""
+        self._recover_stuck()
+        fresh = self._sign_queued()
+
+        # Por ordem de nonce, incluindo os signed de lotes anteriores (falha a meio, timeout)
+        jobs = self.OutboxTransaction.query.filter_by(status="signed").order_by(
+            self.OutboxTransaction.nonce
+        ).all()
+        submitted = 0
+        for job in jobs:
+            if not self._broadcast(job, fresh=job.id in fresh):
+                break
+            if job.status == "submitted":
+                submitted += 1
+
+        self.db.session.commit()
+        return submitted
+
+
+class ReceiptPoller:
+    """Atualiza jobs submetidos (e a Transaction associada) para confirmed ou failed"""
+
+    def __init__(self, w3, db, outbox_model, batch_size=100, on_confirmed=None):
+        self.w3 = w3
+        self.db = db
+        self.OutboxTransaction = outbox_model
+        self.batch_size = batch_size
+        self.on_confirmed = on_confirmed
+
+    def poll(self):
+        jobs = self.OutboxTransaction.query.filter_by(status="submitted").order_by(
+            self.OutboxTransaction.id
+        ).limit(self.batch_size).all()
+
+        finished = 0
+        for job in jobs:
+            try:
+                receipt = self.w3.eth.get_transaction_receipt(job.tx_hash)
+            except TransactionNotFound:
+                continue
+
+            job.status = "confirmed" if receipt["status"] == 1 else "failed"
+            job.block_number = receipt["blockNumber"]
+            if job.transaction is not None:
+                job.transaction.status = job.status
+            if job.status == "confirmed" and self.on_confirmed:
+                self.on_confirmed(job)
+            finished += 1
+
+        if finished:
+            self.db.session.commit()
+        return finished
+
+
+def run_loop(db, step, interval, name):
+    """Executar `step` periodicamente, sem deixar um erro parar o worker"""
+    while True:
+        try:
+            done = step()
+        except Exception as e:
+            db.session.rollback()
+            done = 0
+            logger.error(f"Erro em {name}: {e}")
+        if not done:
+            time.sleep(interval)
@@ -0,0 +1,216 @@
+import atexit
+import logging
+import queue
+import threading
+import time
+from collections import defaultdict
+
+logger = logging.getLogger(__name__)
+
+
+class QueueFullError(Exception):
+    pass
+
+
+class FlushTimeoutError(QueueFullError):
+    """O lote do pedido não começou a ser escrito a tempo; os registos não foram gravados"""
+
+
+class _Ticket:
+    """Registos de um pedido; são escritos juntos, na mesma transação"""
+
+    def __init__(self, records):
+        self.records = records
+        self.event = threading.Event()
+        self.error = None
+        self._lock = threading.Lock()
+        self._state = "queued"  # queued, writing, cancelled
+
+    def claim(self):
+        """Thread de escrita: passar a 'writing'; False se o pedido já desistiu"""
+        with self._lock:
+            if self._state != "queued":
+                return False
+            self._state = "writing"
+            return True
+
+    def cancel(self):
+        """Pedido: desistir enquanto ainda está em fila; False se a escrita já começou"""
+        with self._lock:
+            if self._state != "queued":
+                return False
+            self._state = "cancelled"
+            return True
+
+    def done(self, error=None):
+        self.error = error
+        self.event.set()
+
+    def wait(self, timeout=None):
+        if not self.event.wait(timeout):
+            if self.cancel():
+                raise FlushTimeoutError("Tempo esgotado à espera da escrita em lote")
+            # Já em escrita: o resultado chega sempre, _run sinaliza todos os pedidos do lote
+            self.event.wait()
+        if self.error is not None:
+            raise self.error
+
+
+def insert_records(db, records, hooks=None):
+    """Inserir (Model, valores) com um INSERT multi-linha por modelo e correr os hooks
+
+    Os hooks ({Model: fn(linhas)}) correm na mesma transação; o commit fica a
+    cargo de quem chama.
+    """
+    rows_by_model = defaultdict(list)
+    for model, values in records:
+        rows_by_model[model].append(values)
+    for model, rows in rows_by_model.items():
+        db.session.execute(db.insert(model), rows)
+        hook = (hooks or {}).get(model)
+        if hook:
+            hook(rows)
+
+
+class WriteBehindQueue:
+    """Agrupa inserções de vários pedidos num único commit (group commit)
+
+    Os pedidos entram numa fila limitada e uma thread escreve-os a cada
+    `max_rows` registos ou `max_delay_ms` milissegundos, o que ocorrer
+    primeiro. Com ack='flush' o pedido espera pelo commit do seu lote, no
+    máximo `flush_timeout` segundos até a escrita começar (depois desiste com
+    FlushTimeoutError, sem nada gravado); com ack='enqueue' responde logo
+    (registos em fila perdem-se se o processo cair).
+    """
+
+    def __init__(self, app, db, hooks=None, max_rows=500, max_delay_ms=20,
+                 max_queue=10000, ack="flush", enqueue_timeout=1.0, flush_timeout=5.0):
+        if ack not in ("flush", "enqueue"):
+            raise ValueError(f"ack inválido: {ack} (opções: flush, enqueue)")
+        self.app = app
+        self.db = db
+        self.hooks = hooks or {}
+        self.max_rows = max_rows
+        self.max_delay = max_delay_ms / 1000.0
+        self.ack = ack
+        self.enqueue_timeout = enqueue_timeout
+        self.flush_timeout = flush_timeout
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._stats_lock = threading.Lock()
+        self.enqueued = 0
+        self.flushed_rows = 0
+        self.batches = 0
+        self.errors = 0
+        self.timeouts = 0
+        self._thread = threading.Thread(target=self._run, name="write-behind", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def submit(self, records):
+        """Colocar registos em fila; com ack='flush' espera pelo commit"""
+        ticket = _Ticket(records)
+        try:
+            self._queue.put(ticket, timeout=self.enqueue_timeout)
+        except queue.Full:
+            raise QueueFullError("Fila de escrita cheia")
+        with self._stats_lock:
+            self.enqueued += len(records)
+        if self.ack == "flush":
+            try:
+                ticket.wait(self.flush_timeout)
+            except FlushTimeoutError:
+                with self._stats_lock:
+                    self.timeouts += 1
+                raise
+        return ticket
+
+    def _collect(self):
+        """Juntar pedidos até max_rows registos ou max_delay; None na fila pede paragem"""
+        first = self._queue.get()
+        if first is None:
+            return [], True
+        tickets = [first]
+        rows = len(first.records)
+        deadline = time.monotonic() + self.max_delay
+        while rows < self.max_rows:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                ticket = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if ticket is None:
+                return tickets, True
+            tickets.append(ticket)
+            rows += len(ticket.records)
+        return tickets, False
+
+    def _write(self, tickets):
+        records = [record for ticket in tickets for record in ticket.records]
+        insert_records(self.db, records, self.hooks)
+        self.db.session.commit()
+        return len(records)
+
+    def _flush(self, tickets):
+        with self.app.app_context():
+            try:
+                written = self._write(tickets)
+            except Exception as e:
+                self.db.session.rollback()
+                if len(tickets) == 1:
+                    tickets[0].done(e)
+                    written = 0
+                    with self._stats_lock:
+                        self.errors += 1
+                    logger.error(f"Erro na escrita em lote: {e}")
+                else:
+                    # Isolar o pedido inválido sem falhar o resto do lote
+                    for ticket in tickets:
+                        self._flush([ticket])
+                    return
+            finally:
+                self.db.session.remove()
+
+        with self._stats_lock:
+            self.flushed_rows += written
+            self.batches += 1 if written else 0
+        for ticket in tickets:
+            ticket.event.set()
+
+    def _run(self):
+        while True:
+            tickets, stop = [], False
+            # Nenhum erro pode parar a thread: os pedidos seguintes ficariam à espera para sempre
+            try:
+                tickets, stop = self._collect()
+                tickets = [ticket for ticket in tickets if ticket.claim()]
+                if tickets:
+                    self._flush(tickets)
+            except Exception as e:
+                logger.error(f"Erro na thread de escrita em lote: {e}")
+                with self._stats_lock:
+                    self.errors += 1
+                for ticket in tickets:
+                    if not ticket.event.is_set():
+                        ticket.done(e)
+            if stop:
+                return
+
+    def close(self):
+        """Escrever o que está em fila e parar a thread (chamado à saída do processo)"""
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join(timeout=10)
+
+    def stats(self):
+        with self._stats_lock:
+            return {
+                "ack": self.ack,
+                "queue_depth": self._queue.qsize(),
+                "enqueued": self.enqueued,
+                "flushed_rows": self.flushed_rows,
+                "batches": self.batches,
+                "errors": self.errors,
+                "timeouts": self.timeouts
+            }
@@ -0,0 +1,54 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Antes de importar a app: sem caches aquecidas no arranque e sem tocar na base de dados local
+os.environ.setdefault("WARM_CACHES", "0")
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+import pytest
+import sqlalchemy as sa
+
+from src.models import casinofound, chain, user  # noqa: F401 (registar os modelos no metadata)
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = sa.create_engine(f"sqlite:///{tmp_path / 'casinofound.db'}")
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def app(tmp_path):
+    from src.main import create_app
+    from src.models.db import db
+    from src.models.migrations import upgrade
+
+    app = create_app({"SQLALCHEMY_DATABASE_URI": f"sqlite:///{tmp_path / 'app.db'}"})
+    with app.app_context():
+        upgrade(db)
+        yield app
+        db.session.remove()
+
+
+@pytest.fixture
+def replicated_app(tmp_path):
+    """Primário e réplica em ficheiros SQLite distintos: a "réplica" nunca recebe as escritas"""
+    from src.main import create_app
+    from src.models.db import db, REPLICA_BIND
+    from src.models.migrations import upgrade
+    from src.services.db_routing import recent_writers
+
+    app = create_app({
+        "SQLALCHEMY_DATABASE_URI": f"sqlite:///{tmp_path / 'primary.db'}",
+        "DATABASE_REPLICA_URL": f"sqlite:///{tmp_path / 'replica.db'}"
+    })
+    with app.app_context():
+        upgrade(db)
+        upgrade(db, engine=db.engines[REPLICA_BIND])
+    # Sem contexto aberto: cada pedido tem o seu `g`, como em produção
+    recent_writers.clear()
+    yield app
+    recent_writers.clear()
@@ -0,0 +1,124 @@
+from eth_abi import decode, encode
+from web3.providers.base import JSONBaseProvider
+
+from src.services.balance_reader import MULTICALL3_ADDRESS
+from src.services.chain_indexer import TRANSFER_TOPIC
+
+AGGREGATE3_SELECTOR = "0x82ad56cb"
+BALANCE_OF_SELECTOR = "0x70a08231"
+
+
+def balance_for(wallet):
+    """Saldo determinístico por carteira (0x...ff devolve uma chamada falhada)"""
+    value = int(wallet[-4:], 16)
+    return None if value == 0xffff else value
+
+
+def _balance_of(call_data):
+    wallet = "0x" + call_data[-40:]
+    return balance_for(wallet)
+
+
+def eth_call_result(params):
+    """Resposta a eth_call de balanceOf ou de Multicall3.aggregate3"""
+    call = params[0]
+    data = call["data"] if "data" in call else call["input"]
+    if call["to"].lower() == MULTICALL3_ADDRESS.lower() and data.startswith(AGGREGATE3_SELECTOR):
+        (calls,) = decode(["(address,bool,bytes)[]"], bytes.fromhex(data[10:]))
+        results = []
+        for _, _, call_data in calls:
+            balance = _balance_of(call_data.hex())
+            results.append((balance is not None, b"" if balance is None else balance.to_bytes(32, "big")))
+        return "0x" + encode(["(bool,bytes)[]"], [results]).hex()
+    if data.startswith(BALANCE_OF_SELECTOR):
+        return "0x" + (_balance_of(data) or 0).to_bytes(32, "big").hex()
+    raise ValueError(f"eth_call inesperado: {data[:10]}")
+
+
+class StubProvider(JSONBaseProvider):
+    """Nó JSON-RPC em memória que conta os pedidos por método"""
+
+    def __init__(self):
+        super().__init__()
+        self.methods = []
+
+    def make_request(self, method, params):
+        self.methods.append(method)
+        if method == "eth_chainId":
+            return {"jsonrpc": "2.0", "id": 1, "result": "0x89"}
+        if method == "eth_call":
+            return {"jsonrpc": "2.0", "id": 1, "result": eth_call_result(params)}
+        raise ValueError(f"Método inesperado: {method}")
+
+
+def _word(value):
+    return "0x" + value.to_bytes(32, "big").hex()
+
+
+def _address_topic(address):
+    return "0x" + address[2:].lower().rjust(64, "0")
+
+
+class ChainStub(JSONBaseProvider):
+    """Cadeia em memória para o indexador: blocos, logs Transfer e reorgs
+
+    `transfers[bloco]` é uma lista de (de, para, valor); `max_range` limita os
+    blocos por eth_getLogs como fazem os providers públicos.
+    """
+
+    def __init__(self, token, head, transfers=None, max_range=None):
+        super().__init__()
+        self.token = token.lower()
+        self.head = head
+        self.transfers = dict(transfers or {})
+        self.max_range = max_range
+        self.forks = {}  # bloco -> geração (muda o hash)
+        self.requests = []
+
+    def block_hash(self, number):
+        return "0x" + f"{number:016x}{self.forks.get(number, 0):016x}".rjust(64, "0")
+
+    def reorg(self, from_block, transfers):
+        """Substituir os blocos a partir de from_block (novos hashes e novos logs)"""
+        for number in range(from_block, self.head + 1):
+            self.forks[number] = self.forks.get(number, 0) + 1
+            self.transfers.pop(number, None)
+        self.transfers.update(transfers)
+
+    def _logs(self, from_block, to_block):
+        logs = []
+        for number in range(from_block, to_block + 1):
+            for index, (sender, recipient, value) in enumerate(self.transfers.get(number, ())):
+                logs.append({
+                    "address": self.token,
+                    "topics": [TRANSFER_TOPIC, _address_topic(sender), _address_topic(recipient)],
+                    "data": _word(value),
+                    "blockNumber": hex(number),
+                    "blockHash": self.block_hash(number),
+                    "logIndex": hex(index),
+                    "transactionIndex": hex(index),
+                    "transactionHash": _word(number * 1000 + index),
+                    "removed": False
+                })
+        return logs
+
+    def make_request(self, method, params):
+        self.requests.append((method, params))
+        if method == "eth_chainId":
+            return {"jsonrpc": "2.0", "id": 1, "result": "0x89"}
+        if method == "eth_blockNumber":
+            return {"jsonrpc": "2.0", "id": 1, "result": hex(self.head)}
+        if method == "eth_getBlockByNumber":
+            number = int(params[0], 16)
+            block = {"number": hex(number), "hash": self.block_hash(number),
+                     "parentHash": self.block_hash(number - 1) if number else "0x" + "0" * 64}
+            return {"jsonrpc": "2.0", "id": 1, "result": block}
+        if method == "eth_getLogs":
+            from_block, to_block = int(params[0]["fromBlock"], 16), int(params[0]["toBlock"], 16)
+            if self.max_range and to_block - from_block + 1 > self.max_range:
+                return {"jsonrpc": "2.0", "id": 1, "error": {"code": -32005, "message": "block range too large"}}
+            return {"jsonrpc": "2.0", "id": 1, "result": self._logs(from_block, to_block)}
+        raise ValueError(f"Método inesperado: {method}")
+
+    def calls(self, method):
+        return [params for name, params in self.requests if name == method]
@@ -0,0 +1,142 @@
+import asyncio
+import json
+
+import pytest
+import sqlalchemy as sa
+
+from src.models.casinofound import User
+from src.models.db import db, REPLICA_BIND
+from src.routes.api import balance_cache, new_user_values, request_metrics
+from src.services.amounts import to_units
+from src.services.db_routing import recent_writers, STICKY_HEADER
+
+WALLET = "0x" + "c" * 40
+SERIES = ("GET", "/api/user_data")
+
+
+@pytest.fixture
+def async_app(replicated_app):
+    """AsyncApp sobre a app com réplica; o utilizador difere entre primário e réplica"""
+    from src.asgi import AsyncApp
+
+    with replicated_app.app_context():
+        for bind, staked in ((None, "7"), (REPLICA_BIND, "3")):
+            with db.engines[bind].begin() as conn:
+                conn.execute(sa.insert(User).values(**dict(new_user_values(WALLET), staked_tokens=to_units(staked))))
+    # Saldo já em cache: nenhuma das versões chama o RPC
+    balance_cache.set(WALLET, 5 * 10 ** 18)
+    yield AsyncApp(replicated_app)
+    balance_cache.invalidate(WALLET)
+
+
+async def call(asgi_app, headers=(), method="GET"):
+    """(status, cabeçalhos, corpo) de um pedido a /api/user_data"""
+    scope = {
+        "type": "http",
+        "method": method,
+        "path": "/api/user_data",
+        "query_string": f"wallet_address={WALLET}".encode(),
+        "headers": [(name.lower().encode(), value.encode()) for name, value in headers],
+        "http_version": "1.1",
+        "scheme": "http",
+        "server": ("testserver", 80)
+    }
+    messages = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        messages.append(message)
+
+    await asgi_app(scope, receive, send)
+    start = messages[0]
+    headers = {name.decode().lower(): value.decode() for name, value in start["headers"]}
+    return start["status"], headers, b"".join(m.get("body", b"") for m in messages[1:])
+
+
+async def get_user_data(asgi_app, headers=()):
+    status, _, body = await call(asgi_app, headers)
+    return status, json.loads(body)
+
+
+def run(asgi_app, *requests, request=get_user_data):
+    """Pedidos no mesmo event loop (o pool do aiosqlite fica preso ao loop)"""
+    async def scenario():
+        try:
+            return [await request(asgi_app, headers) for headers in requests]
+        finally:
+            for engine in (asgi_app._engine, asgi_app._replica_engine):
+                if engine is not None:
+                    await engine.dispose()
+    return asyncio.run(scenario())
+
+
+def series_count(metrics):
+    entry = metrics.duration.series.get(SERIES)
+    return entry["count"] if entry else 0
+
+
+def test_async_user_data_matches_flask_route(async_app, replicated_app):
+    flask_response = replicated_app.test_client().get(f"/api/user_data?wallet_address={WALLET}")
+    before = series_count(request_metrics)
+    [(status, payload)] = run(async_app, ())
+
+    assert status == 200
+    assert payload == flask_response.get_json()
+    # Mesma série nas métricas; nenhuma das versões usa ETag
+    assert series_count(request_metrics) == before + 1
+    assert "ETag" not in flask_response.headers
+
+
+def test_async_user_data_follows_replica_routing(async_app, replicated_app):
+    client = replicated_app.test_client()
+    url = f"/api/user_data?wallet_address={WALLET}"
+    until = "9999999999"
+
+    replica, echoed = run(async_app, (), ((STICKY_HEADER, until),))
+    assert replica[1]["staked_tokens"] == "3.00" == client.get(url).get_json()["staked_tokens"]
+    assert echoed[1]["staked_tokens"] == "7.00" == client.get(url, headers={STICKY_HEADER: until}).get_json()["staked_tokens"]
+
+    recent_writers.set(WALLET, True)
+    [written] = run(async_app, ())
+    assert written[1]["staked_tokens"] == "7.00" == client.get(url).get_json()["staked_tokens"]
+
+
+def cors(headers):
+    return {name: value for name, value in headers.items() if name.startswith("access-control-") or name == "vary"}
+
+
+def test_async_user_data_sends_the_flask_cors_headers(async_app, replicated_app):
+    client = replicated_app.test_client()
+    url = f"/api/user_data?wallet_address={WALLET}"
+    origin = (("Origin", "https://casinofound.com"),)
+
+    responses = run(async_app, (), origin, request=call)
+
+    for (status, headers, _), request_headers in zip(responses, ((), origin)):
+        flask_headers = {name.lower(): value for name, value in client.get(url, headers=dict(request_headers)).headers}
+        assert status == 200
+        assert cors(headers) == cors(flask_headers)
+    assert cors(responses[0][1]) == {
+        "access-control-allow-origin": "*", "access-control-expose-headers": STICKY_HEADER
+    }
+    assert responses[1][1]["access-control-allow-origin"] == "https://casinofound.com"
+
+
+def test_preflight_is_answered_by_flask(async_app):
+    preflight = (
+        ("Origin", "https://casinofound.com"),
+        ("Access-Control-Request-Method", "GET"),
+        ("Access-Control-Request-Headers", STICKY_HEADER),
+    )
+
+    async def options(asgi_app, headers):
+        return await call(asgi_app, headers, method="OPTIONS")
+
+    [(status, headers, _)] = run(async_app, preflight, request=options)
+
+    assert status == 200
+    assert headers["access-control-allow-origin"] == "https://casinofound.com"
+    assert STICKY_HEADER.lower() in headers["access-control-allow-headers"].lower()
+    assert "GET" in headers["access-control-allow-methods"]
@@ -0,0 +1,37 @@
+from web3 import Web3
+
+from src.services.balance_reader import BatchBalanceReader
+from src.services.chain_metadata import ChainMetadata
+from tests.rpc_stub import StubProvider, balance_for
+
+TOKEN = "0x" + "33" * 20
+BALANCE_OF_ABI = [{
+    "name": "balanceOf", "type": "function", "stateMutability": "view",
+    "inputs": [{"name": "account", "type": "address"}],
+    "outputs": [{"name": "", "type": "uint256"}],
+}]
+
+
+def reader(chunk_size):
+    provider = StubProvider()
+    w3 = Web3(provider)
+    w3.middleware_onion.add(ChainMetadata(w3).web3_middleware, "chain_id_cache")
+    token = w3.eth.contract(address=TOKEN, abi=BALANCE_OF_ABI)
+    return BatchBalanceReader(w3, token, chunk_size=chunk_size), provider
+
+
+def test_fetch_packs_chunk_size_wallets_per_eth_call():
+    batch_reader, provider = reader(chunk_size=100)
+    wallets = ["0x" + f"{i:040x}" for i in range(1, 251)]
+
+    balances = batch_reader.fetch(wallets + wallets[:10])
+
+    assert balances == {wallet: balance_for(wallet) for wallet in wallets}
+    assert provider.methods.count("eth_call") == 3
+
+
+def test_failed_call_is_reported_as_none():
+    batch_reader, _ = reader(chunk_size=10)
+    failing = "0x" + "0" * 36 + "ffff"
+
+    assert batch_reader.fetch([failing, "0x" + "0" * 39 + "7"]) == {failing: None, "0x" + "0" * 39 + "7": 7}
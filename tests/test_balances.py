@@ -0,0 +1,53 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from src.models.casinofound import User
+from src.models.db import db
+from src.services.amounts import to_units
+
+WALLET = "0x" + "44" * 20
+
+
+def test_concurrent_stake_unstake_and_buy_lose_no_updates(app):
+    # Base de dados em ficheiro (fixture app) com o perfil sqlite-wal: vários escritores reais
+    db.session.add(User(wallet_address=WALLET, referral_code=WALLET, cfd_balance=0, staked_tokens=to_units(50)))
+    db.session.commit()
+    # 50 unstakes de 2 (só 25 cabem no stake inicial), 40 compras de 1 e 40 stakes de 1
+    requests = (
+        [("/api/unstake_tokens", 2, {"cfd_balance": 1, "staked_tokens": -1})] * 50
+        + [("/api/buy_tokens", 0.02, {"cfd_balance": 1})] * 40
+        + [("/api/stake_tokens", 1, {"cfd_balance": -1, "staked_tokens": 1})] * 40
+    )
+    start = threading.Barrier(16)
+
+    def send(item):
+        path, amount, signs = item
+        client = app.test_client()
+        try:
+            start.wait(timeout=1)
+        except threading.BrokenBarrierError:
+            pass
+        status = client.post(path, json={"wallet_address": WALLET, "amount": amount}).status_code
+        tokens = 1 if path == "/api/buy_tokens" else amount
+        return status, {column: sign * to_units(tokens) for column, sign in signs.items()}
+
+    with ThreadPoolExecutor(max_workers=16) as pool:
+        results = list(pool.map(send, requests))
+
+    statuses = [status for status, _ in results]
+    assert set(statuses) <= {200, 400}, statuses
+    expected = {"cfd_balance": 0, "staked_tokens": to_units(50)}
+    for status, deltas in results:
+        if status == 200:
+            for column, delta in deltas.items():
+                expected[column] += delta
+
+    db.session.expire_all()
+    user = User.query.filter_by(wallet_address=WALLET).one()
+    assert (user.cfd_balance, user.staked_tokens) == (expected["cfd_balance"], expected["staked_tokens"])
+    assert user.cfd_balance >= 0 and user.staked_tokens >= 0
+    # Só recusados por falta de saldo, e nunca mais unstakes do que o stake permitia
+    unstaked = sum(1 for (status, _), item in zip(results, requests) if status == 200 and item[0] == "/api/unstake_tokens")
+    staked = sum(1 for (status, _), item in zip(results, requests) if status == 200 and item[0] == "/api/stake_tokens")
+    assert 2 * unstaked <= 50 + staked
+    assert statuses.count(200) > 40
@@ -0,0 +1,106 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from src.services.cache import TTLCache
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def wait_for_callers(cache, count, timeout=5):
+    """Esperar até `count` pedidos estarem no loader ou à espera dele"""
+    deadline = time.monotonic() + timeout
+    while cache.stats()["coalesced"] + cache.stats()["misses"] < count:
+        assert time.monotonic() < deadline
+        time.sleep(0.001)
+
+
+def test_concurrent_misses_share_one_loader_call():
+    cache = TTLCache(ttl=60)
+    release = threading.Event()
+    calls = []
+
+    def loader():
+        calls.append(1)
+        release.wait(timeout=5)
+        return "saldo"
+
+    with ThreadPoolExecutor(max_workers=10) as pool:
+        futures = [pool.submit(cache.get_or_load, "0xabc", loader) for _ in range(10)]
+        # Todos os pedidos à espera do mesmo carregamento antes de o libertar
+        wait_for_callers(cache, 10)
+        release.set()
+        results = [future.result(timeout=5) for future in futures]
+
+    assert results == ["saldo"] * 10
+    assert len(calls) == 1
+    stats = cache.stats()
+    assert (stats["misses"], stats["coalesced"], stats["in_flight"]) == (1, 9, 0)
+    assert cache.get_or_load("0xabc", loader) == "saldo" and len(calls) == 1
+
+
+def test_loader_errors_reach_every_waiter_and_are_not_cached():
+    cache = TTLCache(ttl=60)
+    release = threading.Event()
+    calls = []
+
+    def failing():
+        calls.append(1)
+        release.wait(timeout=5)
+        raise ConnectionError("RPC indisponível")
+
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        futures = [pool.submit(cache.get_or_load, "k", failing) for _ in range(4)]
+        wait_for_callers(cache, 4)
+        release.set()
+        for future in futures:
+            with pytest.raises(ConnectionError):
+                future.result(timeout=5)
+
+    assert len(calls) == 1
+    assert cache.get_or_load("k", lambda: 7) == 7
+
+
+def test_entries_expire_after_the_ttl():
+    clock = Clock()
+    cache = TTLCache(ttl=15, clock=clock)
+    cache.set("k", 1)
+
+    clock.now += 14.9
+    assert cache.get("k") == 1
+    clock.now += 0.1
+    assert cache.get("k") is None
+    assert len(cache) == 0
+    assert cache.get_or_load("k", lambda: 2) == 2
+    assert cache.stats()["misses"] == 1
+
+
+def test_size_is_bounded_least_recently_used_first():
+    cache = TTLCache(ttl=60, max_size=3)
+    for key in "abc":
+        cache.set(key, key.upper())
+    assert cache.get("a") == "A"  # "a" passa a ser a mais recente
+
+    cache.set("d", "D")
+    cache.get_or_load("e", lambda: "E")
+
+    assert [key for key in "abcde" if cache.get(key) is not None] == ["a", "d", "e"]
+    assert (len(cache), cache.stats()["evictions"]) == (3, 2)
+
+
+def test_invalidate_and_clear():
+    cache = TTLCache()
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.invalidate("a")
+    assert (cache.get("a"), cache.get("b")) == (None, 2)
+    cache.clear()
+    assert len(cache) == 0
@@ -0,0 +1,90 @@
+from types import SimpleNamespace
+
+from web3 import Web3
+
+from src.models.chain import IndexedBlock, IndexerCheckpoint, TokenBalance, TransferLog
+from src.models.db import db
+from src.services.chain_indexer import ChainIndexer, ZERO_ADDRESS
+from tests.rpc_stub import ChainStub
+
+TOKEN = "0x" + "33" * 20
+ALICE = "0x" + "aa" * 20
+BOB = "0x" + "bb" * 20
+
+
+def indexer(chain, **options):
+    options = {"window_size": 2000, "confirmations": 0, "keep_blocks": 256, **options}
+    token = SimpleNamespace(address=Web3.to_checksum_address(TOKEN))
+    return ChainIndexer(
+        Web3(chain), token, db, TokenBalance, TransferLog, IndexerCheckpoint, IndexedBlock, **options
+    )
+
+
+def balances():
+    return {row.wallet_address: int(row.balance_wei) for row in TokenBalance.query if int(row.balance_wei)}
+
+
+def log_ranges(chain):
+    return [(int(p[0]["fromBlock"], 16), int(p[0]["toBlock"], 16)) for p in chain.calls("eth_getLogs")]
+
+
+def test_resumes_from_checkpoint(app):
+    chain = ChainStub(TOKEN, 1000, {10: [(ZERO_ADDRESS, ALICE, 100)], 900: [(ALICE, BOB, 40)]})
+    assert indexer(chain).run_once()["last_block"] == 1000
+
+    chain.head = 1500
+    chain.transfers[1200] = [(BOB, ALICE, 15)]
+    chain.requests.clear()
+    # Novo processo: só o checkpoint na base de dados
+    stats = indexer(chain).run_once()
+
+    assert log_ranges(chain) == [(1001, 1500)]
+    assert (stats["blocks"], stats["events"]) == (500, 1)
+    assert balances() == {ALICE: 75, BOB: 25}
+
+
+def test_window_halves_on_range_errors_and_grows_back(app):
+    transfers = {n: [(ZERO_ADDRESS, ALICE, 1)] for n in range(0, 1000, 7)}
+    chain = ChainStub(TOKEN, 999, transfers, max_range=300)
+    worker = indexer(chain, window_size=1000)
+
+    stats = worker.run_once()
+
+    ranges = log_ranges(chain)
+    assert ranges[:3] == [(0, 999), (0, 499), (0, 249)]
+    accepted = [r for r in ranges if r[1] - r[0] + 1 <= 300]
+    assert accepted[0] == (0, 249) and accepted[-1][1] == 999
+    # Sem buracos nem blocos repetidos entre as janelas aceites
+    assert all(b[0] == a[1] + 1 for a, b in zip(accepted, accepted[1:]))
+    assert stats["blocks"] == 1000 and balances() == {ALICE: len(transfers)}
+
+
+def test_reorg_after_catch_up_rolls_back_only_to_the_fork(app):
+    chain = ChainStub(TOKEN, 1000, {10: [(ZERO_ADDRESS, ALICE, 100)], 995: [(ALICE, BOB, 40)]})
+    worker = indexer(chain)
+    worker.run_once()
+    assert balances() == {ALICE: 60, BOB: 40}
+
+    # Os blocos 990+ são substituídos; a transferência passa para o bloco 998 com outro valor
+    chain.reorg(990, {998: [(ALICE, BOB, 10)]})
+    chain.requests.clear()
+    assert worker.check_reorg()
+    assert worker.last_indexed_block() == 989
+
+    worker.run_once()
+    assert log_ranges(chain) == [(990, 1000)]
+    assert balances() == {ALICE: 90, BOB: 10}
+
+
+def test_reorg_deeper_than_stored_blocks_does_not_reindex_everything(app):
+    chain = ChainStub(TOKEN, 1000, {10: [(ZERO_ADDRESS, ALICE, 100)], 800: [(ALICE, BOB, 40)]})
+    worker = indexer(chain, keep_blocks=50)
+    worker.run_once()
+
+    chain.reorg(700, {})
+    chain.requests.clear()
+    worker.run_once()
+
+    # Volta só até abaixo do bloco guardado mais antigo (951), não a start_block
+    assert log_ranges(chain) == [(951, 1000)]
+    assert worker.last_indexed_block() == 1000
@@ -0,0 +1,64 @@
+from web3 import Web3
+from web3.providers.base import JSONBaseProvider
+
+from src.services.chain_metadata import ChainMetadata
+
+TOKEN = "0x" + "33" * 20
+BALANCE_OF_ABI = [{
+    "name": "balanceOf", "type": "function", "stateMutability": "view",
+    "inputs": [{"name": "account", "type": "address"}],
+    "outputs": [{"name": "", "type": "uint256"}],
+}]
+
+
+class CountingProvider(JSONBaseProvider):
+    def __init__(self):
+        super().__init__()
+        self.methods = []
+
+    def make_request(self, method, params):
+        self.methods.append(method)
+        if method == "eth_chainId":
+            return {"jsonrpc": "2.0", "id": 1, "result": "0x89"}
+        return {"jsonrpc": "2.0", "id": 1, "result": "0x" + "0" * 63 + "5"}
+
+
+def counting_web3():
+    provider = CountingProvider()
+    w3 = Web3(provider)
+    chain_metadata = ChainMetadata(w3)
+    w3.middleware_onion.add(chain_metadata.web3_middleware, "chain_id_cache")
+    return w3, provider, chain_metadata
+
+
+def test_chain_id_is_fetched_once():
+    w3, provider, chain_metadata = counting_web3()
+
+    assert chain_metadata.chain_id == 137
+    assert w3.eth.chain_id == 137
+
+    assert provider.methods == ["eth_chainId"]
+
+
+def test_eth_call_validation_uses_cached_chain_id():
+    w3, provider, _ = counting_web3()
+    token = w3.eth.contract(address=TOKEN, abi=BALANCE_OF_ABI)
+
+    for _ in range(3):
+        assert token.functions.balanceOf(TOKEN).call() == 5
+
+    assert provider.methods == ["eth_chainId", "eth_call", "eth_call", "eth_call"]
+
+
+def test_api_web3_reads_balances_without_chain_id_round_trips(monkeypatch):
+    from src.routes import api
+
+    provider = CountingProvider()
+    monkeypatch.setattr(api.w3, "provider", provider)
+    monkeypatch.setattr(api.chain_metadata, "_chain_id", None)
+    token = api.w3.eth.contract(address=TOKEN, abi=BALANCE_OF_ABI)
+
+    for _ in range(3):
+        token.functions.balanceOf(TOKEN).call()
+
+    assert provider.methods == ["eth_chainId", "eth_call", "eth_call", "eth_call"]
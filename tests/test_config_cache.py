@@ -0,0 +1,80 @@
+import json
+
+from src.routes.casinofound import config_cache
+from src.services.config_cache import ConfigCache
+
+ADMIN = {"Authorization": "Bearer admin-token"}
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def set_config(client, key, value):
+    return client.post(f"/api/config/{key}", json={"value": value}, headers=ADMIN)
+
+
+def value(payload):
+    return json.loads(payload[0])["value"]
+
+
+def test_cache_is_cold_until_the_first_read(app):
+    set_config(app.test_client(), "phase", "1")
+    cache = ConfigCache(check_interval=5, clock=Clock())
+
+    assert cache.stats() == {"keys": 0, "version": None, "reloads": 0}
+    assert value(cache.get("phase")) == "1"
+    assert cache.stats() == {"keys": 1, "version": 1, "reloads": 1}
+    assert cache.get("missing") is None
+    assert cache.stats()["reloads"] == 1
+
+
+def test_update_on_another_worker_is_seen_after_the_check_interval(app):
+    client = app.test_client()
+    set_config(client, "phase", "1")
+    clock = Clock()
+    other_worker = ConfigCache(check_interval=5, clock=clock)
+    etag = other_worker.get("phase")[1]
+
+    # Escrita por este worker (a cache da rota); o outro só vê a linha de versão
+    assert set_config(client, "phase", "2").status_code == 200
+    clock.now += 4
+    assert value(other_worker.get("phase")) == "1"
+    assert other_worker.stats()["reloads"] == 1
+
+    clock.now += 1
+    assert value(other_worker.get("phase")) == "2"
+    assert other_worker.get("phase")[1] != etag
+    assert other_worker.stats() == {"keys": 1, "version": 2, "reloads": 2}
+
+
+def test_unchanged_version_does_not_reload(app):
+    set_config(app.test_client(), "phase", "1")
+    clock = Clock()
+    cache = ConfigCache(check_interval=5, clock=clock)
+    cache.get_all()
+
+    for _ in range(3):
+        clock.now += 10
+        cache.get_all()
+
+    assert cache.stats()["reloads"] == 1
+
+
+def test_writing_worker_serves_the_new_value_at_once(app):
+    client = app.test_client()
+    config_cache.load()
+    set_config(client, "phase", "1")
+    first = client.get("/api/config/phase")
+    assert first.get_json()["value"] == "1"
+    assert client.get("/api/config/phase", headers={"If-None-Match": first.headers["ETag"]}).status_code == 304
+
+    set_config(client, "phase", "2")
+
+    response = client.get("/api/config/phase", headers={"If-None-Match": first.headers["ETag"]})
+    assert response.status_code == 200 and response.get_json()["value"] == "2"
+    assert client.get("/api/config").get_json()["phase"]["value"] == "2"
@@ -0,0 +1,75 @@
+import pytest
+import sqlalchemy as sa
+from sqlalchemy.pool import NullPool, QueuePool
+
+from src.models.db import db
+from src.services.db_engine import configure_engine, engine_options, resolve_profile
+
+
+def pragmas(engine):
+    with engine.connect() as conn:
+        return tuple(conn.exec_driver_sql(f"PRAGMA {name}").scalar()
+                     for name in ("journal_mode", "busy_timeout", "synchronous"))
+
+
+def test_sqlite_profile_on_the_app_engine(app):
+    engine = db.engine
+
+    assert pragmas(engine) == ("wal", 5000, 1)  # synchronous=NORMAL
+    assert isinstance(engine.pool, QueuePool)
+    assert (engine.pool.size(), engine.pool._max_overflow, engine.pool._timeout) == (5, 10, 30)
+    assert engine.pool._pre_ping
+    # Todas as ligações do pool, não só a primeira
+    with engine.connect() as first, engine.connect() as second:
+        for conn in (first, second):
+            assert conn.exec_driver_sql("PRAGMA busy_timeout").scalar() == 5000
+
+
+def test_environment_overrides_the_profile(tmp_path, monkeypatch):
+    monkeypatch.setenv("DB_BUSY_TIMEOUT_MS", "250")
+    monkeypatch.setenv("DB_POOL_SIZE", "3")
+    monkeypatch.setenv("DB_SQLITE_JOURNAL_MODE", "DELETE")
+    url = f"sqlite:///{tmp_path / 'override.db'}"
+    engine = sa.create_engine(url, **engine_options(url))
+    configure_engine(engine)
+    try:
+        assert pragmas(engine) == ("delete", 250, 1)
+        assert engine.pool.size() == 3
+    finally:
+        engine.dispose()
+
+
+def test_in_memory_sqlite_keeps_the_default_pool():
+    options = engine_options("sqlite://")
+    assert options == {"pool_pre_ping": True, "connect_args": {"timeout": 5.0}}
+    engine = sa.create_engine("sqlite://", **options)
+    configure_engine(engine)
+    try:
+        # Sem WAL em memória; os restantes pragmas aplicam-se
+        assert pragmas(engine) == ("memory", 5000, 1)
+    finally:
+        engine.dispose()
+
+
+def test_postgres_profiles():
+    url = "postgresql+psycopg2://app@db/casinofound"
+
+    pooled = engine_options(url)
+    assert {key: pooled[key] for key in ("pool_size", "max_overflow", "pool_timeout", "pool_recycle")} == {
+        "pool_size": 10, "max_overflow": 20, "pool_timeout": 30, "pool_recycle": 1800
+    }
+    assert pooled["connect_args"] == {"options": "-c statement_timeout=15000"}
+
+    # PgBouncer: sem pool local nem parâmetros de arranque (o timeout vai em SET LOCAL)
+    assert engine_options(url, "postgres-pgbouncer") == {"poolclass": NullPool}
+    bouncer_async = engine_options("postgresql+asyncpg://app@db/casinofound", "postgres-pgbouncer")
+    assert bouncer_async["connect_args"] == {"statement_cache_size": 0, "prepared_statement_cache_size": 0}
+    assert engine_options("postgresql+asyncpg://app@db/casinofound")["connect_args"] == {
+        "server_settings": {"statement_timeout": "15000"}
+    }
+
+
+def test_unknown_profile_is_rejected():
+    with pytest.raises(ValueError, match="desconhecido"):
+        resolve_profile("sqlite://", "sqlite-fast")
+    assert resolve_profile("mysql://app@db/casinofound") == (None, {})
@@ -0,0 +1,86 @@
+from src.models.casinofound import Newsletter
+from src.models.db import db
+from src.services.db_routing import recent_writers, STICKY_HEADER
+
+ADMIN = {"Authorization": "Bearer admin-token"}
+REFERRER = "0x" + "a" * 40
+REFERRED = "0x" + "b" * 40
+
+
+def test_wallet_write_reads_primary_without_cookies(replicated_app):
+    writer = replicated_app.test_client()
+    response = writer.post("/api/referral/record", json={
+        "referrer_wallet": REFERRER,
+        "referred_wallet": REFERRED,
+        "amount_invested": 100,
+        "currency": "USDT",
+        "transaction_hash": "0x" + "1" * 64
+    })
+    assert response.status_code in (200, 201)
+    assert "Set-Cookie" not in response.headers
+
+    # Outro cliente, sem cookies nem cabeçalho (como um fetch de outra origem)
+    reader = replicated_app.test_client()
+    earnings = reader.get("/api/referral/earnings/0x" + "A" * 40).get_json()
+    assert earnings["total_referrals"] == 1
+
+    # Carteira sem escrita recente: lê da réplica, que não tem a linha
+    recent_writers.clear()
+    earnings = reader.get(f"/api/referral/earnings/{REFERRED}").get_json()
+    assert earnings["total_referrals"] == 0
+
+
+def test_echoed_header_reads_primary(replicated_app):
+    client = replicated_app.test_client()
+    response = client.post("/api/newsletter/subscribe", json={"email": "novo@example.com"})
+    assert response.status_code in (200, 201)
+    until = response.headers[STICKY_HEADER]
+    assert STICKY_HEADER in response.headers["Access-Control-Expose-Headers"]
+
+    replica_view = client.get("/api/newsletter/list", headers=ADMIN).get_json()
+    primary_view = client.get("/api/newsletter/list", headers={**ADMIN, STICKY_HEADER: until}).get_json()
+    expired = client.get("/api/newsletter/list", headers={**ADMIN, STICKY_HEADER: "1"}).get_json()
+
+    assert replica_view["total"] == 0
+    assert primary_view["total"] == 1
+    assert [n["email"] for n in primary_view["newsletters"]] == ["novo@example.com"]
+    assert expired["total"] == 0
+    with replicated_app.app_context():
+        assert db.session.query(Newsletter).count() == 1
+
+
+def test_affiliate_share_wallets_are_remembered(replicated_app):
+    from src.models.casinofound import User
+
+    new_user = "0x" + "d" * 40
+    with replicated_app.app_context():
+        db.session.add(User(wallet_address=REFERRER, referral_code=REFERRER))
+        db.session.commit()
+
+    response = replicated_app.test_client().post("/api/affiliate_share", json={
+        "referrer_address": REFERRER, "new_user_address": new_user
+    })
+
+    assert response.status_code == 200
+    assert recent_writers.get(REFERRER) and recent_writers.get(new_user)
+
+
+def test_other_worker_needs_the_echoed_header(replicated_app):
+    """recent_writers é por processo: noutro worker só o cabeçalho repetido garante o primário"""
+    client = replicated_app.test_client()
+    response = client.post("/api/referral/record", json={
+        "referrer_wallet": REFERRER,
+        "referred_wallet": REFERRED,
+        "amount_invested": 100,
+        "currency": "USDT",
+        "transaction_hash": "0x" + "2" * 64
+    })
+    until = response.headers[STICKY_HEADER]
+    # Outro worker: a mesma app sem as carteiras registadas por este processo
+    recent_writers.clear()
+
+    lagging = client.get(f"/api/referral/earnings/{REFERRER}").get_json()
+    echoed = client.get(f"/api/referral/earnings/{REFERRER}", headers={STICKY_HEADER: until}).get_json()
+
+    assert lagging["total_referrals"] == 0
+    assert echoed["total_referrals"] == 1
@@ -0,0 +1,119 @@
+import random
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+from sqlalchemy.exc import IntegrityError
+
+from src.models.casinofound import DividendPayment, StakingRecord
+from src.models.db import db
+from src.services.dividends import allocate_pro_rata, distribute_dividends, time_weighted_stakes
+
+START = datetime(2026, 1, 1)
+END = START + timedelta(days=10)
+
+
+def stakes(records):
+    """(carteira, montante, início, fim) -> arrays no formato de load_stakes"""
+    wallets, amounts, starts, ends = zip(*records)
+    return (
+        np.array(wallets, dtype=object),
+        np.array(amounts, dtype=np.float64),
+        np.array(starts, dtype='datetime64[us]'),
+        np.array([end or END for end in ends], dtype='datetime64[us]')
+    )
+
+
+def loop_weights(records):
+    """Cálculo por laço em Python, a referência para a versão vetorizada"""
+    duration = (END - START).total_seconds()
+    weights = defaultdict(float)
+    for wallet, amount, start, end in records:
+        overlap = (min(end or END, END) - max(start, START)).total_seconds()
+        if overlap > 0:
+            weights[wallet] += amount * overlap / duration
+    return dict(sorted(weights.items()))
+
+
+def test_allocation_sums_exactly_to_the_pool():
+    rng = random.Random(7)
+    weights = [rng.uniform(0.001, 1e6) for _ in range(1000)]
+    pool = 12345678901234567890123
+
+    shares = allocate_pro_rata(pool, weights)
+
+    assert sum(shares) == pool
+    assert all(share >= 0 for share in shares)
+
+
+def test_allocation_gives_leftover_to_largest_remainders():
+    # 3.5 / 2.1 / 1.4: a unidade que sobra vai para a maior parte fracionária
+    assert allocate_pro_rata(7, [0.5, 0.3, 0.2]) == [4, 2, 1]
+    # Empates no resto: pela ordem dos pesos
+    assert allocate_pro_rata(10, [1, 1, 1]) == [4, 3, 3]
+    assert allocate_pro_rata(2, [1, 1, 1]) == [1, 1, 0]
+
+
+def test_allocation_with_zero_total_stake_pays_nothing():
+    assert allocate_pro_rata(10 ** 18, [0, 0]) == [0, 0]
+    assert allocate_pro_rata(10 ** 18, []) == []
+
+
+def test_time_weighting_matches_the_overlap_with_the_period():
+    records = [
+        ("0xa", 100.0, START - timedelta(days=5), None),                         # período inteiro
+        ("0xb", 100.0, START + timedelta(days=5), None),                         # metade
+        ("0xb", 40.0, START - timedelta(days=1), START + timedelta(days=1)),     # 1 de 10 dias
+        ("0xc", 100.0, START - timedelta(days=9), START - timedelta(days=1)),    # antes do período
+        ("0xd", 100.0, END + timedelta(days=1), None),                           # depois do período
+    ]
+
+    wallets, weights = time_weighted_stakes(*stakes(records), START, END)
+
+    assert list(wallets) == ["0xa", "0xb"]
+    assert weights == pytest.approx([100.0, 54.0])
+
+
+def test_time_weighting_matches_the_python_loop():
+    rng = random.Random(3)
+    records = []
+    for _ in range(2000):
+        start = START + timedelta(hours=rng.randint(-24 * 20, 24 * 12))
+        end = None if rng.random() < 0.4 else start + timedelta(hours=rng.randint(1, 24 * 15))
+        records.append((f"0x{rng.randint(1, 300):040x}", rng.uniform(1, 1000), start, end))
+
+    wallets, weights = time_weighted_stakes(*stakes(records), START, END)
+
+    expected = loop_weights(records)
+    assert list(wallets) == list(expected)
+    assert weights == pytest.approx(list(expected.values()))
+
+
+def test_time_weighting_rejects_an_empty_period():
+    with pytest.raises(ValueError):
+        time_weighted_stakes(*stakes([("0xa", 1.0, START, None)]), END, START)
+
+
+def test_period_is_paid_only_once(app):
+    db.session.add_all([
+        StakingRecord(wallet_address="0xa", amount_staked=300.0, staked_at=START - timedelta(days=1)),
+        StakingRecord(wallet_address="0xb", amount_staked=100.0, staked_at=START - timedelta(days=1)),
+    ])
+    db.session.commit()
+    pool = 10 ** 18
+
+    payments = distribute_dividends(START, END, pool)
+
+    assert [(wallet, share) for wallet, _, share in payments] == [("0xa", 75 * 10 ** 16), ("0xb", 25 * 10 ** 16)]
+    assert sum(int(p.amount_wei) for p in DividendPayment.query) == pool
+    with pytest.raises(ValueError, match="já distribuídos"):
+        distribute_dividends(START, END, pool)
+    # O índice único trava também um segundo processo que passe a verificação ao mesmo tempo
+    db.session.add(DividendPayment(
+        wallet_address="0xa", amount_matic=1.0, staked_tokens=1.0, period_start=START, period_end=END
+    ))
+    with pytest.raises(IntegrityError):
+        db.session.commit()
+    db.session.rollback()
+    assert DividendPayment.query.count() == 2
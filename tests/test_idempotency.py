@@ -0,0 +1,142 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from flask import Flask, jsonify, request
+
+from src.models.casinofound import ReferralEarning, StakingRecord, TokenPurchase
+from src.services.cache import TTLCache
+from src.services.idempotency import IDEMPOTENCY_HEADER, idempotent
+
+BUYER = "0x" + "55" * 20
+REFERRER = "0x" + "66" * 20
+OTHER_REFERRER = "0x" + "77" * 20
+TX = "0x" + "ab" * 32
+
+
+@pytest.fixture
+def counted_app():
+    """App mínima: a vista conta as chamadas e demora o suficiente para haver pedidos em curso"""
+    app = Flask(__name__)
+    app.calls = 0
+    lock = threading.Lock()
+
+    @app.route("/record", methods=["POST"])
+    @idempotent(TTLCache(ttl=60, max_size=100))
+    def record():
+        with lock:
+            app.calls += 1
+            call = app.calls
+        time.sleep(0.1)
+        if request.get_json().get("fail"):
+            return jsonify({"error": "falhou"}), 500
+        return jsonify({"call": call}), 201
+    return app
+
+
+def post(client, body, key="k1"):
+    return client.post("/record", json=body, headers={IDEMPOTENCY_HEADER: key} if key else {})
+
+
+def test_retry_replays_the_original_response(counted_app):
+    client = counted_app.test_client()
+    first = post(client, {"a": 1})
+    again = post(client, {"a": 1})
+
+    assert (first.status_code, first.get_json()) == (201, {"call": 1})
+    assert (again.status_code, again.get_json()) == (201, {"call": 1})
+    assert again.headers["Idempotent-Replayed"] == "true" and "Idempotent-Replayed" not in first.headers
+    assert post(client, {"a": 1}, key="k2").get_json() == {"call": 2}
+    assert post(client, {"a": 1}, key=None).get_json() == {"call": 3}
+
+
+def test_same_key_with_another_body_is_a_conflict(counted_app):
+    client = counted_app.test_client()
+    post(client, {"a": 1})
+
+    response = post(client, {"a": 2})
+
+    assert response.status_code == 409
+    assert counted_app.calls == 1
+
+
+def test_concurrent_requests_with_one_key_run_the_view_once(counted_app):
+    with ThreadPoolExecutor(max_workers=5) as pool:
+        responses = list(pool.map(lambda _: post(counted_app.test_client(), {"a": 1}), range(5)))
+
+    assert counted_app.calls == 1
+    assert [r.get_json() for r in responses] == [{"call": 1}] * 5
+    assert sum("Idempotent-Replayed" in r.headers for r in responses) == 4
+
+
+def test_server_errors_are_not_replayed(counted_app):
+    client = counted_app.test_client()
+    assert post(client, {"fail": True}).status_code == 500
+    assert post(client, {"fail": True}).status_code == 500
+    assert counted_app.calls == 2
+
+
+def purchase(tx=TX, referrer=None):
+    body = {
+        "wallet_address": BUYER, "amount_invested": 100, "tokens_received": 5000,
+        "currency": "USDT", "phase": 1, "price_per_token": 0.02, "transaction_hash": tx
+    }
+    if referrer:
+        body["referrer"] = referrer
+    return body
+
+
+def referral(referrer=REFERRER, tx=TX):
+    return {
+        "referrer_wallet": referrer, "referred_wallet": BUYER,
+        "amount_invested": 100, "currency": "USDT", "transaction_hash": tx
+    }
+
+
+def test_unique_transaction_hash_per_table(app):
+    client = app.test_client()
+    staking = {"wallet_address": BUYER, "amount_staked": 100, "transaction_hash": TX}
+
+    for path, body, model in (
+        ("/api/purchase/record", purchase(), TokenPurchase),
+        ("/api/referral/record", referral(), ReferralEarning),
+        ("/api/staking/record", staking, StakingRecord),
+    ):
+        assert client.post(path, json=body).status_code == 201
+        retry = client.post(path, json=body)
+        assert retry.status_code == 200 and "já registad" in retry.get_json()["message"]
+        assert model.query.filter_by(transaction_hash=TX).count() == 1
+
+
+def test_purchase_is_kept_when_its_referral_was_recorded_first(app):
+    client = app.test_client()
+    assert client.post("/api/referral/record", json=referral()).status_code == 201
+
+    response = client.post("/api/purchase/record", json=purchase(referrer=REFERRER))
+
+    assert response.status_code == 201
+    assert TokenPurchase.query.filter_by(transaction_hash=TX).count() == 1
+    assert ReferralEarning.query.filter_by(transaction_hash=TX).count() == 1
+
+
+def test_bulk_purchase_is_kept_when_its_referral_was_recorded_first(app):
+    client = app.test_client()
+    client.post("/api/referral/record", json=referral())
+
+    result = client.post("/api/purchase/record/bulk", json=[purchase(referrer=REFERRER)]).get_json()
+
+    assert (result["inserted"], result["errors"]) == (1, [])
+    assert TokenPurchase.query.count() == 1
+
+
+def test_referral_colliding_with_another_earning_is_reported(app):
+    client = app.test_client()
+    client.post("/api/purchase/record", json=purchase(referrer=REFERRER))
+
+    same = client.post("/api/referral/record", json=referral())
+    other = client.post("/api/referral/record", json=referral(referrer=OTHER_REFERRER))
+
+    assert same.status_code == 200
+    assert other.status_code == 409
+    assert ReferralEarning.query.count() == 1
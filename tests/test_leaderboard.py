@@ -0,0 +1,110 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from src.models.casinofound import User
+from src.models.db import db
+from src.routes import api
+from src.services.amounts import to_units
+from src.services.leaderboard import Leaderboards, SortedIndex
+
+A, B, C = ("0x" + str(n) * 40 for n in range(1, 4))
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def users(app):
+    for wallet, balance in ((A, 30), (B, 20), (C, 10)):
+        db.session.add(User(wallet_address=wallet, referral_code=wallet, cfd_balance=to_units(balance)))
+    db.session.commit()
+
+
+@pytest.fixture
+def board(users, monkeypatch):
+    # A instância do módulo guarda o estado de testes anteriores (outra base de dados)
+    clock = Clock()
+    board = Leaderboards(db, User, api.LEADERBOARD_COLUMNS, sync_interval=60, clock=clock)
+    board.clock = clock
+    monkeypatch.setattr(api, "leaderboards", board)
+    return board
+
+
+def wallets(board, name="balance"):
+    return [wallet for wallet, _ in board.top(name, 10)]
+
+
+def test_sorted_index_updates_ranks():
+    index = SortedIndex()
+    index.build([(A, 3), (B, 2), (C, 0)])
+    assert (index.top(10), len(index)) == ([(A, 3), (B, 2)], 2)
+
+    index.update(C, 5)
+    index.update(A, 1)
+    assert index.top(10) == [(C, 5), (B, 2), (A, 1)]
+    assert index.rank(B) == (2, 2)
+
+    index.update(B, 0)
+    index.update(A, 5)  # empate: por carteira
+    assert index.top(10) == [(A, 5), (C, 5)]
+    assert index.rank(B) == (None, 0)
+
+
+def test_changes_by_another_worker_resync_from_updated_at(board):
+    assert wallets(board) == [A, B, C]
+
+    # Outro worker altera o saldo: só a linha (e o seu updated_at) muda na base de dados
+    user = User.query.filter_by(wallet_address=C).one()
+    user.cfd_balance = to_units(50)
+    db.session.commit()
+    assert wallets(board) == [A, B, C]  # dentro do intervalo
+
+    board.clock.now += 60
+    assert wallets(board) == [C, A, B]
+    assert board.rank("balance", C) == (1, to_units(50), 3)
+
+
+def test_late_commit_inside_the_overlap_is_not_missed(board):
+    wallets(board)
+    # Commit de um worker com o relógio ligeiramente atrasado (updated_at no passado)
+    db.session.execute(db.update(User).where(User.wallet_address == B).values(
+        cfd_balance=to_units(40), updated_at=datetime.utcnow() - timedelta(seconds=5)
+    ))
+    db.session.commit()
+
+    board.invalidate()
+    assert wallets(board) == [B, A, C]
+
+
+def test_balance_adjustment_reorders_the_board_at_once(board):
+    assert wallets(board) == [A, B, C]
+    before = User.query.filter_by(wallet_address=C).one().updated_at
+
+    assert api.adjust_user_balances(C, {"cfd_balance": to_units(25)}) is not None
+    db.session.commit()
+
+    # Sem esperar pelo intervalo: adjust_user_balances chamou invalidate()
+    assert wallets(board) == [C, A, B]
+    # O UPDATE em bloco também avança updated_at, que os outros workers usam para sincronizar
+    db.session.expire_all()
+    assert User.query.filter_by(wallet_address=C).one().updated_at > before
+
+
+def test_leaderboard_routes(board, app):
+    client = app.test_client()
+    api.adjust_user_balances(B, {"cfd_balance": to_units(15)})
+    db.session.commit()
+
+    response = client.get("/api/leaderboard?by=balance&limit=2").get_json()
+    assert [(row["rank"], row["wallet_address"], row["value"]) for row in response["leaderboard"]] == [
+        (1, B, "35.0000"), (2, A, "30.0000")
+    ]
+    rank = client.get(f"/api/leaderboard/rank/{C}").get_json()
+    assert (rank["rank"], rank["ranked_wallets"]) == (3, 3)
+    assert client.get("/api/leaderboard?by=nope").status_code == 400
@@ -0,0 +1,58 @@
+import pytest
+
+from src.routes import api
+from src.services.cache import TTLCache
+from src.services.referral_graph import ReferralGraph
+
+TOKEN = "secret-token"
+
+
+@pytest.fixture
+def client(app, monkeypatch):
+    monkeypatch.setattr(api, "METRICS_TOKEN", TOKEN)
+    return app.test_client()
+
+
+def test_metrics_disabled_without_token(app, monkeypatch):
+    monkeypatch.setattr(api, "METRICS_TOKEN", None)
+    client = app.test_client()
+
+    assert client.get("/metrics").status_code == 404
+    assert client.get("/api/metrics/profiles").status_code == 404
+
+
+def test_metrics_require_bearer_token(client):
+    assert client.get("/metrics").status_code == 401
+    assert client.get("/api/metrics/profiles", headers={"Authorization": "Bearer wrong"}).status_code == 401
+
+    response = client.get("/metrics", headers={"Authorization": f"Bearer {TOKEN}"})
+    assert response.status_code == 200
+    assert "# TYPE http_request_duration_seconds histogram" in response.get_data(as_text=True)
+
+
+def test_component_timings_are_sum_and_count_only(client):
+    client.get("/health")
+
+    text = client.get("/metrics", headers={"Authorization": f"Bearer {TOKEN}"}).get_data(as_text=True)
+
+    assert "# TYPE http_request_db_seconds summary" in text
+    assert 'http_request_db_seconds_count{method="GET",route="/health"} 1' in text
+    for name in ("db", "rpc", "serialization"):
+        assert f"http_request_{name}_seconds_bucket" not in text
+
+
+def test_cache_stats_do_not_wait_for_the_cache_lock():
+    cache = TTLCache(ttl=60)
+    cache.set("a", 1)
+    cache.get("a")
+    graph = ReferralGraph()
+    for referrer, referred in (("r", "x"), ("r", "y"), ("x", "z"), ("y", "x")):
+        graph.add_referral(referrer, referred)
+
+    # Com os locks presos (ex.: um get/set em curso) a leitura das métricas não bloqueia
+    with cache._lock, graph._lock:
+        stats = cache.stats()
+        graph_stats = graph.stats()
+
+    assert stats["size"] == 1 and stats["hits"] == 1
+    assert graph_stats["wallets"] == 4 and graph_stats["referred_wallets"] == 3
@@ -0,0 +1,228 @@
+import shutil
+from pathlib import Path
+
+import sqlalchemy as sa
+
+from src.models.db import db
+from src.models.migrations import MIGRATIONS, upgrade
+
+# Esquema criado pela antiga main.py (db.create_all, antes das migrações)
+BASELINE_SCHEMA = [
+    """CREATE TABLE user (
+        id INTEGER NOT NULL,
+        wallet_address VARCHAR(42) NOT NULL,
+        cfd_balance FLOAT,
+        staked_tokens FLOAT,
+        earned_rewards FLOAT,
+        affiliate_earnings FLOAT,
+        referral_code VARCHAR(42),
+        referred_by VARCHAR(42),
+        created_at DATETIME,
+        PRIMARY KEY (id),
+        UNIQUE (wallet_address),
+        UNIQUE (referral_code)
+    )""",
+    """CREATE TABLE newsletter (
+        id INTEGER NOT NULL,
+        email VARCHAR(120) NOT NULL,
+        subscribed_at DATETIME,
+        is_active BOOLEAN,
+        PRIMARY KEY (id),
+        UNIQUE (email)
+    )""",
+    """CREATE TABLE "transaction" (
+        id INTEGER NOT NULL,
+        wallet_address VARCHAR(42) NOT NULL,
+        transaction_type VARCHAR(20) NOT NULL,
+        amount FLOAT NOT NULL,
+        currency VARCHAR(10) NOT NULL,
+        tx_hash VARCHAR(66),
+        status VARCHAR(20),
+        created_at DATETIME,
+        PRIMARY KEY (id)
+    )""",
+]
+
+
+def create_baseline(engine):
+    with engine.begin() as conn:
+        for statement in BASELINE_SCHEMA:
+            conn.execute(sa.text(statement))
+        conn.execute(sa.text(
+            "INSERT INTO user (wallet_address, cfd_balance, staked_tokens, earned_rewards, affiliate_earnings, "
+            "referral_code, referred_by, created_at) "
+            "VALUES ('0xaaa', 1.5, 2.25, 0.1, NULL, 'AAA', '0xbbb', '2024-01-01 00:00:00')"
+        ))
+        conn.execute(sa.text(
+            "INSERT INTO newsletter (email, subscribed_at, is_active) VALUES ('a@example.com', '2024-01-01', 1)"
+        ))
+        conn.execute(sa.text(
+            'INSERT INTO "transaction" (wallet_address, transaction_type, amount, currency, status, created_at) '
+            "VALUES ('0xaaa', 'buy', 3.5, 'USDT', 'confirmed', '2024-01-01')"
+        ))
+
+
+def index_names(engine, table_name):
+    return {index["name"] for index in sa.inspect(engine).get_indexes(table_name)}
+
+
+def test_upgrade_baseline_database_to_latest(engine):
+    create_baseline(engine)
+
+    applied = upgrade(db, engine)
+
+    assert applied == [version for version, _, _ in MIGRATIONS]
+    with engine.connect() as conn:
+        user = conn.execute(sa.text(
+            "SELECT cfd_balance, staked_tokens, earned_rewards, affiliate_earnings, updated_at FROM user"
+        )).one()
+        amount = conn.scalar(sa.text('SELECT amount FROM "transaction"'))
+    assert tuple(user[:4]) == (150_000_000, 225_000_000, 10_000_000, 0)
+    assert user.updated_at == "2024-01-01 00:00:00"
+    assert amount == 350_000_000
+    assert {"ix_user_referred_by", "ix_user_updated_at"} <= index_names(engine, "user")
+    assert "ix_transaction_wallet_created" in index_names(engine, "transaction")
+    assert upgrade(db, engine) == []
+
+
+def test_upgrade_older_schema_applies_only_pending_versions(engine):
+    create_baseline(engine)
+    assert upgrade(db, engine, target=4) == [1, 2, 3, 4]
+    # Linha escrita pela versão 4 (montantes ainda em float)
+    with engine.begin() as conn:
+        conn.execute(sa.text(
+            "INSERT INTO user (wallet_address, cfd_balance, staked_tokens, earned_rewards, affiliate_earnings) "
+            "VALUES ('0xccc', 0.5, 0, 0, 0)"
+        ))
+
+    applied = upgrade(db, engine)
+
+    assert applied == [version for version, _, _ in MIGRATIONS if version > 4]
+    with engine.connect() as conn:
+        balance = conn.scalar(sa.text("SELECT cfd_balance FROM user WHERE wallet_address = '0xccc'"))
+    assert balance == 50_000_000
+
+
+def query_plan(conn, statement):
+    compiled = statement.compile(dialect=conn.dialect)
+    params = tuple(compiled.params[name] for name in compiled.positiontup)
+    return " | ".join(row[3] for row in conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {compiled}", params))
+
+
+def test_lookup_queries_use_indexes(engine):
+    upgrade(db, engine)
+    tables = db.metadata.tables
+    user, referral, purchase = tables["user"], tables["referral_earning"], tables["token_purchase"]
+    staking, newsletter, transaction = tables["staking_record"], tables["newsletter"], tables["transaction"]
+    wallet = "0x" + "a" * 40
+
+    expected = [
+        (sa.select(user).where(user.c.wallet_address == wallet), "sqlite_autoindex_user_"),  # UNIQUE (wallet_address)
+        (sa.select(user).where(user.c.referred_by == wallet), "ix_user_referred_by"),
+        (sa.select(referral).where(referral.c.referrer_wallet == wallet).order_by(referral.c.id.desc()),
+         "ix_referral_earning_referrer_id"),
+        (sa.select(purchase).where(purchase.c.wallet_address == wallet), "ix_token_purchase_wallet_address"),
+        (sa.select(sa.func.sum(purchase.c.tokens_received)).where(purchase.c.phase == 1),
+         "ix_token_purchase_phase_tokens"),
+        (sa.select(staking).where(staking.c.wallet_address == wallet, staking.c.is_active == sa.true()),
+         "ix_staking_record_wallet_active"),
+        (sa.select(newsletter.c.id).where(newsletter.c.is_active == sa.true()).order_by(newsletter.c.id),
+         "ix_newsletter_active_id"),
+        (sa.select(transaction).where(transaction.c.wallet_address == wallet).order_by(transaction.c.created_at.desc()),
+         "ix_transaction_wallet_created"),
+    ]
+    with engine.connect() as conn:
+        for statement, index in expected:
+            plan = query_plan(conn, statement)
+            assert index in plan, plan
+
+
+def assert_schema_matches_models(engine):
+    inspector = sa.inspect(engine)
+    for table in db.metadata.sorted_tables:
+        columns = {column["name"] for column in inspector.get_columns(table.name)}
+        assert set(table.c.keys()) <= columns, table.name
+        indexes = {index["name"] for index in inspector.get_indexes(table.name)}
+        assert {index.name for index in table.indexes} <= indexes, table.name
+
+
+def test_upgrade_committed_baseline_database(engine, tmp_path):
+    # Cópia da base de dados da antiga main.py incluída no repositório
+    baseline = Path(__file__).resolve().parents[1] / "src" / "instance" / "casinofound.db"
+    shutil.copyfile(baseline, tmp_path / "casinofound.db")
+    with engine.begin() as conn:
+        conn.execute(sa.text(
+            "INSERT INTO user (wallet_address, cfd_balance, staked_tokens, earned_rewards, affiliate_earnings) "
+            "VALUES ('0xaaa', 1.25, 0, 0, 0)"
+        ))
+        conn.execute(sa.text("INSERT INTO newsletter (email, is_active) VALUES ('a@example.com', 1)"))
+
+    assert upgrade(db, engine) == [version for version, _, _ in MIGRATIONS]
+
+    assert_schema_matches_models(engine)
+    with engine.connect() as conn:
+        assert conn.scalar(sa.text("SELECT cfd_balance FROM user")) == 125_000_000
+        assert conn.execute(sa.text("SELECT email, referrer FROM newsletter")).one() == ("a@example.com", None)
+
+
+def test_unified_schema_completes_pre_unification_database(engine):
+    # Base de dados migrada até à versão 10 pela antiga main.py: só os seus modelos
+    create_baseline(engine)
+    upgrade(db, engine, target=10)
+    with engine.begin() as conn:
+        for name in ("token_purchase", "purchase_stats", "referral_earning", "staking_record",
+                     "staking_balance", "dividend_payment"):
+            conn.execute(sa.text(f"DROP TABLE {name}"))
+
+    assert upgrade(db, engine) == [version for version, _, _ in MIGRATIONS if version > 10]
+
+    assert_schema_matches_models(engine)
+    with engine.connect() as conn:
+        assert conn.scalar(sa.text("SELECT total_purchases FROM purchase_stats WHERE phase = -1")) == 0
+
+
+def test_template_users_move_to_the_users_table(engine, tmp_path):
+    # Base de dados do template incluída no repositório: 'user' com username/email
+    baseline = Path(__file__).resolve().parents[1] / "src" / "database" / "app.db"
+    shutil.copyfile(baseline, tmp_path / "casinofound.db")
+    with engine.connect() as conn:
+        template_users = conn.execute(sa.text("SELECT id, username, email FROM user ORDER BY id")).all()
+    assert template_users
+
+    assert upgrade(db, engine) == [version for version, _, _ in MIGRATIONS]
+
+    assert_schema_matches_models(engine)
+    with engine.connect() as conn:
+        assert conn.execute(sa.text("SELECT id, username, email FROM users ORDER BY id")).all() == template_users
+        assert conn.scalar(sa.text("SELECT count(*) FROM user")) == 0
+
+
+def test_template_users_stranded_before_the_move_are_recovered(engine):
+    # Base de dados do template migrada até à 4 antes da correção: 'users' já
+    # existe (vazia ou com registos novos) e 'user' ainda tem username/email
+    upgrade(db, engine, target=4)
+    with engine.begin() as conn:
+        conn.execute(sa.text("DROP TABLE user"))
+        conn.execute(sa.text(
+            "CREATE TABLE user (id INTEGER PRIMARY KEY, username VARCHAR(80) NOT NULL UNIQUE, "
+            "email VARCHAR(120) NOT NULL UNIQUE)"
+        ))
+        conn.execute(sa.text(
+            "INSERT INTO user (id, username, email) VALUES (1, 'ana', 'ana@example.com'), "
+            "(2, 'rui', 'rui@example.com'), (3, 'eva', 'eva@example.com')"
+        ))
+        conn.execute(sa.text(
+            "INSERT INTO users (id, username, email) VALUES (1, 'novo', 'novo@example.com'), "
+            "(9, 'rui', 'rui@example.com')"
+        ))
+
+    assert upgrade(db, engine) == [version for version, _, _ in MIGRATIONS if version > 4]
+
+    assert_schema_matches_models(engine)
+    with engine.connect() as conn:
+        rows = conn.execute(sa.text("SELECT id, username FROM users ORDER BY username")).all()
+        wallet_columns = {column["name"] for column in sa.inspect(conn).get_columns("user")}
+    assert [username for _, username in rows] == ["ana", "eva", "novo", "rui"]
+    assert dict((username, id) for id, username in rows)["eva"] == 3
+    assert dict((username, id) for id, username in rows)["ana"] not in (1, 3, 9)
+    assert "wallet_address" in wallet_columns
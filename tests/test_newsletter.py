@@ -0,0 +1,21 @@
+from src.models.casinofound import Newsletter
+from src.models.db import db
+
+ADMIN = {"Authorization": "Bearer admin-token"}
+
+
+def test_newsletter_list_counts_only_on_first_page(app):
+    db.session.add_all([Newsletter(email=f"user{i}@example.com") for i in range(5)])
+    db.session.add(Newsletter(email="gone@example.com", is_active=False))
+    db.session.commit()
+    client = app.test_client()
+
+    first = client.get("/api/newsletter/list?limit=2", headers=ADMIN).get_json()
+    second = client.get(f"/api/newsletter/list?limit=2&after_id={first['next_cursor']}", headers=ADMIN).get_json()
+    counted = client.get(
+        f"/api/newsletter/list?limit=2&after_id={first['next_cursor']}&with_total=1", headers=ADMIN
+    ).get_json()
+
+    assert first["total"] == 5 and len(first["newsletters"]) == 2
+    assert "total" not in second and [n["id"] for n in second["newsletters"]] == [3, 4]
+    assert counted["total"] == 5
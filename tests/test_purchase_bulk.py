@@ -0,0 +1,75 @@
+import json
+
+from src.models.casinofound import TokenPurchase
+from src.routes import casinofound
+
+BUYER = "0x" + "55" * 20
+
+
+def purchase(tx, **overrides):
+    return dict({
+        "wallet_address": BUYER,
+        "amount_invested": 10,
+        "tokens_received": 500,
+        "currency": "USDT",
+        "phase": 1,
+        "price_per_token": 0.02,
+        "transaction_hash": f"0x{tx:064x}"
+    }, **overrides)
+
+
+def post_bulk(client, items, ndjson=False):
+    if ndjson:
+        body = "\n".join(item if isinstance(item, str) else json.dumps(item) for item in items)
+        return client.post("/api/purchase/record/bulk", data=body, content_type="application/x-ndjson")
+    return client.post("/api/purchase/record/bulk", json=items)
+
+
+def test_mixed_batch_reports_each_row(app):
+    client = app.test_client()
+    assert client.post("/api/purchase/record", json=purchase(1)).status_code == 201
+
+    response = post_bulk(client, [
+        purchase(2),
+        purchase(3, phase=7),               # inválido
+        purchase(1),                        # já registado
+        "{não é json",                      # linha NDJSON inválida
+        purchase(4),
+    ], ndjson=True)
+
+    assert response.status_code == 200
+    assert response.get_json() == {
+        "received": 5,
+        "inserted": 2,
+        "duplicates": 1,
+        "errors": [{"index": 1, "error": "Fase inválida"}, {"index": 3, "error": "JSON inválido"}]
+    }
+    assert sorted(int(p.transaction_hash, 16) for p in TokenPurchase.query) == [1, 2, 4]
+
+
+def test_duplicates_inside_the_batch_are_written_once(app):
+    result = post_bulk(app.test_client(), [purchase(5), purchase(5), purchase(6), purchase(5)]).get_json()
+
+    assert (result["inserted"], result["duplicates"], result["errors"]) == (2, 2, [])
+    assert TokenPurchase.query.count() == 2
+
+
+def test_row_lost_to_a_concurrent_insert_counts_as_duplicate(app, monkeypatch):
+    client = app.test_client()
+    client.post("/api/purchase/record", json=purchase(7))
+    # Outro pedido gravou a compra entre a verificação e o INSERT
+    monkeypatch.setattr(casinofound, "existing_purchase_hashes", lambda hashes: set())
+
+    result = post_bulk(client, [purchase(7), purchase(8)]).get_json()
+
+    assert (result["inserted"], result["duplicates"], result["errors"]) == (1, 1, [])
+
+
+def test_batch_size_limit(app, monkeypatch):
+    monkeypatch.setattr(casinofound, "BULK_MAX_ROWS", 3)
+    client = app.test_client()
+
+    response = post_bulk(client, [purchase(i) for i in range(10, 14)])
+    assert response.status_code == 413
+    assert TokenPurchase.query.count() == 0
+    assert post_bulk(client, [purchase(i) for i in range(10, 13)]).get_json()["inserted"] == 3
@@ -0,0 +1,48 @@
+from src.models.casinofound import PurchaseStats, TokenPurchase
+from src.models.db import db
+from src.services.purchase_stats import read_purchase_stats, reconcile_purchase_stats, record_purchase_stats
+
+WALLET = "0x" + "ab" * 20
+
+
+def purchase(phase, transaction_hash):
+    return {
+        "wallet_address": WALLET, "amount_invested": 10, "tokens_received": 100, "currency": "USDT",
+        "phase": phase, "price_per_token": 0.1, "transaction_hash": transaction_hash
+    }
+
+
+def test_record_rejects_phase_zero(app):
+    client = app.test_client()
+
+    response = client.post("/api/purchase/record", json=purchase(0, "0x" + "01" * 32))
+
+    assert response.status_code == 400
+    assert response.get_json() == {"error": "Fase inválida"}
+    assert TokenPurchase.query.count() == 0
+
+
+def test_bulk_rejects_phase_zero_rows(app):
+    client = app.test_client()
+
+    response = client.post("/api/purchase/record/bulk", json=[purchase(0, "0x" + "01" * 32), purchase(1, "0x" + "02" * 32)])
+
+    assert response.status_code == 200
+    assert response.get_json()["errors"] == [{"index": 0, "error": "Fase inválida"}]
+    assert read_purchase_stats()["total_purchases"] == 1
+
+
+def test_phase_zero_purchase_is_not_counted_twice(app):
+    # Compras de fase 0 gravadas antes da validação continuam a ter linha própria
+    for phase, tx in ((0, "0x" + "03" * 32), (1, "0x" + "04" * 32)):
+        values = purchase(phase, tx)
+        values.pop("transaction_hash")
+        db.session.add(TokenPurchase(transaction_hash=tx, **values))
+    record_purchase_stats([(0, 10.0, 100.0), (1, 10.0, 100.0)])
+    db.session.commit()
+
+    stats = read_purchase_stats()
+
+    assert (stats["total_purchases"], stats["total_invested"], stats["total_tokens_sold"]) == (2, 20.0, 200.0)
+    assert db.session.get(PurchaseStats, 0).total_purchases == 1
+    assert reconcile_purchase_stats() == []
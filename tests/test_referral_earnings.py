@@ -0,0 +1,99 @@
+import random
+from datetime import datetime
+
+import pytest
+
+from src.models.casinofound import ReferralEarning
+from src.models.db import db
+from src.routes.casinofound import response_cache
+
+REFERRER = "0x" + "cc" * 20
+TIED = datetime(2026, 3, 1, 12, 0, 0)
+
+
+@pytest.fixture(autouse=True)
+def cold_cache():
+    # Versões recomeçam a 0 em cada base de dados: sem corpos de testes anteriores
+    response_cache.clear()
+    yield
+    response_cache.clear()
+
+
+def add_earnings(count, seed=1):
+    rng = random.Random(seed)
+    rows = [
+        ReferralEarning(
+            referrer_wallet=REFERRER, referred_wallet=f"0x{rng.randint(1, 15):040x}",
+            amount_invested=100.0, commission_earned=round(rng.uniform(0.01, 50), 6), currency="USDT",
+            is_paid=rng.choice([True, False, None]), created_at=TIED
+        )
+        for _ in range(count)
+    ]
+    db.session.add_all(rows)
+    db.session.add(ReferralEarning(
+        referrer_wallet="0x" + "dd" * 20, referred_wallet=REFERRER, amount_invested=1.0,
+        commission_earned=1.0, currency="USDT", created_at=TIED
+    ))
+    db.session.commit()
+    return rows
+
+
+def pages(client, limit):
+    cursor, ids = 0, []
+    while True:
+        body = client.get(f"/api/referral/earnings/{REFERRER}?limit={limit}&after_id={cursor}").get_json()
+        assert len(body["earnings"]) <= limit
+        ids.append([earning["id"] for earning in body["earnings"]])
+        cursor = body["next_cursor"]
+        if cursor is None:
+            return body, ids
+        assert cursor == ids[-1][-1]
+
+
+def test_pages_are_stable_when_timestamps_tie(app):
+    rows = add_earnings(23)
+    client = app.test_client()
+
+    _, ids = pages(client, 5)
+
+    assert [len(page) for page in ids] == [5, 5, 5, 5, 3]
+    flat = [row_id for page in ids for row_id in page]
+    assert flat == sorted(row.id for row in rows)
+    # Limite exato: a última página cheia não deixa um cursor para uma página vazia
+    _, exact = pages(client, 23)
+    assert exact == [flat]
+
+
+def test_row_added_between_pages_is_neither_skipped_nor_repeated(app):
+    rows = add_earnings(6)
+    client = app.test_client()
+    first = client.get(f"/api/referral/earnings/{REFERRER}?limit=4").get_json()
+
+    response = client.post("/api/referral/record", json={
+        "referrer_wallet": REFERRER, "referred_wallet": "0x" + "ee" * 20,
+        "amount_invested": 10, "currency": "USDT", "transaction_hash": "0x" + "07" * 32
+    })
+    assert response.status_code == 201
+    rest = client.get(f"/api/referral/earnings/{REFERRER}?limit=4&after_id={first['next_cursor']}").get_json()
+
+    seen = [e["id"] for e in first["earnings"]] + [e["id"] for e in rest["earnings"]]
+    assert len(seen) == len(set(seen)) == 7
+    assert seen[:6] == sorted(row.id for row in rows)
+
+
+def test_totals_match_the_python_sum(app):
+    rows = add_earnings(40, seed=5)
+
+    body = app.test_client().get(f"/api/referral/earnings/{REFERRER}?limit=1").get_json()
+
+    # Cálculo anterior, sobre todas as linhas carregadas
+    assert body["total_earned"] == pytest.approx(sum(e.commission_earned for e in rows))
+    assert body["pending_earnings"] == pytest.approx(sum(e.commission_earned for e in rows if not e.is_paid))
+    assert body["total_referrals"] == len(set(e.referred_wallet for e in rows))
+
+
+def test_bad_page_arguments(app):
+    client = app.test_client()
+    assert client.get(f"/api/referral/earnings/{REFERRER}?limit=0").status_code == 400
+    assert client.get(f"/api/referral/earnings/{REFERRER}?after_id=-1").status_code == 400
+    assert client.get("/api/referral/earnings/nope").status_code == 400
@@ -0,0 +1,89 @@
+from src.models.casinofound import ReferralEarning, User
+from src.models.db import db
+from src.services.referral_graph import ReferralGraph
+
+A, B, C, D, E, F = ("0x" + str(n) * 40 for n in range(1, 7))
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def earn(referrer, referred, commission, invested=100.0):
+    db.session.add(ReferralEarning(
+        referrer_wallet=referrer, referred_wallet=referred, amount_invested=invested,
+        commission_earned=commission, currency="USDT"
+    ))
+    db.session.commit()
+
+
+def user(wallet, referred_by=None):
+    db.session.add(User(wallet_address=wallet, referral_code=wallet, referred_by=referred_by))
+    db.session.commit()
+
+
+def test_downline_respects_depth_and_node_limits(app):
+    for referrer, referred in ((A, B), (B, C), (C, D), (D, E), (A, F)):
+        earn(referrer, referred, 1.0)
+    graph = ReferralGraph()
+
+    shallow = graph.summary(A, depth=2)
+    assert [(level["level"], level["count"]) for level in shallow["downline"]] == [(1, 2), (2, 1)]
+    assert shallow["downline"][0]["wallets"] == [B, F]
+    assert (shallow["downline_total"], shallow["truncated"]) == (3, False)
+    assert graph.summary(A, depth=5)["downline_total"] == 5
+    assert graph.summary(E, depth=5)["downline"] == []
+    assert graph.summary(C, depth=5)["referrer"] == B
+
+    truncated = graph.summary(A, depth=5, max_nodes=2)
+    assert truncated["truncated"] and truncated["downline_total"] < 5
+
+    client = app.test_client()
+    assert client.get(f"/api/referral/graph/{A}?depth=6").status_code == 400
+    assert client.get(f"/api/referral/graph/{A}?depth=0").status_code == 400
+
+
+def test_leaderboard_follows_new_earnings_after_invalidate(app):
+    earn(A, B, 10.0)
+    earn(C, D, 5.0)
+    clock = Clock()
+    graph = ReferralGraph(sync_interval=60, clock=clock)
+    assert [(row["wallet"], row["commission_earned"]) for row in graph.top()] == [(A, 10.0), (C, 5.0)]
+
+    earn(C, E, 20.0)
+    earn(F, A, 1.0)
+    # Dentro do intervalo: ainda a cópia anterior
+    assert [row["wallet"] for row in graph.top()] == [A, C]
+
+    graph.invalidate()
+    board = graph.top()
+    assert [(row["wallet"], row["commission_earned"], row["direct_referrals"]) for row in board] == [
+        (C, 25.0, 2), (A, 10.0, 1), (F, 1.0, 1)
+    ]
+    # As entradas obsoletas (C com 5.0) não reaparecem e o heap mantém-se utilizável
+    assert graph.top(1) == board[:1]
+    assert graph.top() == board
+    assert graph.summary(A)["referrer"] == F
+
+
+def test_cycles_and_self_referrals(app):
+    user(A, referred_by=B)
+    user(B, referred_by=A)
+    user(C, referred_by=C)
+    earn(D, D, 3.0)
+    graph = ReferralGraph()
+
+    summary = graph.summary(A, depth=5)
+    assert [level["wallets"] for level in summary["downline"]] == [[B]]
+    assert (summary["referrer"], summary["downline_total"]) == (B, 1)
+
+    # Auto-referência: nenhuma aresta (nem referrer de si própria); a comissão fica registada
+    for wallet in (C, D):
+        own = graph.summary(wallet, depth=5)
+        assert (own["referrer"], own["direct_referrals"], own["downline"]) == (None, 0, [])
+    assert graph.summary(D)["commission_earned"] == 3.0
+    assert graph.stats()["referred_wallets"] == 2
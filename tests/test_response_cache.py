@@ -0,0 +1,96 @@
+import pytest
+
+from src.models.casinofound import DataVersion
+from src.models.db import db
+from src.routes.casinofound import response_cache
+from src.services.data_versions import bump_version
+
+WALLET = "0x" + "88" * 20
+REFERRED = "0x" + "99" * 20
+
+
+@pytest.fixture(autouse=True)
+def cold_cache():
+    # Cada teste começa numa base nova com versões a 0: nada pode vir do teste anterior
+    response_cache.clear()
+    yield
+    response_cache.clear()
+
+
+def counts(endpoint):
+    return dict(response_cache.stats()["routes"].get(endpoint, {}))
+
+
+def version(name):
+    row = db.session.get(DataVersion, name)
+    return row.version if row else 0
+
+
+def stake(client, tx):
+    return client.post("/api/staking/record", json={
+        "wallet_address": WALLET, "amount_staked": 100, "transaction_hash": f"0x{tx:064x}"
+    })
+
+
+def test_write_bumps_the_version_and_changes_the_etag(app):
+    client = app.test_client()
+    url = f"/api/staking/balance/{WALLET}"
+
+    first = client.get(url)
+    assert first.status_code == 200 and first.get_json()["active_records"] == 0
+    etag = first.headers["ETag"]
+    not_modified = client.get(url, headers={"If-None-Match": etag})
+    assert not_modified.status_code == 304 and not_modified.get_data() == b""
+    assert not_modified.headers["ETag"] == etag
+
+    assert stake(client, 1).status_code == 201
+    assert version(f"staking:{WALLET}") == 1
+
+    fresh = client.get(url, headers={"If-None-Match": etag})
+    assert fresh.status_code == 200
+    assert fresh.get_json()["active_records"] == 1
+    assert fresh.headers["ETag"] != etag
+    assert client.get(url, headers={"If-None-Match": fresh.headers["ETag"]}).status_code == 304
+
+
+def test_cached_body_is_replaced_after_a_write(app):
+    client = app.test_client()
+    url = f"/api/referral/earnings/{WALLET}"
+    endpoint = "casinofound.get_referral_earnings"
+    before = counts(endpoint)
+
+    assert client.get(url).get_json()["total_earned"] == 0
+    assert client.get(url).get_json()["total_earned"] == 0
+    after = counts(endpoint)
+    assert after["misses"] - before.get("misses", 0) == 1
+    assert after["hits"] - before.get("hits", 0) == 1
+
+    client.post("/api/referral/record", json={
+        "referrer_wallet": WALLET, "referred_wallet": REFERRED,
+        "amount_invested": 100, "currency": "USDT", "transaction_hash": "0x" + "01" * 32
+    })
+
+    assert client.get(url).get_json()["total_earned"] > 0
+    assert counts(endpoint)["misses"] - after["misses"] == 1
+
+
+def test_version_bumped_by_another_worker_invalidates(app):
+    client = app.test_client()
+    etag = client.get("/api/purchase/stats").headers["ETag"]
+
+    # Outro processo grava e incrementa a versão: este worker só a vê na base de dados
+    bump_version("purchase_stats")
+    db.session.commit()
+
+    response = client.get("/api/purchase/stats", headers={"If-None-Match": etag})
+    assert response.status_code == 200 and response.headers["ETag"] != etag
+
+
+def test_errors_are_not_cached(app):
+    client = app.test_client()
+    before = counts("casinofound.get_staking_balance").get("bypass", 0)
+
+    assert client.get("/api/staking/balance/not-a-wallet").status_code == 400
+    assert client.get("/api/staking/balance/not-a-wallet").status_code == 400
+    assert counts("casinofound.get_staking_balance")["bypass"] - before == 2
+    assert response_cache.stats()["entries"]["size"] == 0
@@ -0,0 +1,80 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from src.models.casinofound import StakingRecord
+from src.models.db import db
+from src.services.staking_balance import compute_staking_balances, read_staking_balance, reconcile_staking_balances
+
+WALLET = "0x" + "aa" * 20
+OTHER = "0x" + "bb" * 20
+
+
+def tx(n):
+    return f"0x{n:064x}"
+
+
+def stake(client, n, amount, wallet=WALLET):
+    response = client.post("/api/staking/record", json={
+        "wallet_address": wallet, "amount_staked": amount, "transaction_hash": tx(n)
+    })
+    assert response.status_code == 201, response.get_json()
+    return StakingRecord.query.filter_by(transaction_hash=tx(n)).one().id
+
+
+def unstake(client, wallet=WALLET, **target):
+    return client.post("/api/staking/unstake", json=dict(target, wallet_address=wallet))
+
+
+def assert_balance_matches_active_stakes(wallet=WALLET):
+    db.session.expire_all()
+    total, count = compute_staking_balances().get(wallet, (0.0, 0))
+    balance = read_staking_balance(wallet)
+    assert (balance["total_staked"], balance["active_records"]) == (pytest.approx(total), count)
+    assert reconcile_staking_balances() == []
+    return balance
+
+
+def test_stake_and_unstake_keep_the_total_in_step(app):
+    client = app.test_client()
+    first = stake(client, 1, 100)
+    stake(client, 2, 250.5)
+    stake(client, 3, 300)
+    stake(client, 4, 150, wallet=OTHER)
+    assert assert_balance_matches_active_stakes()["total_staked"] == pytest.approx(650.5)
+
+    assert unstake(client, record_id=first).status_code == 200
+    response = unstake(client, transaction_hash=tx(3))
+    assert response.status_code == 200
+    assert response.get_json()["total_staked"] == pytest.approx(250.5)
+
+    balance = assert_balance_matches_active_stakes()
+    assert (balance["total_staked"], balance["active_records"]) == (pytest.approx(250.5), 1)
+    assert assert_balance_matches_active_stakes(OTHER)["total_staked"] == 150
+
+
+def test_unstaking_an_inactive_or_foreign_stake_changes_nothing(app):
+    client = app.test_client()
+    record_id = stake(client, 1, 100)
+    stake(client, 2, 200)
+    assert unstake(client, record_id=record_id).status_code == 200
+    before = assert_balance_matches_active_stakes()
+
+    assert unstake(client, record_id=record_id).status_code == 404
+    assert unstake(client, transaction_hash=tx(1)).status_code == 404
+    assert unstake(client, wallet=OTHER, transaction_hash=tx(2)).status_code == 404
+
+    assert assert_balance_matches_active_stakes() == before
+
+
+def test_concurrent_unstakes_of_one_record_discount_it_once(app):
+    client = app.test_client()
+    record_id = stake(client, 1, 100)
+    stake(client, 2, 200)
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        statuses = list(pool.map(lambda _: unstake(app.test_client(), record_id=record_id).status_code, range(8)))
+
+    assert sorted(statuses) == [200] + [404] * 7
+    balance = assert_balance_matches_active_stakes()
+    assert (balance["total_staked"], balance["active_records"]) == (200, 1)
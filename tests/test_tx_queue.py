@@ -0,0 +1,153 @@
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+import requests
+from web3.exceptions import TransactionNotFound
+
+from src.models.casinofound import Transaction, User
+from src.models.chain import NonceState, OutboxTransaction
+from src.models.db import db
+from src.routes.api import credit_confirmed_transaction
+from src.services.tx_queue import ReceiptPoller, TxSubmitter
+
+PRIVATE_KEY = "0x" + "11" * 32
+RECIPIENT = "0x" + "22" * 20
+
+
+class FakeFunction:
+    def __init__(self, *args):
+        self.args = args
+
+    def build_transaction(self, params):
+        return dict(params, to=RECIPIENT, value=0, data="0x")
+
+
+class FakeEth:
+    def __init__(self):
+        self.pending_nonce = 7
+        self.mined_nonce = 7
+        self.nonce_calls = 0
+        self.sent = []
+        self.responses = []
+        self.receipts = {}
+
+    def get_transaction_count(self, address, block):
+        self.nonce_calls += 1
+        return self.pending_nonce if block == "pending" else self.mined_nonce
+
+    def send_raw_transaction(self, raw):
+        self.sent.append(raw)
+        if self.responses:
+            error = self.responses.pop(0)
+            if error is not None:
+                raise error
+        return b"\x00" * 32
+
+    def get_transaction_receipt(self, tx_hash):
+        if tx_hash not in self.receipts:
+            raise TransactionNotFound(tx_hash)
+        return self.receipts[tx_hash]
+
+
+@pytest.fixture
+def submitter(app):
+    w3 = SimpleNamespace(eth=FakeEth())
+    contract = SimpleNamespace(functions=SimpleNamespace(transfer=FakeFunction))
+    return TxSubmitter(
+        w3, {"cfd_token": contract}, db, OutboxTransaction, NonceState, PRIVATE_KEY,
+        SimpleNamespace(gas_price=30, chain_id=137), stuck_after=60
+    )
+
+
+def enqueue(submitter, count=1):
+    jobs = [submitter.enqueue(None, "cfd_token", "transfer", [RECIPIENT, 1]) for _ in range(count)]
+    db.session.commit()
+    return jobs
+
+
+def test_timeout_rebroadcasts_the_same_signed_transaction(submitter):
+    eth = submitter.w3.eth
+    job, = enqueue(submitter)
+    # O nó aceita a transação mas a resposta não chega
+    eth.responses = [requests.exceptions.ReadTimeout(), ValueError({"code": -32000, "message": "already known"})]
+
+    assert submitter.submit_batch() == 0
+    assert (job.status, job.nonce) == ("signed", 7)
+    raw_tx, tx_hash = job.raw_tx, job.tx_hash
+
+    assert submitter.submit_batch() == 1
+    assert (job.status, job.nonce, job.tx_hash) == ("submitted", 7, tx_hash)
+    assert eth.sent == [raw_tx, raw_tx]
+    assert db.session.get(NonceState, submitter.account.address).next_nonce == 8
+    # Só a inicialização do alocador consulta a rede
+    assert eth.nonce_calls == 1
+
+
+def test_signed_job_left_by_a_crash_is_not_resigned(submitter):
+    eth = submitter.w3.eth
+    first, second = enqueue(submitter, 2)
+    submitter._sign_queued()
+    # Processo terminou depois de difundir, antes do commit final
+    db.session.expire_all()
+    signed = [first.raw_tx, second.raw_tx]
+    eth.responses = [ValueError({"code": -32000, "message": "nonce too low"}), None]
+
+    assert submitter.submit_batch() == 2
+    assert eth.sent == signed
+    assert [first.nonce, second.nonce] == [7, 8]
+
+
+def test_rejected_transaction_is_resigned_with_the_same_nonce(submitter):
+    eth = submitter.w3.eth
+    first, second = enqueue(submitter, 2)
+    eth.responses = [ValueError({"code": -32000, "message": "transaction underpriced"})]
+
+    assert submitter.submit_batch() == 0
+    assert (first.status, first.nonce, first.raw_tx) == ("queued", 7, None)
+    assert (second.status, second.nonce) == ("signed", 8)
+
+    submitter.chain_metadata.gas_price = 60
+    assert submitter.submit_batch() == 2
+    assert [first.nonce, second.nonce] == [7, 8]
+    assert db.session.get(NonceState, submitter.account.address).next_nonce == 9
+
+
+def test_stuck_submitted_job_is_rebroadcast_or_failed(submitter):
+    eth = submitter.w3.eth
+    consumed, dropped = enqueue(submitter, 2)
+    assert submitter.submit_batch() == 2
+    old = datetime.utcnow() - timedelta(seconds=120)
+    OutboxTransaction.query.update({"updated_at": old})
+    db.session.commit()
+    db.session.expire_all()
+    # Nonce 7 usado por outra transação; o 8 continua livre
+    eth.mined_nonce = 8
+    eth.sent.clear()
+
+    submitter.submit_batch()
+
+    assert consumed.status == "failed" and "Nonce 7" in consumed.error
+    assert dropped.status == "submitted" and eth.sent == [dropped.raw_tx]
+
+
+def test_confirmed_buy_creates_and_credits_a_new_wallet(submitter):
+    eth = submitter.w3.eth
+    wallet = "0x" + "33" * 20
+    transactions = [
+        Transaction(wallet_address=wallet, transaction_type=kind, amount=amount, currency="CFD", status="pending")
+        for kind, amount in (("buy", 500), ("affiliate", 20))
+    ]
+    db.session.add_all(transactions)
+    jobs = [submitter.enqueue(t, "cfd_token", "transfer", [RECIPIENT, 1]) for t in transactions]
+    db.session.commit()
+    assert submitter.submit_batch() == 2
+    for job in jobs:
+        eth.receipts[job.tx_hash] = {"status": 1, "blockNumber": 100}
+
+    poller = ReceiptPoller(submitter.w3, db, OutboxTransaction, on_confirmed=credit_confirmed_transaction)
+    assert poller.poll() == 2
+
+    user = User.query.filter_by(wallet_address=wallet).one()
+    assert (user.cfd_balance, user.affiliate_earnings) == (500, 20)
+    assert [t.status for t in transactions] == ["confirmed", "confirmed"]
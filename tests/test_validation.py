@@ -0,0 +1,49 @@
+import pytest
+
+from src.routes.casinofound import get_page_args, is_valid_email, is_valid_wallet, normalize_tx_hash, MAX_PAGE_SIZE
+
+
+@pytest.mark.parametrize("address, valid", [
+    ("0x" + "aB" * 20, True),
+    ("0x" + "a" * 39, False),
+    ("0x" + "a" * 41, False),
+    ("0x" + "g" * 40, False),
+    ("ab" * 21, False),
+    ("0x" + "a" * 40 + "\n", False),
+])
+def test_is_valid_wallet(address, valid):
+    assert is_valid_wallet(address) is valid
+
+
+@pytest.mark.parametrize("email, valid", [
+    ("user.name+tag@example.co", True),
+    ("user@localhost", False),
+    ("@example.com", False),
+    ("user@example.c", False),
+    ("user@example.com\n", False),
+])
+def test_is_valid_email(email, valid):
+    assert is_valid_email(email) is valid
+
+
+def test_normalize_tx_hash():
+    assert normalize_tx_hash("  0xabc ") == "0xabc"
+    assert normalize_tx_hash("") is None
+    assert normalize_tx_hash(None) is None
+
+
+@pytest.mark.parametrize("query, expected", [
+    ("", (50, 0)),
+    ("?limit=10&after_id=7", (10, 7)),
+    (f"?limit={MAX_PAGE_SIZE + 1}", (MAX_PAGE_SIZE, 0)),
+])
+def test_get_page_args(app, query, expected):
+    with app.test_request_context(f"/api/newsletter/list{query}"):
+        assert get_page_args() == expected
+
+
+@pytest.mark.parametrize("query", ["?limit=0", "?after_id=-1"])
+def test_get_page_args_rejects_invalid_values(app, query):
+    with app.test_request_context(f"/api/newsletter/list{query}"):
+        with pytest.raises(ValueError):
+            get_page_args()
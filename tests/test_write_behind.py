@@ -0,0 +1,127 @@
+import os
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from sqlalchemy.exc import IntegrityError
+
+from src.models.casinofound import Newsletter
+from src.models.db import db
+from src.services.write_behind import FlushTimeoutError, WriteBehindQueue
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_unknown_group_commit_mode_fails_at_startup():
+    env = dict(os.environ, GROUP_COMMIT_MODE="on")
+    result = subprocess.run(
+        [sys.executable, "-c", "import src.routes.casinofound"],
+        cwd=ROOT, env=env, capture_output=True, text=True
+    )
+
+    assert result.returncode != 0
+    assert "GROUP_COMMIT_MODE desconhecido: on" in result.stderr
+
+
+def test_queue_rejects_unknown_ack(app):
+    with pytest.raises(ValueError):
+        WriteBehindQueue(app, db, ack="on")
+
+
+def emails(*names):
+    return [(Newsletter, {"email": f"{name}@example.com", "is_active": True}) for name in names]
+
+
+def stored():
+    db.session.expire_all()
+    return sorted(n.email.split("@")[0] for n in Newsletter.query)
+
+
+@pytest.fixture
+def make_queue(app):
+    queues = []
+
+    def make(**options):
+        queue = WriteBehindQueue(app, db, **options)
+        queues.append(queue)
+        return queue
+    yield make
+    for queue in queues:
+        queue.close()
+
+
+def test_concurrent_requests_share_one_commit(make_queue):
+    queue = make_queue(max_rows=8, max_delay_ms=500)
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        list(pool.map(lambda i: queue.submit(emails(f"u{i}")), range(8)))
+
+    stats = queue.stats()
+    assert (stats["batches"], stats["flushed_rows"]) == (1, 8)
+    assert stored() == [f"u{i}" for i in range(8)]
+
+
+def test_flush_ack_waits_for_commit_and_enqueue_ack_does_not(make_queue):
+    flushed = make_queue(ack="flush", max_delay_ms=1)
+    flushed.submit(emails("a"))
+    assert stored() == ["a"]
+
+    release = threading.Event()
+    queued = make_queue(ack="enqueue", max_delay_ms=1, hooks={Newsletter: lambda rows: release.wait(5)})
+    ticket = queued.submit(emails("b"))
+    assert not ticket.event.is_set() and stored() == ["a"]
+    release.set()
+    ticket.wait(5)
+    assert stored() == ["a", "b"]
+
+
+def test_failing_request_is_isolated_from_its_batch(make_queue):
+    queue = make_queue(max_rows=3, max_delay_ms=500)
+    queue.submit(emails("taken"))
+
+    def submit(names):
+        try:
+            queue.submit(emails(*names))
+            return "ok"
+        except IntegrityError:
+            return "duplicate"
+
+    with ThreadPoolExecutor(max_workers=3) as pool:
+        results = list(pool.map(submit, [["x1", "x2"], ["taken"], ["y"]]))
+
+    assert results == ["ok", "duplicate", "ok"]
+    assert stored() == ["taken", "x1", "x2", "y"]
+    assert queue.stats()["errors"] == 1
+
+
+def test_flush_wait_times_out_without_writing(make_queue):
+    release = threading.Event()
+    queue = make_queue(max_rows=1, max_delay_ms=1, flush_timeout=0.2,
+                       hooks={Newsletter: lambda rows: release.wait(5)})
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        first = pool.submit(queue.submit, emails("slow"))
+        time.sleep(0.05)
+        with pytest.raises(FlushTimeoutError):
+            queue.submit(emails("late"))
+        release.set()
+        first.result(5)
+
+    queue.submit(emails("after"))
+    # O pedido que desistiu não é escrito depois
+    assert stored() == ["after", "slow"]
+    assert queue.stats()["timeouts"] == 1
+
+
+def test_writer_thread_survives_errors_outside_the_flush(make_queue, app):
+    queue = make_queue(max_delay_ms=1)
+    queue.app = None  # app_context() falha fora do try do flush
+
+    with pytest.raises(AttributeError):
+        queue.submit(emails("lost"))
+    queue.app = app
+    queue.submit(emails("kept"))
+
+    assert queue._thread.is_alive()
+    assert stored() == ["kept"]